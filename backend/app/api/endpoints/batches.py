@@ -0,0 +1,109 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import and_, or_
+from typing import List
+import asyncio
+import uuid
+
+from app.core.database import get_db, get_read_db, ReadSessionLocal
+from app.core.config import settings
+from app.core.fast_json import dumps
+from app.core.rate_limit import limiter, stream_quota
+from app.models.batch import BatchItem, BatchJob
+from app.models.goal import Goal
+from app.schemas.batch import BatchSubmitted, BatchJobInfo
+from app.services.batch_runner import batch_runner, parse_items, BatchFormatError
+from fastapi.responses import StreamingResponse
+
+router = APIRouter()
+
+FINISHED = ("done", "error", "cancelled")
+
+@router.post("/batches/{user_id}", response_model=BatchSubmitted, status_code=202)
+@limiter.limit("10/minute")
+async def submit_batch(user_id: str, request: Request, models: List[str] = Query([])):
+    """
+    Queue a file of goals for decomposition. Body: JSONL (application/x-ndjson) or CSV
+    (text/csv); see batch_runner.parse_items for the columns. `models` applies to rows
+    that do not name their own.
+    """
+    await stream_quota.check_tokens(f"user:{user_id}")
+    body = await request.body()
+    if len(body) > settings.BATCH_MAX_ITEMS * 6000:
+        raise HTTPException(413, "Batch file too large")
+    try:
+        items = parse_items(body, request.headers.get("content-type", ""), models)
+    except BatchFormatError as e:
+        raise HTTPException(400, str(e))
+
+    job_id = uuid.uuid4().hex
+    await batch_runner.submit(user_id, items, job_id)
+    return {"job_id": job_id, "items": len(items), "status": "queued"}
+
+async def load_job(db: AsyncSession, job_id: str) -> BatchJob:
+    job = (await db.execute(select(BatchJob).where(BatchJob.id == job_id))).scalar_one_or_none()
+    if not job: raise HTTPException(404, "Batch job not found")
+    return job
+
+@router.get("/batches/{job_id}", response_model=BatchJobInfo)
+async def get_batch(job_id: str, db: AsyncSession = Depends(get_read_db)):
+    job = await load_job(db, job_id)
+    return {
+        "id": job.id, "status": job.status, "total": job.total,
+        "completed": job.completed, "failed": job.failed,
+        "pending": max(0, job.total - job.completed - job.failed) if job.status != "cancelled" else 0,
+        "created_at": job.created_at, "updated_at": job.updated_at,
+    }
+
+@router.get("/batches/{job_id}/results")
+async def batch_results(job_id: str, follow: bool = False, db: AsyncSession = Depends(get_read_db)):
+    """
+    NDJSON, one BatchResult per finished item in the order they finished. With follow=true
+    the response stays open and sends results as they are written until the job is over.
+    """
+    await load_job(db, job_id)
+
+    async def lines():
+        after = None  # (finished_at, id) of the last line sent
+        while True:
+            async with ReadSessionLocal() as session:
+                query = (
+                    select(BatchItem.id, BatchItem.position, BatchItem.goal_text, BatchItem.model, BatchItem.status,
+                           BatchItem.goal_id, BatchItem.error, BatchItem.finished_at, Goal.breakdown)
+                    .outerjoin(Goal, Goal.id == BatchItem.goal_id)
+                    .where(BatchItem.job_id == job_id, BatchItem.status.in_(FINISHED), BatchItem.finished_at.is_not(None))
+                    .order_by(BatchItem.finished_at, BatchItem.id)
+                    .limit(500)
+                )
+                if after is not None:
+                    query = query.where(or_(
+                        BatchItem.finished_at > after[0],
+                        and_(BatchItem.finished_at == after[0], BatchItem.id > after[1]),
+                    ))
+                # Status first: once it reads done, every result row is already committed
+                status = (await session.execute(select(BatchJob.status).where(BatchJob.id == job_id))).scalar_one_or_none()
+                rows = (await session.execute(query)).all()
+
+            for r in rows:
+                yield dumps({
+                    "position": r.position, "goal": r.goal_text, "model": r.model, "status": r.status,
+                    "goal_id": r.goal_id, "steps": r.breakdown, "error": r.error,
+                }) + b"\n"
+            if rows:
+                after = (rows[-1].finished_at, rows[-1].id)
+                if len(rows) == 500:
+                    continue
+            if not follow or status in ("done", "cancelled", None):
+                return
+            await asyncio.sleep(settings.BATCH_POLL_INTERVAL)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.delete("/batches/{job_id}")
+async def cancel_batch(job_id: str, db: AsyncSession = Depends(get_db)):
+    job = await load_job(db, job_id)
+    if job.status in ("done", "cancelled"):
+        return {"status": job.status}
+    await batch_runner.cancel(job_id)
+    return {"status": "cancelled"}
@@ -1,105 +1,42 @@
-import sys
-from fastapi import APIRouter, Depends, HTTPException, Response, Request
+from fastapi import APIRouter, Depends, HTTPException, Response, Request, Query, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete
-from typing import List
-import httpx
-import logging
+from sqlalchemy import delete, update, func, or_, and_
+from sqlalchemy.orm import load_only
+from typing import List, Optional, Union
 import asyncio
+import base64
+import uuid
 from datetime import datetime
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.core.config import settings
-from app.models.goal import Goal
-from app.schemas.goal import StreamRequest, ModelInfo, HistoryItem, SaveGoalRequest, SloganResponse
+from app.core.log_queue import get_logger
+from app.core.fast_json import FastJSONResponse, dumps
+from app.core.rate_limit import limiter, stream_quota, client_key
+from app.models.goal import Goal, GoalTurn, GOAL_RECENCY, goal_recency
+from app.schemas.goal import StreamRequest, MultiStreamRequest, ModelInfo, HistoryItem, HistorySummary, SearchResult, SaveGoalRequest, GoalPatchRequest, GoalTurnItem, TurnWriteRequest, SloganResponse
 from app.services.ai_service import ai_service
+from app.services.json_patch import apply_patch, JsonPatchError
+from app.services.write_buffer import write_buffer
+from app.services import turn_store, search_index, blob_store
+from app.services.stream_persistence import tee_to_goal
+from app.services.stream_coalescer import coalesce
+from app.services.stream_hub import stream_hub, OffsetGone
+from app.services.context_window import estimate_tokens
+from app.services.model_router import model_router
+from app.services.model_catalog import model_catalog
+from app.services.history_cache import history_cache
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+logger = get_logger("goals")
 
-logging.basicConfig(level=logging.INFO, handlers=[logging.StreamHandler(sys.stdout)])
-logger = logging.getLogger(__name__)
-
-limiter = Limiter(key_func=get_remote_address)
 router = APIRouter()
 
 class TitleRequest(BaseModel):
     context: str
 
-# Fallback if API fails completely
-FALLBACK_GROQ_MODELS = [
-    {"id": "llama-3.3-70b-versatile", "name": "Llama 3.3 70B (Versatile)"},
-    {"id": "mixtral-8x7b-32768", "name": "Mixtral 8x7B"},
-]
-
-model_cache = {
-    "data": [],
-    "timestamp": 0
-}
-
-async def fetch_groq_models():
-    # Shortened cache to 10 seconds to help you see changes immediately
-    now = datetime.utcnow().timestamp()
-    if model_cache["data"] and (now - model_cache["timestamp"] < 10):
-        return model_cache["data"]
-
-    print("🔄 [MODELS] Fetching fresh list from Groq...", flush=True)
-
-    headers = {"Authorization": f"Bearer {settings.GROQ_API_KEY}"}
-    final_list = []
-
-    # --- STRICT BLOCKLIST (Updated) ---
-    BLOCKED_KEYWORDS = [
-        "whisper", "tts", "audio", "guard", "vision", "embed",
-        "speech", "distil-whisper", "playback", "tool-use", "gpt", "oss",
-        "playai" # Explicitly added this one
-    ]
-
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            resp = await client.get("https://api.groq.com/openai/v1/models", headers=headers)
-
-            if resp.status_code == 200:
-                data = resp.json().get("data", [])
-                for m in data:
-                    mid = m.get("id", "")
-                    mid_lower = mid.lower()
-
-                    if any(block in mid_lower for block in BLOCKED_KEYWORDS):
-                        continue
-
-                    name = mid.replace("-", " ").title()
-                    name = name.replace("Llama 3", "Llama 3")
-                    name = name.replace("Versatile", "(V)")
-                    name = name.replace("Instant", "(I)")
-                    name = name.replace("Developer", "(Dev)")
-
-                    final_list.append(ModelInfo(
-                        id=mid,
-                        name=name,
-                        provider="Groq",
-                        context_length=m.get("context_window", 8192)
-                    ))
-
-                final_list.sort(key=lambda x: 0 if "3.3" in x.id else 1)
-                print(f"✅ [MODELS] Found {len(final_list)} chat-compatible models.", flush=True)
-            else:
-                raise Exception(f"Status {resp.status_code}")
-
-    except Exception as e:
-        print(f"⚠️ [MODELS] Fetch failed ({e}). Using fallback.", flush=True)
-        final_list = [
-            ModelInfo(id=m["id"], name=m["name"], provider="Groq", context_length=32000)
-            for m in FALLBACK_GROQ_MODELS
-        ]
-
-    model_cache["data"] = final_list
-    model_cache["timestamp"] = now
-    return final_list
-
 @router.post("/generate-title")
 async def generate_title(req: TitleRequest):
     return {"title": await ai_service.generate_title(req.context)}
@@ -110,58 +47,381 @@ async def get_slogans(response: Response):
     return {"slogans": await ai_service.generate_slogans()}
 
 @router.get("/models", response_model=List[ModelInfo])
-async def get_models(request: Request):
-    return await fetch_groq_models()
-
-@router.get("/history/{user_id}", response_model=List[HistoryItem])
-async def get_history(user_id: str, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Goal).where(Goal.user_id == user_id).order_by(Goal.updated_at.desc()))
-    return [
-        HistoryItem(
-            id=g.id, goal=g.original_goal, model=g.model_used or "Groq",
-            date=g.updated_at or g.created_at, preview=g.breakdown or [],
-            thinking=g.thinking_process, chat_history=g.chat_history or []
-        ) for g in result.scalars().all()
-    ]
+async def get_models(request: Request, if_none_match: Optional[str] = Header(None)):
+    # Precomputed bytes of the last good catalog; refreshing happens in the background
+    snapshot = await model_catalog.snapshot()
+    headers = {"ETag": snapshot.etag}
+    if if_none_match == snapshot.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(snapshot.body, media_type="application/json", headers=headers)
+
+HISTORY_PAGE_MAX = 200
+
+def encode_cursor(goal: Goal) -> str:
+    raw = f"{goal_recency(goal).isoformat()}|{goal.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        ts, goal_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(ts), int(goal_id)
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+# Blob fields may be stored compressed; they are decoded only when a caller asks for them
+BLOB_READERS = {"chat_history": blob_store.chat_history, "thinking_process": blob_store.thinking}
+
+def goal_fields(g: Goal, *names: str) -> dict:
+    """Column values for `g`, with any write-behind values that have not been flushed yet laid on top."""
+    pending = write_buffer.pending(g.id) or {}
+    fields = {}
+    for name in names:
+        if name in pending:
+            fields[name] = pending[name]
+        elif name in BLOB_READERS:
+            fields[name] = BLOB_READERS[name](g)
+        else:
+            fields[name] = getattr(g, name)
+    return fields
+
+# Rows are built as plain dicts in the HistoryItem / HistorySummary shape and serialized with
+# orjson (FastJSONResponse / dumps): the values come straight from our own columns, so re-validating every
+# chat_history blob through Pydantic on the way out buys nothing.
+def to_history_item(g: Goal) -> dict:
+    f = goal_fields(g, "original_goal", "model_used", "updated_at", "created_at", "breakdown", "thinking_process", "chat_history", "version")
+    return {
+        "id": g.id, "goal": f["original_goal"], "model": f["model_used"] or "Groq",
+        "date": f["updated_at"] or f["created_at"], "preview": f["breakdown"] or [],
+        "thinking": f["thinking_process"], "chat_history": f["chat_history"] or [],
+        "version": f["version"],
+    }
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    return bool(if_none_match) and (if_none_match.strip() == "*" or etag in (t.strip() for t in if_none_match.split(",")))
+
+def to_history_summary(g: Goal) -> dict:
+    f = goal_fields(g, "original_goal", "model_used", "updated_at", "created_at")
+    return {"id": g.id, "goal": f["original_goal"], "model": f["model_used"] or "Groq", "date": f["updated_at"] or f["created_at"]}
+
+@router.get("/models/health")
+async def get_models_health():
+    return model_router.stats()
+
+@router.get("/models/{model_id:path}/capabilities")
+async def get_model_capabilities(model_id: str):
+    capabilities = await model_catalog.capabilities(model_id)
+    if capabilities is None: raise HTTPException(404, "Model not in the catalog")
+    return capabilities
+
+@router.get("/history/{user_id}", response_model=Union[List[HistoryItem], List[HistorySummary]])
+async def get_history(
+    user_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=HISTORY_PAGE_MAX),
+    cursor: Optional[str] = None,
+    summary: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+    primary: AsyncSession = Depends(get_db),
+):
+    """
+    Newest first. Pass `limit` (and then the returned X-Next-Cursor header as `cursor`)
+    for keyset pagination on (updated_at or created_at, id); `summary=true` skips the JSON blobs.
+    Send the ETag back as If-None-Match to get a 304 while nothing has changed.
+    """
+    headers = {"Cache-Control": "private, no-cache"}
+    # Read before the query, so a cached body is never older than the version it is stored under
+    etag = await history_cache.etag(user_id) if settings.HISTORY_CACHE_ENABLED else None
+    variant = (limit, cursor, summary)
+    if etag is not None:
+        headers["ETag"] = etag
+        if etag_matches(if_none_match, etag):
+            history_cache.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        cached = history_cache.get(user_id, variant, etag)
+        if cached is not None:
+            return Response(cached[1], media_type="application/json", headers={**headers, **cached[2]})
+        if settings.DATABASE_READ_URL:
+            # A miss follows a write, which a lagging replica may not have yet; a body read there would be
+            # cached under the new ETag and served until the next write. Misses are one per change, so cheap.
+            db = primary
+
+    query = select(Goal).where(Goal.user_id == user_id)
+    if summary:
+        query = query.options(load_only(Goal.id, Goal.original_goal, Goal.model_used, Goal.created_at, Goal.updated_at))
+    if cursor:
+        ts, last_id = decode_cursor(cursor)
+        query = query.where(or_(GOAL_RECENCY < ts, and_(GOAL_RECENCY == ts, Goal.id < last_id)))
+    query = query.order_by(GOAL_RECENCY.desc(), Goal.id.desc())
+    paginate = limit is not None or cursor is not None
+    page_size = limit or HISTORY_PAGE_MAX
+    if paginate:
+        query = query.limit(page_size + 1)
+
+    goals = list((await db.execute(query)).scalars().all())
+    extra = {}
+    if paginate and len(goals) > page_size:
+        goals = goals[:page_size]
+        extra["X-Next-Cursor"] = encode_cursor(goals[-1])
+
+    to_row = to_history_summary if summary else to_history_item
+    body = dumps([to_row(g) for g in goals])
+    if etag is not None:
+        history_cache.put(user_id, variant, etag, body, extra)
+    return Response(body, media_type="application/json", headers={**headers, **extra})
+
+@router.get("/history/{user_id}/search", response_model=List[SearchResult])
+async def search_history(
+    user_id: str,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    primary: AsyncSession = Depends(get_db),
+):
+    """
+    Ranked full-text search over the user's goal titles and plan steps. Every word must
+    match (the last one as a prefix). Pass X-Next-Cursor back as `cursor` for the next page.
+    """
+    offset = 0
+    if cursor:
+        try:
+            offset = int(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except ValueError:
+            raise HTTPException(400, "Invalid cursor")
+    if write_buffer.has_pending_user(user_id):
+        # The flush commits on the primary, which the replica may not have yet: read it back there
+        await write_buffer.flush_user(user_id)
+        db = primary
+
+    rows = await search_index.search(db, user_id, q, limit + 1, offset)
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = base64.urlsafe_b64encode(str(offset + limit).encode()).decode()
+    return FastJSONResponse(rows, headers=headers)
+
+# On the primary: the ETag it returns is sent back as If-Match, and replica lag would turn that into a 409
+@router.get("/goals/{goal_id}", response_model=HistoryItem)
+async def get_goal(goal_id: int, db: AsyncSession = Depends(get_db)):
+    # Flushed first, so the body and the ETag describe the same version (the flush bumps it)
+    await write_buffer.flush(goal_id)
+    result = await db.execute(select(Goal).where(Goal.id == goal_id))
+    goal = result.scalar_one_or_none()
+    if not goal: raise HTTPException(404, "Goal not found")
+    return FastJSONResponse(to_history_item(goal), headers={"ETag": f'"{goal.version}"'})
 
 @router.post("/goals/{user_id}")
 async def create_goal(user_id: str, req: SaveGoalRequest, db: AsyncSession = Depends(get_db)):
     if len(req.title) > 5000: raise HTTPException(400, "Goal title too long")
 
-    new_goal = Goal(
-        user_id=user_id, original_goal=req.title, chat_history=req.chat_history,
-        breakdown=req.preview, model_used="Groq Multi-Model",
-        created_at=datetime.utcnow(), updated_at=datetime.utcnow()
-    )
+    new_goal = Goal(**blob_store.pack({
+        "user_id": user_id, "original_goal": req.title, "chat_history": req.chat_history,
+        "breakdown": req.preview, "model_used": "Groq Multi-Model",
+        "created_at": datetime.utcnow(), "updated_at": datetime.utcnow(),
+    }))
     db.add(new_goal)
+    await db.flush()
+    await turn_store.replace_turns(db, new_goal.id, req.chat_history)
+    await search_index.reindex(db, new_goal.id)
     await db.commit()
+    await history_cache.invalidate(user_id)
     await db.refresh(new_goal)
     return {"id": new_goal.id, "message": "Goal saved"}
 
+def parse_if_match(value: Optional[str]) -> Optional[int]:
+    if not value or value.strip() == "*":
+        return None
+    try:
+        return int(value.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(400, "Invalid If-Match header")
+
+async def write_goal(db: AsyncSession, goal: Goal, values: dict, turn_index: Optional[int] = None) -> int:
+    """
+    Compare-and-swap on goals.version (as loaded in `goal`); a concurrent writer turns into a 409.
+    goal_turns is kept in step: only `turn_index` is rewritten when given, otherwise every turn.
+    """
+    goal_id, expected_version = goal.id, goal.version
+    new_version = expected_version + 1
+    result = await db.execute(
+        update(Goal)
+        .where(Goal.id == goal_id, Goal.version == expected_version)
+        .values(**blob_store.pack(values), version=new_version, updated_at=datetime.utcnow())
+    )
+    if result.rowcount == 0:
+        await db.rollback()
+        raise HTTPException(409, "Goal was modified by another request")
+    if "chat_history" in values:
+        if turn_index is None:
+            await turn_store.replace_turns(db, goal_id, values["chat_history"])
+        else:
+            await turn_store.write_turn(db, goal_id, turn_index, values["chat_history"][turn_index])
+    if "original_goal" in values or "breakdown" in values:
+        await search_index.reindex(db, goal_id)
+    await db.commit()
+    await history_cache.invalidate(goal.user_id)
+    return new_version
+
 @router.put("/goals/{goal_id}")
-async def update_goal(goal_id: int, req: SaveGoalRequest, db: AsyncSession = Depends(get_db)):
+async def update_goal(goal_id: int, req: SaveGoalRequest, response: Response, if_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
+    values = {"chat_history": req.chat_history, "original_goal": req.title}
+    if req.preview: values["breakdown"] = req.preview
+
+    if settings.write_behind_enabled and if_match is None:
+        # Plain autosave: last write wins, so coalesce it in the write-behind buffer
+        result = await db.execute(select(Goal).options(load_only(Goal.id, Goal.user_id, Goal.version)).where(Goal.id == goal_id))
+        goal = result.scalar_one_or_none()
+        if not goal: raise HTTPException(404, "Goal not found")
+        write_buffer.put(goal_id, goal.user_id, values, goal.version)
+        # Readers on this worker see it at once through the write-behind overlay
+        await history_cache.invalidate(goal.user_id)
+        return {"message": "Goal updated", "buffered": True}
+
+    await write_buffer.flush(goal_id)
     result = await db.execute(select(Goal).where(Goal.id == goal_id))
     goal = result.scalar_one_or_none()
     if not goal: raise HTTPException(404, "Goal not found")
-    goal.chat_history = req.chat_history
-    goal.original_goal = req.title
-    if req.preview: goal.breakdown = req.preview
-    goal.updated_at = datetime.utcnow()
-    await db.commit()
-    return {"message": "Goal updated"}
+    expected = parse_if_match(if_match)
+    if expected is not None and expected != goal.version:
+        raise HTTPException(409, "Goal was modified by another request")
+
+    version = await write_goal(db, goal, values)
+    response.headers["ETag"] = f'"{version}"'
+    return {"message": "Goal updated", "version": version}
+
+@router.patch("/goals/{goal_id}")
+async def patch_goal(goal_id: int, req: GoalPatchRequest, response: Response, if_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
+    """
+    Incremental update of chat_history: append a turn, replace turn N, or apply a JSON Patch.
+    Send the version from the ETag as If-Match (or base_version) to get a 409 on conflicts.
+    """
+    await write_buffer.flush(goal_id)
+    result = await db.execute(select(Goal).where(Goal.id == goal_id))
+    goal = result.scalar_one_or_none()
+    if not goal: raise HTTPException(404, "Goal not found")
+    expected = parse_if_match(if_match)
+    if expected is None:
+        expected = req.base_version
+    if expected is not None and expected != goal.version:
+        raise HTTPException(409, "Goal was modified by another request")
+
+    history = list(blob_store.chat_history(goal) or [])
+    touched = None
+    if req.op == "append":
+        if req.turn is None: raise HTTPException(400, "Missing turn")
+        history.append(req.turn)
+        touched = len(history) - 1
+    elif req.op == "replace":
+        if req.turn is None or req.index is None: raise HTTPException(400, "Missing turn or index")
+        if not -len(history) <= req.index < len(history): raise HTTPException(400, "Turn index out of range")
+        touched = req.index % len(history)
+        history[touched] = req.turn
+    elif req.op == "json_patch":
+        try:
+            history = apply_patch(history, req.patch or [])
+        except JsonPatchError as e:
+            raise HTTPException(400, f"Invalid patch: {e}")
+        if not isinstance(history, list): raise HTTPException(400, "Patch must leave chat_history a list")
+    else:
+        raise HTTPException(400, "Unknown op")
+
+    values = {"chat_history": history}
+    if req.title:
+        if len(req.title) > 5000: raise HTTPException(400, "Goal title too long")
+        values["original_goal"] = req.title
+    if req.preview: values["breakdown"] = req.preview
+    version = await write_goal(db, goal, values, turn_index=touched)
+    response.headers["ETag"] = f'"{version}"'
+    return {"message": "Goal updated", "version": version, "turns": len(history)}
+
+@router.get("/goals/{goal_id}/turns", response_model=List[GoalTurnItem])
+async def get_turns(
+    goal_id: int,
+    start: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    latest: Optional[int] = Query(None, ge=1, le=500),
+    db: AsyncSession = Depends(get_read_db),
+    primary: AsyncSession = Depends(get_db),
+):
+    """Range read over goal_turns. `latest=N` returns the last N turns instead of starting at `start`."""
+    if write_buffer.pending(goal_id) is not None:
+        # As in search_history: after a flush, read our own write from the primary
+        await write_buffer.flush(goal_id)
+        db = primary
+    if latest is not None:
+        last = (await db.execute(select(func.max(GoalTurn.turn_index)).where(GoalTurn.goal_id == goal_id))).scalar()
+        start = max(0, (last if last is not None else -1) - latest + 1)
+        limit = latest
+    result = await db.execute(
+        select(GoalTurn)
+        .where(GoalTurn.goal_id == goal_id, GoalTurn.turn_index >= start, GoalTurn.turn_index < start + limit)
+        .order_by(GoalTurn.turn_index, GoalTurn.version, GoalTurn.agent_model)
+    )
+    return FastJSONResponse([
+        {
+            "turn_index": t.turn_index, "version": t.version, "turn_uid": t.turn_uid, "user_message": t.user_message,
+            "model": t.agent_model, "status": t.status,
+            "thinking": blob_store.turn_thinking(t), "result": blob_store.turn_result(t),
+            "metrics": t.metrics, "duration_ms": t.duration_ms,
+        } for t in result.scalars().all()
+    ])
+
+@router.put("/goals/{goal_id}/turns/{turn_index}")
+async def put_turn(goal_id: int, turn_index: int, req: TurnWriteRequest, response: Response, if_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
+    """Write one ChatTurn: replaces turn `turn_index`, or appends when it equals the current turn count."""
+    await write_buffer.flush(goal_id)
+    result = await db.execute(select(Goal).where(Goal.id == goal_id))
+    goal = result.scalar_one_or_none()
+    if not goal: raise HTTPException(404, "Goal not found")
+    expected = parse_if_match(if_match)
+    if expected is None:
+        expected = req.base_version
+    if expected is not None and expected != goal.version:
+        raise HTTPException(409, "Goal was modified by another request")
+
+    history = list(blob_store.chat_history(goal) or [])
+    if turn_index == len(history):
+        history.append(req.turn)
+    elif 0 <= turn_index < len(history):
+        history[turn_index] = req.turn
+    else:
+        raise HTTPException(400, "Turn index out of range")
+
+    version = await write_goal(db, goal, {"chat_history": history}, turn_index=turn_index)
+    response.headers["ETag"] = f'"{version}"'
+    return {"message": "Turn saved", "version": version, "turns": len(history)}
+
+@router.get("/stats/models")
+async def get_model_stats(user_id: Optional[str] = None, db: AsyncSession = Depends(get_read_db)):
+    return await turn_store.model_stats(db, user_id)
 
 @router.delete("/history/{user_id}")
 async def clear_history(user_id: str, db: AsyncSession = Depends(get_db)):
+    write_buffer.discard(user_id=user_id)
+    await turn_store.delete_turns(db, user_id=user_id)
+    await search_index.remove(db, user_id=user_id)
     await db.execute(delete(Goal).where(Goal.user_id == user_id))
     await db.commit()
+    await history_cache.invalidate(user_id)
     return {"message": "History cleared"}
 
 @router.delete("/goals/{goal_id}")
 async def delete_goal(goal_id: int, db: AsyncSession = Depends(get_db)):
-    await db.execute(delete(Goal).where(Goal.id == goal_id))
+    write_buffer.discard(goal_id=goal_id)
+    await turn_store.delete_turns(db, goal_id=goal_id)
+    await search_index.remove(db, goal_id=goal_id)
+    owner = (await db.execute(delete(Goal).where(Goal.id == goal_id).returning(Goal.user_id))).scalar_one_or_none()
     await db.commit()
+    await history_cache.invalidate(owner)
     return {"message": "Goal deleted"}
 
+def resumable_response(body, media_type: str, stream_id: Optional[str] = None) -> StreamingResponse:
+    """Run `body` in the stream hub so a dropped client can resume it from GET /streams/{X-Stream-Id}."""
+    if not settings.STREAM_RESUME_ENABLED:
+        return StreamingResponse(body, media_type=media_type)
+    stream = stream_hub.open(body, media_type, stream_id)
+    return StreamingResponse(stream_hub.subscribe(stream), media_type=media_type, headers={"X-Stream-Id": stream.id})
+
 @router.post("/stream-goal")
 @limiter.limit("60/minute")
 async def stream_goal(req: StreamRequest, request: Request):
@@ -172,6 +432,105 @@ async def stream_goal(req: StreamRequest, request: Request):
     # NOTE: The actual validation/sanitization happens in ai_service.stream_chat now.
     target_model = req.model if req.model else "llama-3.3-70b-versatile"
     
-    print(f"📥 [BACKEND] Streaming Request. Target: {target_model}", flush=True)
+    logger.info(f"📥 [BACKEND] Streaming Request. Target: {target_model}")
+
+    quota_key = client_key(request)
+    await stream_quota.acquire(quota_key)
+    prompt_tokens = sum(estimate_tokens(m.content) for m in req.messages)
+
+    conversation_id = str(req.goal_id) if req.goal_id is not None else None
+    stream = ai_service.stream_chat(req.messages, target_model, conversation_id=conversation_id, allow_failover=req.allow_failover)
+    stream = stream_quota.metered(stream, quota_key, prompt_tokens)
+    if req.goal_id is not None and req.turn_id:
+        stream = tee_to_goal(stream, req.goal_id, req.turn_id, target_model, req.messages, req.version_index)
+
+    if req.format == "events":
+        async def events():
+            async for event in ai_service.stream_events(req.messages, target_model, source=stream):
+                yield dumps(event) + b"\n"
+        return resumable_response(stream_quota.hold(events(), quota_key), "application/x-ndjson")
+
+    if settings.STREAM_COALESCE_ENABLED:
+        stream = coalesce(stream, settings.STREAM_COALESCE_BYTES, settings.STREAM_COALESCE_WINDOW)
+    return resumable_response(stream_quota.hold(stream, quota_key), "text/plain")
+
+@router.post("/stream-goals")
+@limiter.limit("60/minute")
+async def stream_goals(req: MultiStreamRequest, request: Request):
+    """One request for a whole multi-agent turn. Responds with NDJSON frames tagged by model."""
+    if not req.messages:
+        raise HTTPException(400, "Empty message list")
+    models = [m for m in dict.fromkeys(req.models) if m] or ["llama-3.3-70b-versatile"]
+    if len(models) > settings.MAX_MODELS_PER_FANOUT:
+        raise HTTPException(400, f"At most {settings.MAX_MODELS_PER_FANOUT} models per request")
+
+    logger.info(f"📥 [BACKEND] Fan-out Request. Targets: {', '.join(models)}")
+
+    quota_key = client_key(request)
+    await stream_quota.acquire(quota_key, slots=len(models))
+    prompt_tokens = sum(estimate_tokens(m.content) for m in req.messages)
+
+    def wrap(model, stream):
+        stream = stream_quota.metered(stream, quota_key, prompt_tokens)
+        if req.goal_id is not None and req.turn_id:
+            stream = tee_to_goal(stream, req.goal_id, req.turn_id, model, req.messages, req.version_index)
+        if settings.STREAM_COALESCE_ENABLED and req.format != "events":
+            # Fewer, larger chunk frames per model
+            stream = coalesce(stream, settings.STREAM_COALESCE_BYTES, settings.STREAM_COALESCE_WINDOW)
+        return stream
+
+    stream_id = uuid.uuid4().hex
+
+    async def frames():
+        async for frame in ai_service.stream_multi(req.messages, models, stream_id=stream_id, events=req.format == "events", wrap=wrap, allow_failover=req.allow_failover):
+            yield dumps(frame) + b"\n"
+
+    return resumable_response(stream_quota.hold(frames(), quota_key, slots=len(models)), "application/x-ndjson", stream_id)
+
+@router.get("/streams/{stream_id}")
+async def resume_stream(stream_id: str, offset: Optional[int] = Query(None, ge=0), last_event_id: Optional[str] = Header(None)):
+    """
+    Continue a /stream-goal(s) response after a dropped connection. Last-Event-ID (or
+    `offset`) is the number of bytes already received; the body is the rest of the
+    original response, live until the generation ends.
+    """
+    stream = stream_hub.get(stream_id)
+    if stream is None:
+        raise HTTPException(404, "Stream not found")
+    if offset is None:
+        try:
+            offset = int(last_event_id or 0)
+        except ValueError:
+            raise HTTPException(400, "Invalid Last-Event-ID")
+    if offset > stream.end:
+        raise HTTPException(416, "Offset is past the end of the stream")
+    try:
+        stream.read(offset)
+    except OffsetGone:
+        raise HTTPException(410, "Offset is no longer buffered")
+    return StreamingResponse(stream_hub.subscribe(stream, offset, resumed=True), media_type=stream.media_type, headers={"X-Stream-Id": stream.id})
+
+@router.get("/streams/{stream_id}/status")
+async def stream_status(stream_id: str):
+    stream = stream_hub.get(stream_id)
+    if stream is None:
+        raise HTTPException(404, "Stream not found")
+    return {"stream_id": stream.id, "state": stream.state, "bytes": stream.end, "buffered_from": stream.start, "subscribers": stream.subscribers}
+
+@router.delete("/streams/{stream_id}")
+async def cancel_stream(stream_id: str):
+    """Stop the generation now (the frontend's stopStream) instead of waiting out the disconnect grace period."""
+    stream = stream_hub.get(stream_id)
+    if stream is None:
+        raise HTTPException(404, "Stream not found")
+    cancelled = stream_hub.cancel(stream_id)
+    if stream.task is not None:
+        # Wait for the upstream request to be closed so the answer is authoritative
+        await asyncio.wait([stream.task], timeout=5.0)
+    return {"cancelled": cancelled, "state": stream.state, "bytes": stream.end}
 
-    return StreamingResponse(ai_service.stream_chat(req.messages, target_model), media_type="text/plain")
\ No newline at end of file
+@router.delete("/stream-goals/{stream_id}")
+async def cancel_stream_goals(stream_id: str, model: Optional[str] = None):
+    if stream_id not in ai_service.active_fanouts:
+        raise HTTPException(404, "Stream not found")
+    return {"cancelled": ai_service.cancel_fanout(stream_id, model)}
@@ -0,0 +1,158 @@
+"""
+Compressed storage for the large per-goal blobs (chat_history, thinking_process).
+
+A blob is a 2-byte header followed by the compressed payload:
+
+  byte 0  codec: b"z" raw deflate (zlib), b"s" zstd
+  byte 1  dictionary id: 0 = none, 1 = DICTIONARY_V1
+
+Both codecs are primed with a shared dictionary of what a saved chat turn looks like
+(the ChatTurn / AgentState keys, the plan JSON the system prompt asks for, both plain
+and escaped inside rawOutput, and the usual reasoning phrases). A single row has little
+repetition of its own, so the dictionary is where most of the gain on small rows comes
+from. Decoding reads the header, so the configured codec can change at any time and old
+rows stay readable. A published dictionary must never change: add DICTIONARY_V2 with a
+new id instead.
+"""
+
+import json
+import zlib
+from typing import Any, Optional
+from app.core.config import settings
+from app.core.fast_json import dumps, loads
+from app.core.log_queue import get_logger
+
+try:
+    import zstandard
+except ImportError:  # zlib is always there; zstd blobs then cannot be read
+    zstandard = None
+
+logger = get_logger("blob_codec")
+
+ZLIB = b"z"
+ZSTD = b"s"
+CODECS = {"zlib": ZLIB, "zstd": ZSTD}
+
+_PLAN = (
+    '{"message":"Here is a step-by-step plan to achieve your goal.","steps":['
+    '{"step":"Step 1: Define the Scope","description":"Research the market, identify your target audience and set clear, measurable objectives.","complexity":3},'
+    '{"step":"Step 2: Build the Foundation","description":"Set up the tools, budget and schedule you need, and create a detailed plan for each milestone.","complexity":5},'
+    '{"step":"Step 3: Develop and Test","description":"Create the first version, gather feedback from real users and iterate on the results.","complexity":8},'
+    '{"step":"Step 4: Launch","description":"Prepare a marketing strategy, launch publicly and monitor key metrics closely.","complexity":6},'
+    '{"step":"Step 5: Scale and Improve","description":"Analyze performance data, optimize the process and expand to new opportunities.","complexity":9}]}'
+)
+_REASONING = (
+    "Okay, so the user wants to achieve this goal. Let me break it down into clear, actionable steps. "
+    "First, I need to understand what they are trying to accomplish and what resources they have. "
+    "I should consider the timeline, the budget and the potential challenges. "
+    "Then I'll think about the most important milestones and the order in which they should happen. "
+    "Each step needs a short title, a practical description and a complexity score from 1 to 10. "
+    "I should make sure the plan is realistic and specific, not too generic. "
+    "Finally, I'll output the plan as valid JSON with a message and five steps."
+)
+_AGENT = (
+    '{"modelId":"llama-3.3-70b-versatile","status":"complete","rawOutput":'
+    + json.dumps("<think>\n" + _REASONING + "\n</think>\n\n" + _PLAN)
+    + ',"thinking":' + json.dumps(_REASONING)
+    + ',"jsonResult":' + _PLAN
+    + ',"metrics":{"startTime":1718000000000,"endTime":1718000012345,"firstTokenTime":1718000000456}}'
+)
+_TURN = (
+    '{"id":"turn-1718000000000","userMessage":"I want to launch a small online business",'
+    '"agents":{"llama-3.3-70b-versatile":' + _AGENT + ',"llama-3.1-8b-instant":' + _AGENT.replace("llama-3.3-70b-versatile", "llama-3.1-8b-instant") + '},'
+    '"versions":[{"id":"turn-1718000000000-v1","userMessage":"I want to launch a small online business",'
+    '"agents":{"llama-3.3-70b-versatile":' + _AGENT + '},"downstreamHistory":[],"createdAt":1718000000000}],'
+    '"currentVersionIndex":0}'
+)
+# zlib can only look 32KB back, and the end of the dictionary is closest to the data
+DICTIONARY_V1 = ('"status":"error","status":"stopped","thinking":"","jsonResult":null,' + "[Interrupted] " + _TURN).encode("utf-8")[-32768:]
+DICTIONARIES = {1: DICTIONARY_V1}
+
+
+class BlobCodecError(Exception):
+    """A stored blob cannot be decoded here (unknown header, or zstd without the zstandard package)."""
+
+
+class BlobCodec:
+    def __init__(self, codec: str, level: int = 0, dictionary_id: int = 1):
+        if codec == "zstd" and zstandard is None:
+            logger.info("⚠️ [BLOB] BLOB_COMPRESSION=zstd but the zstandard package is missing. Using zlib.")
+            codec = "zlib"
+        self.enabled = codec in CODECS
+        self.codec = CODECS.get(codec, ZLIB)
+        self.level = level
+        self.dictionary_id = dictionary_id
+        self._zstd_compressor = None
+        self._zstd_decompressors = {}
+        self.encoded = 0
+        self.decoded = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    # --- bytes ---
+
+    def encode(self, data: bytes) -> bytes:
+        dictionary = DICTIONARIES.get(self.dictionary_id)
+        if self.codec == ZSTD:
+            if self._zstd_compressor is None:
+                kwargs = {"level": self.level or 3}
+                if dictionary:
+                    kwargs["dict_data"] = zstandard.ZstdCompressionDict(dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+                self._zstd_compressor = zstandard.ZstdCompressor(**kwargs)
+            payload = self._zstd_compressor.compress(data)
+        else:
+            kwargs = {"zdict": dictionary} if dictionary else {}
+            compressor = zlib.compressobj(self.level or 6, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, **kwargs)
+            payload = compressor.compress(data) + compressor.flush()
+        blob = self.codec + bytes((self.dictionary_id if dictionary else 0,)) + payload
+        self.encoded += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(blob)
+        return blob
+
+    def decode(self, blob: bytes) -> bytes:
+        blob = bytes(blob)  # asyncpg hands back memoryview-like buffers
+        codec, dictionary_id, payload = blob[:1], blob[1], blob[2:]
+        dictionary = DICTIONARIES.get(dictionary_id) if dictionary_id else None
+        if dictionary_id and dictionary is None:
+            raise BlobCodecError(f"Unknown blob dictionary {dictionary_id}")
+        self.decoded += 1
+        if codec == ZLIB:
+            decompressor = zlib.decompressobj(-15, zdict=dictionary) if dictionary else zlib.decompressobj(-15)
+            return decompressor.decompress(payload) + decompressor.flush()
+        if codec == ZSTD:
+            if zstandard is None:
+                raise BlobCodecError("This row is zstd-compressed; install the zstandard package to read it")
+            decompressor = self._zstd_decompressors.get(dictionary_id)
+            if decompressor is None:
+                kwargs = {}
+                if dictionary:
+                    kwargs["dict_data"] = zstandard.ZstdCompressionDict(dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+                decompressor = self._zstd_decompressors[dictionary_id] = zstandard.ZstdDecompressor(**kwargs)
+            return decompressor.decompress(payload)
+        raise BlobCodecError(f"Unknown blob codec {codec!r}")
+
+    # --- typed helpers for the two goal columns ---
+
+    def encode_json(self, value: Any) -> Optional[bytes]:
+        return None if value is None else self.encode(dumps(value))
+
+    def decode_json(self, blob: Optional[bytes]) -> Any:
+        return None if blob is None else loads(self.decode(blob))
+
+    def encode_text(self, value: Optional[str]) -> Optional[bytes]:
+        return None if value is None else self.encode(value.encode("utf-8"))
+
+    def decode_text(self, blob: Optional[bytes]) -> Optional[str]:
+        return None if blob is None else self.decode(blob).decode("utf-8")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": 1 if self.enabled else 0,
+            "encoded": self.encoded,
+            "decoded": self.decoded,
+            "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else 0,
+        }
+
+
+blob_codec = BlobCodec(settings.BLOB_COMPRESSION, settings.BLOB_COMPRESSION_LEVEL)
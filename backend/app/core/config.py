@@ -1,39 +1,158 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
 import urllib.parse
-from typing import List
+from typing import List, Dict, Optional
+
+def async_url(database_url: str) -> str:
+    if "sqlite" in database_url:
+        return database_url
+
+    url = database_url.replace("postgresql://", "postgresql+asyncpg://")
+    try:
+        parsed = urllib.parse.urlparse(url)
+        query_params = urllib.parse.parse_qs(parsed.query)
+        params_to_remove = ['sslmode', 'channel_binding']
+        for param in params_to_remove:
+            if param in query_params:
+                del query_params[param]
+        new_query = urllib.parse.urlencode(query_params, doseq=True)
+        url = urllib.parse.urlunparse(parsed._replace(query=new_query))
+    except Exception:
+        url = url.replace("?sslmode=require", "").replace("&sslmode=require", "")
+        url = url.replace("?channel_binding=require", "").replace("&channel_binding=require", "")
+
+    return url
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Mind Cracker"
     API_V1_STR: str = "/api/v1"
 
     DATABASE_URL: str = Field(..., env="DATABASE_URL")
+    # Read-only endpoints (history, search, turns, stats) use their own pool, on this replica
+    # when set and on DATABASE_URL otherwise. Replica lag shows up as slightly stale lists.
+    DATABASE_READ_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_READ_POOL_SIZE: int = 10
+    DB_READ_MAX_OVERFLOW: int = 10
+    DB_STATEMENT_CACHE_SIZE: int = 500  # prepared statements per read connection (asyncpg); 0 behind pgbouncer < 1.21
 
     # CHANGED: Switched to Groq
     GROQ_API_KEY: str = Field(..., env="GROQ_API_KEY")
-    
+    GROQ_API_URL: str = "https://api.groq.com/openai/v1"
+
+    # Shared upstream HTTP pool (see app/core/http_client.py)
+    UPSTREAM_HTTP2: bool = True
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE: int = 20
+    UPSTREAM_KEEPALIVE_EXPIRY: float = 60.0
+    # Per-host connection caps, e.g. {"api.groq.com": 50}
+    UPSTREAM_HOST_LIMITS: Dict[str, int] = {"api.groq.com": 50}
+
+    # Fan-out streaming (/stream-goals): models per request, and agent streams per worker
+    MAX_MODELS_PER_FANOUT: int = 5
+    MAX_CONCURRENT_AGENT_STREAMS: int = 64
+
+    # Response cache for stream_chat (see app/services/response_cache.py)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL: float = 24 * 3600
+    RESPONSE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    RESPONSE_CACHE_DB_PATH: Optional[str] = None  # e.g. "/tmp/response_cache.db"
+    RESPONSE_CACHE_REPLAY_CHUNK: int = 48  # characters per replayed chunk (0 = one chunk)
+    RESPONSE_CACHE_REPLAY_DELAY: float = 0.0  # seconds between replayed chunks
+
+    # Share one upstream generation between identical concurrent requests
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Write-behind buffer for goal autosaves (PUT /goals/{goal_id} without If-Match). The buffer
+    # lives in one process, so it is turned off when gunicorn runs more than one worker.
+    WRITE_BEHIND_ENABLED: bool = True
+    WRITE_BEHIND_INTERVAL: float = 1.0  # durability window in seconds
+    WRITE_BEHIND_MAX_PENDING: int = 100  # flush early once this many goals are dirty
+
+    # Context window management (see app/services/context_window.py)
+    DEFAULT_CONTEXT_LENGTH: int = 8192  # for models missing from the catalog
+    MAX_COMPLETION_TOKENS: int = 4096
+    CONTEXT_INPUT_BUDGET: int = 6000  # cap on prompt tokens so time-to-first-token stays flat
+    CONTEXT_SUMMARY_BUDGET: int = 800
+    CONTEXT_SAFETY_MARGIN: int = 256
+    CONTEXT_CACHE_SIZE: int = 2048  # conversations with cached token counts / summaries
+
+    # Model router: retries, circuit breaker and failover (see app/services/model_router.py)
+    ROUTER_MAX_ATTEMPTS: int = 3
+    ROUTER_ATTEMPTS_PER_MODEL: int = 2
+    ROUTER_BACKOFF_BASE: float = 0.25
+    ROUTER_MAX_BACKOFF: float = 4.0
+    ROUTER_FAILURE_THRESHOLD: int = 5  # consecutive failures before the circuit opens
+    ROUTER_OPEN_SECONDS: float = 30.0
+    ROUTER_EWMA_ALPHA: float = 0.2
+    ROUTER_DEFAULT_TTFT: float = 1.0  # prior for models with no observations yet
+
+    # Model catalog, refreshed in the background (see app/services/model_catalog.py)
+    MODEL_CATALOG_REFRESH_INTERVAL: float = 300.0
+    MODEL_CATALOG_RETRY_INTERVAL: float = 15.0  # after a failed refresh
+
+    # Merge small deltas into fewer writes on the text stream (see app/services/stream_coalescer.py)
+    STREAM_COALESCE_ENABLED: bool = True
+    STREAM_COALESCE_BYTES: int = 512
+    STREAM_COALESCE_WINDOW: float = 0.02  # seconds; the first token is never held back
+
+    # Resumable streams (see app/services/stream_hub.py)
+    STREAM_RESUME_ENABLED: bool = True
+    STREAM_RESUME_BUFFER_BYTES: int = 256 * 1024  # ring buffer per stream; older bytes cannot be resumed
+    STREAM_RESUME_GRACE: float = 10.0  # seconds a stream with no client keeps its upstream alive
+    STREAM_RESUME_TTL: float = 60.0  # seconds a finished stream stays readable
+    STREAM_RESUME_MAX_STREAMS: int = 1000
+
+    # Rate limits and quotas shared by all workers: memory:// (single worker),
+    # sqlite:////path/ratelimit.db (one host) or redis://host:6379 (any Redis-protocol server)
+    RATE_LIMIT_STORAGE_URI: str = "memory://"
+    RATE_LIMIT_ENABLED: bool = True  # bench.run turns request limits off to measure raw throughput
+    QUOTA_MAX_CONCURRENT_STREAMS: int = 8  # per user (or IP when anonymous); a fan-out counts one per model
+    QUOTA_STREAM_SLOT_TTL: int = 600  # slots leaked by a killed worker free themselves after this
+    QUOTA_TOKENS_PER_DAY: int = 0  # estimated prompt + completion tokens per user per day; 0 disables
+
+    # Batch decomposition jobs (see app/services/batch_runner.py)
+    BATCH_MAX_ITEMS: int = 500  # (goal, model) pairs per job
+    BATCH_CONCURRENCY: int = 8  # items in flight per worker
+    BATCH_PER_MODEL_CONCURRENCY: int = 3  # per model, so one big job cannot eat a model's provider rate limit
+    BATCH_MAX_ATTEMPTS: int = 5  # rate-limited / unavailable items are rescheduled until this many tries
+    BATCH_RETRY_DELAY: float = 5.0  # first reschedule delay; doubles per attempt
+    BATCH_WRITE_SIZE: int = 25  # finished items per bulk insert
+    BATCH_POLL_INTERVAL: float = 1.0  # queue scan / result write interval (seconds)
+    BATCH_LEASE_SECONDS: float = 300.0  # a claimed item whose worker died is retried after this
+
+    # Goal blob storage (see app/core/blob_codec.py): "off" keeps chat_history / thinking_process
+    # as plain JSON / text; "zlib" or "zstd" writes them compressed into chat_history_z / thinking_z
+    # (and goal_turns.thinking / result into thinking_z / result_z).
+    # Rows in the other layout stay readable; backfill_blobs.py converts them.
+    BLOB_COMPRESSION: str = "off"
+    BLOB_COMPRESSION_LEVEL: int = 0  # 0 = codec default (zlib 6, zstd 3); zlib 1 encodes ~2x faster, ~2x larger
+
+    # Conditional GET for /history/{user_id} (see app/services/history_cache.py)
+    HISTORY_CACHE_ENABLED: bool = True
+    HISTORY_CACHE_MAX_BYTES: int = 16 * 1024 * 1024  # serialized responses kept per worker
+    HISTORY_VERSION_TTL: int = 30 * 86400  # idle per-user version counters expire after this
+
+    # prestart.py reports schema checks slower than this (a cold-start regression)
+    STARTUP_BUDGET_MS: int = 1500
+
     BACKEND_CORS_ORIGINS: list[str] = ["*"]
 
+    # gunicorn workers (Dockerfile CMD); per-process state such as the write-behind buffer checks it
+    WEB_CONCURRENCY: int = 1
+
+    @property
+    def write_behind_enabled(self) -> bool:
+        return self.WRITE_BEHIND_ENABLED and self.WEB_CONCURRENCY <= 1
+
     @property
     def async_database_url(self) -> str:
-        if "sqlite" in self.DATABASE_URL:
-            return self.DATABASE_URL
-
-        url = self.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
-        try:
-            parsed = urllib.parse.urlparse(url)
-            query_params = urllib.parse.parse_qs(parsed.query)
-            params_to_remove = ['sslmode', 'channel_binding']
-            for param in params_to_remove:
-                if param in query_params:
-                    del query_params[param]
-            new_query = urllib.parse.urlencode(query_params, doseq=True)
-            url = urllib.parse.urlunparse(parsed._replace(query=new_query))
-        except Exception:
-            url = url.replace("?sslmode=require", "").replace("&sslmode=require", "")
-            url = url.replace("?channel_binding=require", "").replace("&channel_binding=require", "")
-
-        return url
+        return async_url(self.DATABASE_URL)
+
+    @property
+    def async_read_database_url(self) -> str:
+        return async_url(self.DATABASE_READ_URL or self.DATABASE_URL)
 
     class Config:
         env_file = ".env"
@@ -1,11 +1,35 @@
+import time
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.core.metrics import DB_CHECKOUT_WAIT, DB_QUERY, stats_collector
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Default async pool, plus a histogram of how long checkouts wait for a connection."""
+
+    label = "write"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_CHECKOUT_WAIT.labels(self.label).observe(time.perf_counter() - started)
+
+
+class ReadQueuePool(TimedQueuePool):
+    label = "read"
+
+
+IS_POSTGRES = "postgresql" in settings.DATABASE_URL
 
 # Define connection arguments
 connect_args = {}
 
-if "postgresql" in settings.DATABASE_URL:
+if IS_POSTGRES:
     connect_args = {
         "server_settings": {
             "jit": "off"  
@@ -16,13 +40,78 @@ engine = create_async_engine(
     settings.async_database_url,
     echo=False,
     pool_pre_ping=True,
-    pool_size=20,
-    max_overflow=10,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
     pool_recycle=3600,
+    poolclass=TimedQueuePool,
     connect_args=connect_args
 )
 
+# Reads get their own pool (on the replica when DATABASE_READ_URL is set), so history
+# polling never waits behind autosaves for a connection. AUTOCOMMIT skips the BEGIN /
+# COMMIT round trips of a transaction per request; the connections refuse writes.
+read_connect_args = {}
+if IS_POSTGRES:
+    read_connect_args = {
+        # SQLAlchemy's per-connection cache of asyncpg prepared statements (default 100): the
+        # read endpoints run a few fixed queries, so after warm-up none is parsed or planned again
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "server_settings": {"jit": "off", "default_transaction_read_only": "on"},
+    }
+
+read_engine = create_async_engine(
+    settings.async_read_database_url,
+    echo=False,
+    pool_pre_ping=True,
+    pool_size=settings.DB_READ_POOL_SIZE,
+    max_overflow=settings.DB_READ_MAX_OVERFLOW,
+    pool_recycle=3600,
+    poolclass=ReadQueuePool,
+    isolation_level="AUTOCOMMIT",
+    connect_args=read_connect_args,
+)
+
+if not IS_POSTGRES:
+    @event.listens_for(read_engine.sync_engine, "connect")
+    def _sqlite_query_only(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+
+def _instrument(target, label: str):
+    @event.listens_for(target.sync_engine, "before_cursor_execute")
+    def _query_started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(target.sync_engine, "after_cursor_execute")
+    def _query_finished(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        DB_QUERY.labels(label, statement.split(None, 1)[0].upper()).observe(time.perf_counter() - started)
+
+    @event.listens_for(target.sync_engine, "handle_error")
+    def _query_failed(context):
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
+
+
+def _pool_stats(target):
+    return lambda: {
+        "size": target.pool.size(),
+        "checked_out": target.pool.checkedout(),
+        "checked_in": target.pool.checkedin(),
+        "overflow": target.pool.overflow(),
+    }
+
+
+_instrument(engine, "write")
+_instrument(read_engine, "read")
+stats_collector.register("db_pool", _pool_stats(engine))
+stats_collector.register("db_read_pool", _pool_stats(read_engine))
+
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+ReadSessionLocal = sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
 async def get_db():
@@ -32,6 +121,10 @@ async def get_db():
         finally:
             await session.close()
 
-async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+async def get_read_db():
+    """Session for handlers that only read: separate pool, autocommit, possibly a replica."""
+    async with ReadSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
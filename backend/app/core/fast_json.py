@@ -0,0 +1,97 @@
+import json
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Optional
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback; same output, just slower
+    orjson = None
+
+DATA_PREFIX = b"data:"
+DONE = b"[DONE]"
+_DELTA = b'"delta":{'
+_CONTENT = b'"content":'
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps(value: Any) -> bytes:
+        return orjson.dumps(value)
+else:
+    loads = json.loads
+
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _content_slow(payload: bytes) -> Optional[bytes]:
+    try:
+        content = loads(payload)["choices"][0]["delta"].get("content")
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+    return content.encode("utf-8") if content else None
+
+
+def delta_content(payload: bytes) -> Optional[bytes]:
+    """
+    choices[0].delta.content of one chat.completion.chunk, as UTF-8 bytes. Plain string
+    values are sliced straight out of the payload (no parse, no decode/encode round
+    trip); anything with escapes, or laid out unexpectedly, goes through a full parse.
+    """
+    start = payload.find(_DELTA)
+    if start == -1:
+        return _content_slow(payload)
+    key = payload.find(_CONTENT, start)
+    end_of_delta = payload.find(b"}", start)
+    if key == -1 or end_of_delta < key:
+        return _content_slow(payload)
+    before = payload[start + len(_DELTA):key]
+    if b"{" in before or b"[" in before or b"\\" in before:
+        return _content_slow(payload)  # "content" may belong to a nested object (tool_calls) or sit inside a string
+    value = key + len(_CONTENT)
+    if payload[value:value + 1] != b'"':
+        return None if payload.startswith(b"null", value) else _content_slow(payload)
+    close = payload.find(b'"', value + 1)
+    content = payload[value + 1:close]
+    if close == -1 or b"\\" in content:
+        return _content_slow(payload)
+    return content or None
+
+
+def sse_data(line: bytes) -> bytes:
+    # SSE strips one space after the colon, if there is one
+    value = line[len(DATA_PREFIX):].rstrip(b"\r")
+    return value[1:] if value.startswith(b" ") else value
+
+
+async def sse_payloads(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """`data:` payloads of an SSE byte stream, split on raw bytes (no per-line str decoding)."""
+    pending = b""
+    async for chunk in chunks:
+        pending = pending + chunk if pending else chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.startswith(DATA_PREFIX):
+                yield sse_data(line)
+    if pending.startswith(DATA_PREFIX):
+        yield sse_data(pending)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse serialized with orjson. Endpoints return it with plain dicts to skip
+    FastAPI's response_model re-validation of rows built from our own columns; the
+    response_model stays on the route for the OpenAPI schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,93 @@
+import httpx
+from typing import Dict, Optional
+from app.core.config import settings
+
+try:
+    import h2  # noqa: F401  (HTTP/2 support for httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class UpstreamClient:
+    """
+    One long-lived httpx.AsyncClient shared by every call to the LLM provider.
+    Opened in main.py's lifespan and closed on shutdown, so concurrent streams
+    reuse warm (keep-alive / HTTP/2 multiplexed) connections instead of paying
+    a TCP+TLS handshake per request.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._transports: Dict[str, httpx.AsyncHTTPTransport] = {}
+        self.requests_sent = 0
+
+    def _limits(self, max_connections: int) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=min(settings.UPSTREAM_MAX_KEEPALIVE, max_connections),
+            keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+        )
+
+    def _build(self) -> httpx.AsyncClient:
+        http2 = settings.UPSTREAM_HTTP2 and HTTP2_AVAILABLE
+
+        # Each configured host gets its own transport (and therefore its own pool limits)
+        self._transports = {}
+        mounts = {}
+        for host, max_conn in settings.UPSTREAM_HOST_LIMITS.items():
+            transport = httpx.AsyncHTTPTransport(http2=http2, limits=self._limits(max_conn))
+            self._transports[host] = transport
+            mounts[f"all://{host}"] = transport
+
+        default = httpx.AsyncHTTPTransport(http2=http2, limits=self._limits(settings.UPSTREAM_MAX_CONNECTIONS))
+        self._transports["*"] = default
+
+        return httpx.AsyncClient(
+            transport=default,
+            mounts=mounts,
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            event_hooks={"request": [self._count_request]},
+        )
+
+    async def _count_request(self, request: httpx.Request):
+        self.requests_sent += 1
+
+    async def start(self):
+        if self._client is None or self._client.is_closed:
+            self._client = self._build()
+            print(f"🔌 [HTTP] Upstream pool ready (http2={settings.UPSTREAM_HTTP2 and HTTP2_AVAILABLE}).", flush=True)
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._transports = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Lazily open the pool for scripts/tests that run without the app lifespan
+        if self._client is None or self._client.is_closed:
+            self._client = self._build()
+        return self._client
+
+    def stats(self) -> dict:
+        pools = {}
+        for host, transport in self._transports.items():
+            pool = getattr(transport, "_pool", None)
+            connections = list(getattr(pool, "connections", []) or [])
+            pools[host] = {
+                "connections": len(connections),
+                "idle": sum(1 for c in connections if c.is_idle()),
+                "available": sum(1 for c in connections if c.is_available()),
+                "max_connections": getattr(pool, "_max_connections", None),
+            }
+        return {
+            "open": self._client is not None and not self._client.is_closed,
+            "http2": settings.UPSTREAM_HTTP2 and HTTP2_AVAILABLE,
+            "requests_sent": self.requests_sent,
+            "pools": pools,
+        }
+
+
+upstream = UpstreamClient()
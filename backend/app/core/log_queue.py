@@ -0,0 +1,24 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+# Request-path log lines are handed to a queue; a background thread does the (blocking) stdout writes
+_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_listener = logging.handlers.QueueListener(_queue, logging.StreamHandler(sys.stdout), respect_handler_level=False)
+
+_root = logging.getLogger("mindcracker")
+_root.setLevel(logging.INFO)
+_root.addHandler(logging.handlers.QueueHandler(_queue))
+_root.propagate = False
+
+_listener.start()
+
+
+def get_logger(name: str) -> logging.Logger:
+    return _root.getChild(name)
+
+
+# Flush whatever is still queued when the worker exits
+atexit.register(_listener.stop)
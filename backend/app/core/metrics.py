@@ -0,0 +1,113 @@
+import os
+import time
+from typing import Callable, Dict
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+# --- Upstream streaming (per model) ---
+UPSTREAM_CONNECT = Histogram(
+    "mindcracker_upstream_connect_seconds", "Request sent until upstream response headers", ["model"],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+TTFT = Histogram(
+    "mindcracker_time_to_first_token_seconds", "Request sent until the first content delta", ["model"],
+    buckets=(0.1, 0.25, 0.5, 0.75, 1, 1.5, 2.5, 5, 10, 30),
+)
+INTER_TOKEN = Histogram(
+    "mindcracker_inter_token_seconds", "Gap between consecutive content deltas", ["model"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+TOKENS_PER_SECOND = Histogram(
+    "mindcracker_tokens_per_second", "Content deltas per second after the first one", ["model"],
+    buckets=(5, 10, 25, 50, 100, 200, 400, 800, 1600),
+)
+STREAM_DURATION = Histogram(
+    "mindcracker_stream_duration_seconds", "Whole upstream stream, request to last delta", ["model"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 40, 80, 160),
+)
+UPSTREAM_ERRORS = Counter("mindcracker_upstream_errors_total", "Failed upstream attempts", ["model", "reason"])
+ACTIVE_STREAMS = Gauge("mindcracker_active_streams", "Client streams currently open", multiprocess_mode="livesum")
+
+# --- HTTP endpoints and database ---
+REQUEST_LATENCY = Histogram(
+    "mindcracker_http_request_seconds", "Request received until response headers", ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+DB_QUERY = Histogram(
+    "mindcracker_db_query_seconds", "Statement execution time", ["engine", "operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+DB_CHECKOUT_WAIT = Histogram(
+    "mindcracker_db_pool_checkout_seconds", "Wait for a pooled database connection", ["engine"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+
+
+class StatsCollector(Collector):
+    """
+    Exposes the services' existing stats() dicts (caches, pools, buffers) as gauges at
+    scrape time, so the hot path pays nothing for them.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], dict]] = {}
+
+    def register(self, name: str, stats: Callable[[], dict]):
+        self._sources[name] = stats
+
+    def collect(self):
+        for name, stats in self._sources.items():
+            family = GaugeMetricFamily(f"mindcracker_{name}", f"{name} stats()", labels=["field"])
+            for field, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    family.add_metric([field], value)
+            yield family
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def _route_template(scope) -> str:
+    """/api/v1/history/abc -> /api/v1/history/{user_id}; unknown paths share one label."""
+    if "route" not in scope:
+        return "unmatched"
+    path = scope["path"]
+    for name, value in scope.get("path_params", {}).items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing every request per route template (not per concrete URL)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        recorded = False
+
+        async def timed_send(message):
+            nonlocal recorded
+            if message["type"] == "http.response.start" and not recorded:
+                recorded = True
+                REQUEST_LATENCY.labels(scope["method"], _route_template(scope), str(message["status"])).observe(time.perf_counter() - started)
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
+
+
+def render() -> tuple:
+    """(body, content type) for /metrics; aggregates all workers when PROMETHEUS_MULTIPROC_DIR is set."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(stats_collector)  # per-worker view: whichever worker answered the scrape
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,154 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import AsyncIterator, Optional
+from urllib.parse import urlparse
+from fastapi import HTTPException, Request
+from limits.storage import MemoryStorage, Storage, storage_from_string
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+from app.core.config import settings
+
+
+class SQLiteStorage(Storage):
+    """
+    `limits` storage backed by one SQLite file, so every gunicorn worker on the host
+    shares the same counters (sqlite:////var/run/mind-cracker/ratelimit.db).
+    Anything speaking the Redis protocol can be used instead via redis:// URIs.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = urlparse(uri).path if uri else ""
+        self.path = path if path not in ("", "/") else ":memory:"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)")
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT value, expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+                if row is None or row[1] <= now:
+                    value, expires_at = amount, now + expiry
+                else:
+                    value, expires_at = row[0] + amount, row[1]
+                self._db.execute(
+                    "INSERT OR REPLACE INTO counters (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at),
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return value
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM counters WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        with self._lock:
+            row = self._db.execute("SELECT expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            with self._lock:
+                self._db.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        with self._lock:
+            return self._db.execute("DELETE FROM counters").rowcount
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM counters WHERE key = ?", (key,))
+
+
+def client_key(request: Request) -> str:
+    # The client address, not the body's user_id: that is caller-chosen, so rotating it would reset the caps
+    return f"ip:{get_remote_address(request)}"
+
+
+# One limiter for the whole app (main.py and the goals router), on the shared backend
+limiter = Limiter(key_func=get_remote_address, storage_uri=settings.RATE_LIMIT_STORAGE_URI, enabled=settings.RATE_LIMIT_ENABLED)
+shared_storage = storage_from_string(settings.RATE_LIMIT_STORAGE_URI)
+
+
+class StreamQuota:
+    """
+    Per-client admission for streaming endpoints, on the same shared storage as the limiter:
+    a cap on concurrent streams and a daily token quota (prompt + completion estimate).
+    """
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        # Memory storage is a dict lookup; anything else (SQLite file, Redis) is blocking I/O
+        self._inline = isinstance(storage, MemoryStorage)
+
+    async def _call(self, fn, *args):
+        if self._inline:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def check_tokens(self, key: str):
+        if settings.QUOTA_TOKENS_PER_DAY > 0:
+            used = await self._call(self.storage.get, f"quota:tokens:{key}")
+            if used >= settings.QUOTA_TOKENS_PER_DAY:
+                raise HTTPException(429, "Daily token quota exceeded")
+
+    async def acquire(self, key: str, slots: int = 1):
+        await self.check_tokens(key)
+        slot_key = f"quota:streams:{key}"
+        active = await self._call(self.storage.incr, slot_key, settings.QUOTA_STREAM_SLOT_TTL, slots)
+        if active > settings.QUOTA_MAX_CONCURRENT_STREAMS:
+            await self.release(key, slots)
+            raise HTTPException(429, "Too many concurrent streams")
+
+    async def release(self, key: str, slots: int = 1):
+        slot_key = f"quota:streams:{key}"
+        if await self._call(self.storage.incr, slot_key, settings.QUOTA_STREAM_SLOT_TTL, -slots) < 0:
+            # The slot window expired while streams were running; start counting afresh
+            await self._call(self.storage.clear, slot_key)
+
+    async def charge(self, key: str, tokens: int):
+        if tokens > 0 and settings.QUOTA_TOKENS_PER_DAY > 0:
+            await self._call(self.storage.incr, f"quota:tokens:{key}", 86400, tokens)
+
+    async def hold(self, source: AsyncIterator, key: str, slots: int = 1):
+        """Pass `source` through and give the stream slots back however it ends."""
+        try:
+            async for chunk in source:
+                yield chunk
+        finally:
+            await self.release(key, slots)
+
+    async def metered(self, source: AsyncIterator, key: str, prompt_tokens: int):
+        """Pass `source` through and charge the prompt plus ~4 characters per completion token."""
+        chars = 0
+        try:
+            async for chunk in source:
+                chars += len(chunk)
+                yield chunk
+        finally:
+            await self.charge(key, prompt_tokens + chars // 4)
+            await source.aclose()
+
+
+stream_quota = StreamQuota(shared_storage)
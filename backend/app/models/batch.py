@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Index, ForeignKey
+from datetime import datetime
+from app.core.database import Base
+
+class BatchJob(Base):
+    """A bulk decomposition request: one row per submitted file, items below."""
+    __tablename__ = "batch_jobs"
+
+    id = Column(String, primary_key=True)  # uuid hex, handed to the client
+    user_id = Column(String, index=True, nullable=True)
+    status = Column(String, nullable=False, default="queued")  # queued | running | done | cancelled
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0, server_default="0")
+    failed = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class BatchItem(Base):
+    """One (goal, model) pair of a job. The claim columns make the queue safe across workers and restarts."""
+    __tablename__ = "batch_items"
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(String, ForeignKey("batch_jobs.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)  # line number in the submitted file
+    goal_text = Column(Text, nullable=False)
+    model = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending | running | done | error
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    not_before = Column(Float, nullable=True)  # epoch seconds; set when rescheduled after a rate limit
+    lease_until = Column(Float, nullable=True)  # epoch seconds; a running item past this is reclaimed
+    goal_id = Column(Integer, ForeignKey("goals.id", ondelete="SET NULL"), nullable=True)
+    error = Column(Text, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # The dispatcher's scan (status = 'pending' ORDER BY id) and the results feed per job
+        Index("ix_batch_items_status", "status", "id"),
+        Index("ix_batch_items_job", "job_id", "status", "finished_at"),
+    )
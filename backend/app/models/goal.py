@@ -1,7 +1,12 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, Text
+from sqlalchemy import Column, Integer, String, JSON, DateTime, Text, Index, ForeignKey, UniqueConstraint, LargeBinary, func, literal_column
 from datetime import datetime
 from app.core.database import Base
 
+# Legacy rows can have updated_at (and even created_at) NULL; the history list sorts them as of the epoch.
+# A literal, not a bound parameter, so queries match the expression index below.
+EPOCH = datetime(1970, 1, 1)
+EPOCH_SQL = "'1970-01-01 00:00:00.000000'"
+
 class Goal(Base):
     __tablename__ = "goals"
 
@@ -11,6 +16,53 @@ class Goal(Base):
     model_used = Column(String)
     breakdown = Column(JSON)
     thinking_process = Column(Text, nullable=True)
-    chat_history = Column(JSON, nullable=True)
+    chat_history = Column(JSON(none_as_null=True), nullable=True)  # None is SQL NULL, not JSON 'null'
+    # BLOB_COMPRESSION layout of the two columns above (app/core/blob_codec.py); a row uses one or the other.
+    # Read through app/services/blob_store.py, which decodes only when a caller asks for the value.
+    thinking_z = Column(LargeBinary, nullable=True)
+    chat_history_z = Column(LargeBinary, nullable=True)
+    # Bumped on every write; used as the ETag for optimistic concurrency
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Backs the keyset-paginated sidebar query (user_id = ? ORDER BY recency DESC, id DESC)
+        Index("ix_goals_user_recent", "user_id", func.coalesce(updated_at, created_at, literal_column(EPOCH_SQL)).desc(), id.desc()),
+    )
+
+
+# Sort key of the history list (see EPOCH); goal_recency() is the same value for a loaded row
+GOAL_RECENCY = func.coalesce(Goal.updated_at, Goal.created_at, literal_column(EPOCH_SQL))
+
+
+def goal_recency(goal: "Goal") -> datetime:
+    return goal.updated_at or goal.created_at or EPOCH
+
+
+class GoalTurn(Base):
+    """One agent's answer for one version of one turn; chat_history exploded into rows."""
+    __tablename__ = "goal_turns"
+
+    id = Column(Integer, primary_key=True)
+    goal_id = Column(Integer, ForeignKey("goals.id", ondelete="CASCADE"), nullable=False)
+    turn_index = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, default=0)
+    turn_uid = Column(String, nullable=True)  # ChatTurn.id from the frontend
+    user_message = Column(Text, nullable=True)
+    agent_model = Column(String, nullable=False)
+    status = Column(String, nullable=True)
+    thinking = Column(Text, nullable=True)
+    result = Column(JSON(none_as_null=True), nullable=True)  # None is SQL NULL, so the layouts can be told apart
+    # BLOB_COMPRESSION layout of thinking / result, as on Goal; read through blob_store.turn_thinking() / turn_result()
+    thinking_z = Column(LargeBinary, nullable=True)
+    result_z = Column(LargeBinary, nullable=True)
+    metrics = Column(JSON, nullable=True)
+    duration_ms = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("goal_id", "turn_index", "version", "agent_model", name="uq_goal_turns_slot"),
+        Index("ix_goal_turns_model_status", "agent_model", "status"),
+    )
@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from typing import Any, List, Optional
+from datetime import datetime
+
+class BatchSubmitted(BaseModel):
+    job_id: str
+    items: int
+    status: str
+
+class BatchJobInfo(BaseModel):
+    id: str
+    status: str  # queued | running | done | cancelled
+    total: int
+    completed: int
+    failed: int
+    pending: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+class BatchResult(BaseModel):
+    """One NDJSON line of GET /batches/{job_id}/results."""
+    position: int
+    goal: str
+    model: str
+    status: str  # done | error | cancelled
+    goal_id: Optional[int] = None
+    steps: Optional[List[Any]] = None
+    error: Optional[str] = None
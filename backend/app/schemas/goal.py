@@ -10,6 +10,22 @@ class StreamRequest(BaseModel):
     messages: List[ChatMessage]
     model: str
     user_id: Optional[str] = None
+    format: str = "text"  # "text" (raw tokens) or "events" (parsed NDJSON events)
+    allow_failover: bool = False  # may answer with another healthy model if this one is failing
+    # When set, the server saves the finished agent result into this goal's turn itself
+    goal_id: Optional[int] = None
+    turn_id: Optional[str] = None
+    version_index: Optional[int] = None
+
+class MultiStreamRequest(BaseModel):
+    messages: List[ChatMessage]
+    models: List[str]
+    user_id: Optional[str] = None
+    format: str = "text"  # "text" (raw chunk frames) or "events" (parsed event frames)
+    allow_failover: bool = False
+    goal_id: Optional[int] = None
+    turn_id: Optional[str] = None
+    version_index: Optional[int] = None
 
 class ModelInfo(BaseModel):
     id: str
@@ -22,6 +38,40 @@ class SaveGoalRequest(BaseModel):
     chat_history: List[Any] # Receives ChatTurn[]
     preview: Optional[Any] = None 
 
+class GoalPatchRequest(BaseModel):
+    op: str  # "append" | "replace" | "json_patch"
+    base_version: Optional[int] = None  # alternative to the If-Match header
+    turn: Optional[Any] = None  # ChatTurn for "append" / "replace"
+    index: Optional[int] = None  # turn index for "replace" (negative counts from the end)
+    patch: Optional[List[dict]] = None  # RFC 6902 operations on chat_history for "json_patch"
+    title: Optional[str] = None
+    preview: Optional[Any] = None
+
+class TurnWriteRequest(BaseModel):
+    turn: Any  # ChatTurn
+    base_version: Optional[int] = None
+
+class GoalTurnItem(BaseModel):
+    turn_index: int
+    version: int
+    turn_uid: Optional[str] = None
+    user_message: Optional[str] = None
+    model: str
+    status: Optional[str] = None
+    thinking: Optional[str] = None
+    result: Optional[Any] = None
+    metrics: Optional[dict] = None
+    duration_ms: Optional[int] = None
+
+class HistorySummary(BaseModel):
+    id: int
+    goal: str
+    model: str
+    date: datetime
+
+class SearchResult(HistorySummary):
+    rank: float
+
 class HistoryItem(BaseModel):
     id: int
     goal: str
@@ -30,6 +80,7 @@ class HistoryItem(BaseModel):
     preview: List[dict]
     thinking: Optional[str] = None
     chat_history: Optional[List[Any]] = None
+    version: Optional[int] = None
 
 class SloganItem(BaseModel):
     headline: str
@@ -3,14 +3,22 @@ import json
 import asyncio
 import re
 import random
-import logging
-import sys
-from typing import AsyncGenerator, List
+import uuid
+import hashlib
+import time
+from typing import AsyncGenerator, Callable, Dict, List, Optional
 from app.core.config import settings
+from app.core.http_client import upstream
+from app.core.fast_json import DONE, delta_content, sse_payloads
+from app.core.log_queue import get_logger
+from app.core.metrics import ACTIVE_STREAMS, INTER_TOKEN, STREAM_DURATION, TOKENS_PER_SECOND, TTFT, UPSTREAM_CONNECT, UPSTREAM_ERRORS
+from app.services.response_cache import response_cache
+from app.services.single_flight import single_flight
+from app.services.context_window import context_window
+from app.services.model_router import model_router, RETRYABLE_STATUS
 from app.schemas.goal import ChatMessage, SloganItem
 
-logging.basicConfig(stream=sys.stdout, level=logging.INFO)
-logger = logging.getLogger("ai_service")
+logger = get_logger("ai_service")
 
 # --- PROMPT ---
 SYSTEM_PROMPT = """
@@ -38,6 +46,9 @@ OUTPUT FORMAT:
 Complexity is 1-10. No markdown blocks.
 """
 
+# Part of every response cache key, so editing the prompt never serves stale plans
+SYSTEM_PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
 FALLBACK_SLOGANS = [
     SloganItem(headline="Action Over Anxiety", subtext="Stop overthinking. Get a plan.", example="Launch a Podcast"),
     SloganItem(headline="Complexity Killer", subtext="We eat big goals for breakfast.", example="Learn Japanese"),
@@ -45,10 +56,170 @@ FALLBACK_SLOGANS = [
     SloganItem(headline="Zero to One", subtext="The fastest path from execution.", example="Write a Novel")
 ]
 
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+def _partial_tag_len(text: str, tag: str) -> int:
+    """Length of the longest suffix of `text` that is a prefix of `tag` (a tag split across chunks)."""
+    for k in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:k]):
+            return k
+    return 0
+
+class PlanStreamParser:
+    """
+    Incremental state machine for the SYSTEM_PROMPT output (<think>...</think> then the JSON plan).
+    feed() only scans the new delta and returns typed events:
+      {"type": "thinking", "data": str}   reasoning text delta
+      {"type": "message", "data": str}    the plan's summary message
+      {"type": "step", "index": int, "data": dict}  each step object as soon as it closes
+      {"type": "done", "plan": dict | None}
+    `finished` flips once the root JSON object closes, so callers can stop reading upstream.
+    """
+
+    def __init__(self):
+        self.state = "preamble"  # preamble -> think -> preamble -> json -> done
+        self._pending = ""       # held-back text that may be the start of a tag
+        self._buf = ""           # JSON text only (thinking is never buffered)
+        self._stack = []         # [(opening char, index in _buf)]
+        self._in_string = False
+        self._escape = False
+        self._str_start = 0
+        self._expect_value = False
+        self._root_key = None
+        self.message = None
+        self.steps: List[dict] = []
+        self.plan = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state == "done"
+
+    def feed(self, delta: str) -> List[dict]:
+        events: List[dict] = []
+        text = self._pending + delta
+        self._pending = ""
+
+        while text and self.state != "done":
+            if self.state == "preamble":
+                i_think = text.find(THINK_OPEN)
+                i_brace = text.find("{")
+                if i_think != -1 and (i_brace == -1 or i_think < i_brace):
+                    text = text[i_think + len(THINK_OPEN):]
+                    self.state = "think"
+                elif i_brace != -1:
+                    text = text[i_brace:]
+                    self.state = "json"
+                else:
+                    keep = _partial_tag_len(text, THINK_OPEN)
+                    self._pending = text[len(text) - keep:] if keep else ""
+                    text = ""
+
+            elif self.state == "think":
+                i = text.find(THINK_CLOSE)
+                if i != -1:
+                    if i:
+                        events.append({"type": "thinking", "data": text[:i]})
+                    text = text[i + len(THINK_CLOSE):]
+                    self.state = "preamble"
+                else:
+                    keep = _partial_tag_len(text, THINK_CLOSE)
+                    emit = text[:len(text) - keep]
+                    if emit:
+                        events.append({"type": "thinking", "data": emit})
+                    self._pending = text[len(text) - keep:] if keep else ""
+                    text = ""
+
+            elif self.state == "json":
+                self._consume_json(text, events)
+                text = ""
+
+        return events
+
+    def close(self) -> List[dict]:
+        """Flush at end of stream. Always ends with a "done" event."""
+        events: List[dict] = []
+        if self.state == "think" and self._pending:
+            events.append({"type": "thinking", "data": self._pending})
+        self._pending = ""
+        if self.state != "done":
+            if self.plan is None and (self.message is not None or self.steps):
+                self.plan = {"message": self.message or "", "steps": self.steps}
+            self.state = "done"
+            events.append({"type": "done", "plan": self.plan})
+        return events
+
+    def _consume_json(self, text: str, events: List[dict]):
+        start = len(self._buf)
+        self._buf += text
+        buf = self._buf
+        stack = self._stack
+
+        for idx in range(start, len(buf)):
+            c = buf[idx]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if len(stack) == 1:
+                        self._root_string(buf[self._str_start:idx + 1], events)
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._str_start = idx
+            elif c == "{" or c == "[":
+                stack.append((c, idx))
+            elif c == "}" or c == "]":
+                if not stack:
+                    continue
+                _, opened_at = stack.pop()
+                depth = len(stack)
+                if c == "}" and depth == 2 and stack[1][0] == "[" and self._root_key == "steps":
+                    try:
+                        step = json.loads(buf[opened_at:idx + 1])
+                    except ValueError:
+                        continue
+                    self.steps.append(step)
+                    events.append({"type": "step", "index": len(self.steps) - 1, "data": step})
+                elif depth == 0:
+                    try:
+                        self.plan = json.loads(buf[opened_at:idx + 1])
+                    except ValueError:
+                        self.plan = {"message": self.message or "", "steps": self.steps}
+                    self.state = "done"
+                    events.append({"type": "done", "plan": self.plan})
+                    return
+            elif len(stack) == 1:
+                if c == ":":
+                    self._expect_value = True
+                elif c == ",":
+                    self._expect_value = False
+
+    def _root_string(self, literal: str, events: List[dict]):
+        try:
+            value = json.loads(literal)
+        except ValueError:
+            return
+        if not self._expect_value:
+            self._root_key = value
+            return
+        self._expect_value = False
+        if self._root_key == "message":
+            self.message = value
+            events.append({"type": "message", "data": value})
+
 class AIService:
     def __init__(self):
         self.key = settings.GROQ_API_KEY
         self.timeout = httpx.Timeout(30.0, connect=10.0)
+        # Caps agent streams across all fan-out requests in this worker
+        self._agent_slots = asyncio.Semaphore(settings.MAX_CONCURRENT_AGENT_STREAMS)
+        # stream_id -> {model: task} for per-model cancellation of fan-out streams
+        self.active_fanouts: Dict[str, Dict[str, asyncio.Task]] = {}
         print(f"🔧 [AI SERVICE] Initialized with Groq API.", flush=True)
 
     def _get_headers(self):
@@ -64,10 +235,9 @@ class AIService:
             "max_tokens": 50
         }
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                resp = await client.post("https://api.groq.com/openai/v1/chat/completions", headers=self._get_headers(), json=payload)
-                if resp.status_code == 200:
-                    return resp.json()['choices'][0]['message']['content'].strip('"\'')
+            resp = await upstream.client.post(f"{settings.GROQ_API_URL}/chat/completions", headers=self._get_headers(), json=payload, timeout=10.0)
+            if resp.status_code == 200:
+                return resp.json()['choices'][0]['message']['content'].strip('"\'')
         except Exception:
             pass
         return "New Strategy"
@@ -75,53 +245,252 @@ class AIService:
     async def generate_slogans(self) -> List[SloganItem]:
         return FALLBACK_SLOGANS
 
-    async def stream_chat(self, messages: List[ChatMessage], model: str) -> AsyncGenerator[bytes, None]:
+    async def stream_chat(self, messages: List[ChatMessage], model: str, early_stop: bool = True, conversation_id: Optional[str] = None, allow_failover: bool = False) -> AsyncGenerator[bytes, None]:
         valid_msgs = [m.dict() for m in messages if m.content.strip()]
-        
-        # SAFETY: If model contains "8b", limit tokens to prevent overflow on smaller models
-        # Otherwise use 4096 for 70B models
-        max_tokens = 1024 if "8b" in model.lower() else 4096
-        
-        payload = {
-            "model": model,
-            "messages": [{"role": "system", "content": SYSTEM_PROMPT}] + valid_msgs,
-            "stream": True,
-            "temperature": 0.6,
-            "max_tokens": max_tokens
-        }
 
-        print(f"🚀 [STREAM] Sending request to Groq ({model})...", flush=True)
+        key = response_cache.make_key(model, SYSTEM_PROMPT_VERSION, valid_msgs)
+
+        ACTIVE_STREAMS.inc()
+        try:
+            if settings.RESPONSE_CACHE_ENABLED:
+                cached = await response_cache.get(key)
+                if cached is not None:
+                    logger.info(f"⚡ [CACHE] Replaying stored response ({model}).")
+                    async for chunk in response_cache.replay(cached, settings.RESPONSE_CACHE_REPLAY_CHUNK, settings.RESPONSE_CACHE_REPLAY_DELAY):
+                        yield chunk
+                    return
+
+            source = lambda: self._stream_and_cache(key, valid_msgs, model, early_stop, conversation_id, allow_failover)
+            if not settings.SINGLE_FLIGHT_ENABLED:
+                async for chunk in source():
+                    yield chunk
+                return
+
+            # Identical concurrent requests share one upstream generation
+            async for chunk in single_flight.stream(f"{key}:{early_stop}:{allow_failover}", source):
+                yield chunk
+        finally:
+            ACTIVE_STREAMS.dec()
+
+    async def _stream_and_cache(self, key: str, valid_msgs: List[dict], model: str, early_stop: bool, conversation_id: Optional[str] = None, allow_failover: bool = False) -> AsyncGenerator[bytes, None]:
+        # Tee the live stream; only complete, error-free answers from the requested model are stored
+        parts = []
+        failed = False
+        route = {}
+        async for chunk in self._stream_upstream(valid_msgs, model, early_stop, conversation_id, allow_failover, route):
+            if chunk.startswith(b"Error:"):
+                failed = True
+            parts.append(chunk)
+            yield chunk
+        if settings.RESPONSE_CACHE_ENABLED and parts and not failed and route.get("model") == model:
+            await response_cache.set(key, b"".join(parts))
+
+    async def _stream_upstream(self, valid_msgs: List[dict], model: str, early_stop: bool = True, conversation_id: Optional[str] = None, allow_failover: bool = False, route: Optional[dict] = None) -> AsyncGenerator[bytes, None]:
+        """
+        Streams one completion. 429/5xx/connection failures are retried with jittered
+        backoff (and, with allow_failover, moved to the next-best healthy model) as long
+        as nothing has been sent to the client yet. `route["model"]` reports who answered.
+        """
+        attempts: Dict[str, int] = {}
+        error = b"Error: Connection Failed"
+
+        for attempt in range(settings.ROUTER_MAX_ATTEMPTS):
+            target = model_router.pick(model, attempts, allow_failover)
+            if target is None:
+                if not attempts:
+                    error = f"Error: 503 - {model} is temporarily unavailable (circuit open)".encode("utf-8")
+                break
+            if route is not None:
+                route["model"] = target
+
+            # SAFETY: Fit the history into the model's context window (older turns get summarized)
+            # and size max_tokens from the model's context_length
+            fitted_msgs, max_tokens = context_window.fit(valid_msgs, target, SYSTEM_PROMPT, conversation_id)
+
+            payload = {
+                "model": target,
+                "messages": [{"role": "system", "content": SYSTEM_PROMPT}] + fitted_msgs,
+                "stream": True,
+                "temperature": 0.6,
+                "max_tokens": max_tokens
+            }
+
+            # Tracks the plan so we can hang up as soon as the JSON object is complete
+            parser = PlanStreamParser() if early_stop else None
+            started = time.monotonic()
+            first_at = None
+            last_at = None
+            deltas = 0
+            retry_after = None
+            inter_token = INTER_TOKEN.labels(target)
+
+            logger.info(f"🚀 [STREAM] Sending request to Groq ({target})...")
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
             try:
-                async with client.stream("POST", "https://api.groq.com/openai/v1/chat/completions", headers=self._get_headers(), json=payload) as response:
-                    
+                async with upstream.client.stream("POST", f"{settings.GROQ_API_URL}/chat/completions", headers=self._get_headers(), json=payload, timeout=self.timeout) as response:
+                    UPSTREAM_CONNECT.labels(target).observe(time.monotonic() - started)
+
                     if response.status_code != 200:
                         error_body = (await response.aread()).decode('utf-8')
-                        print(f"❌ [STREAM ERROR] Status: {response.status_code} | Body: {error_body}", flush=True)
-                        yield f"Error: {response.status_code} - {error_body}".encode("utf-8")
-                        return
+                        logger.info(f"❌ [STREAM ERROR] Status: {response.status_code} | Body: {error_body}")
+                        UPSTREAM_ERRORS.labels(target, str(response.status_code)).inc()
+                        error = f"Error: {response.status_code} - {error_body}".encode("utf-8")
+                        if response.status_code not in RETRYABLE_STATUS:
+                            model_router.release(target)
+                            break
+                        model_router.record_failure(target)
+                        retry_after = response.headers.get("retry-after")
+                    else:
+                        logger.info(f"✅ [STREAM] Connected! Groq is streaming...")
 
-                    print(f"✅ [STREAM] Connected! Groq is streaming...", flush=True)
-                    
-                    async for line in response.aiter_lines():
-                        if line.startswith("data: "):
-                            data_str = line.replace("data: ", "").strip()
-                            if data_str == "[DONE]":
+                        async for payload in sse_payloads(response.aiter_bytes()):
+                            if payload == DONE:
                                 break
-                            
-                            try:
-                                data_json = json.loads(data_str)
-                                delta = data_json.get("choices", [{}])[0].get("delta", {})
-                                content = delta.get("content", "")
-                                
-                                if content:
-                                    yield content.encode("utf-8")
-                            except Exception:
+
+                            content = delta_content(payload)
+                            if not content:
+                                continue
+                            now = time.monotonic()
+                            if first_at is None:
+                                first_at = now
+                            else:
+                                inter_token.observe(now - last_at)
+                            last_at = now
+                            deltas += 1
+                            yield content
+
+                            if parser:
+                                parser.feed(content.decode("utf-8", errors="replace"))
+                                if parser.finished:
+                                    logger.info(f"✂️ [STREAM] Plan complete, closing upstream ({target}).")
+                                    break
+
+                        elapsed = last_at - first_at if first_at else 0
+                        STREAM_DURATION.labels(target).observe(time.monotonic() - started)
+                        if first_at:
+                            TTFT.labels(target).observe(first_at - started)
+                        if elapsed > 0:
+                            TOKENS_PER_SECOND.labels(target).observe(deltas / elapsed)
+                        model_router.record_success(
+                            target,
+                            ttft=first_at - started if first_at else None,
+                            tps=deltas / elapsed if elapsed > 0 else None,
+                        )
+                        return
+
+            except Exception as e:
+                logger.info(f"🔥 [STREAM EXCEPTION] {str(e)}")
+                UPSTREAM_ERRORS.labels(target, type(e).__name__).inc()
+                model_router.record_failure(target)
+                if first_at is not None:
+                    # Bytes already reached the client; it is too late to retry transparently
+                    yield b"Error: Connection Failed"
+                    return
+                error = b"Error: Connection Failed"
+            except (GeneratorExit, asyncio.CancelledError):
+                # Client went away mid-stream: no verdict on the model's health
+                model_router.release(target)
+                raise
+
+            if attempt + 1 < settings.ROUTER_MAX_ATTEMPTS:
+                await asyncio.sleep(model_router.backoff(attempt, retry_after))
+
+        yield error
+
+    async def stream_events(self, messages: List[ChatMessage], model: str, source: Optional[AsyncGenerator[bytes, None]] = None) -> AsyncGenerator[dict, None]:
+        """stream_chat (or a wrapped `source` of it) run through PlanStreamParser: typed events instead of raw text."""
+        source = source or self.stream_chat(messages, model)
+        parser = PlanStreamParser()
+        first = True
+        try:
+            async for chunk in source:
+                text = chunk.decode("utf-8", errors="replace")
+                if first and text.startswith("Error:"):
+                    yield {"type": "error", "data": text[6:].strip()}
+                    return
+                first = False
+                for event in parser.feed(text):
+                    yield event
+                if parser.finished:
+                    return
+            for event in parser.close():
+                yield event
+        finally:
+            await source.aclose()
+
+    async def stream_multi(self, messages: List[ChatMessage], models: List[str], stream_id: Optional[str] = None, events: bool = False, wrap: Optional[Callable] = None, allow_failover: bool = False) -> AsyncGenerator[dict, None]:
+        """
+        Runs stream_chat for every model concurrently and interleaves the output
+        as frames tagged with the model id. A failing or cancelled model only ends
+        its own frames; the other agents keep streaming. With events=True each
+        model's output is parsed into stream_events frames instead of raw chunks.
+        `wrap(model, stream)` may decorate each model's byte stream (e.g. a tee).
+        """
+        def source(model: str):
+            stream = self.stream_chat(messages, model, allow_failover=allow_failover)
+            return wrap(model, stream) if wrap else stream
+
+        stream_id = stream_id or uuid.uuid4().hex
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def pump(model: str):
+            try:
+                plan = None
+                async with self._agent_slots:
+                    if events:
+                        async for event in self.stream_events(messages, model, source=source(model)):
+                            if event["type"] == "done":
+                                plan = event["plan"]
                                 continue
-            
+                            queue.put_nowait({"model": model, **event})
+                            if event["type"] == "error":
+                                return
+                    else:
+                        first = True
+                        async for chunk in source(model):
+                            text = chunk.decode("utf-8", errors="replace")
+                            if first and text.startswith("Error:"):
+                                queue.put_nowait({"model": model, "type": "error", "data": text[6:].strip()})
+                                return
+                            first = False
+                            queue.put_nowait({"model": model, "type": "chunk", "data": text})
+                done = {"model": model, "type": "done"}
+                if events:
+                    done["plan"] = plan
+                queue.put_nowait(done)
+            except asyncio.CancelledError:
+                queue.put_nowait({"model": model, "type": "cancelled"})
+                raise
             except Exception as e:
-                print(f"🔥 [STREAM EXCEPTION] {str(e)}", flush=True)
-                yield b"Error: Connection Failed"
+                logger.info(f"🔥 [FAN-OUT] {model} failed: {e}")
+                queue.put_nowait({"model": model, "type": "error", "data": "Agent failed"})
+
+        tasks = {m: asyncio.create_task(pump(m)) for m in dict.fromkeys(models)}
+        self.active_fanouts[stream_id] = tasks
+        remaining = len(tasks)
+
+        try:
+            yield {"type": "open", "stream_id": stream_id, "models": list(tasks)}
+            while remaining:
+                frame = await queue.get()
+                if frame["type"] in ("done", "error", "cancelled"):
+                    remaining -= 1
+                yield frame
+        finally:
+            # Client went away (or we finished): stop anything still talking to upstream
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+            self.active_fanouts.pop(stream_id, None)
+
+    def cancel_fanout(self, stream_id: str, model: Optional[str] = None) -> int:
+        tasks = self.active_fanouts.get(stream_id, {})
+        targets = [tasks[model]] if model in tasks else ([] if model else list(tasks.values()))
+        cancelled = 0
+        for task in targets:
+            if not task.done():
+                task.cancel()
+                cancelled += 1
+        return cancelled
 
 ai_service = AIService()
\ No newline at end of file
@@ -0,0 +1,448 @@
+import asyncio
+import csv
+import io
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, insert, or_, select, update
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.fast_json import loads
+from app.core.log_queue import get_logger
+from app.core.rate_limit import stream_quota
+from app.models.batch import BatchItem, BatchJob
+from app.models.goal import Goal, GoalTurn
+from app.schemas.goal import ChatMessage
+from app.services.ai_service import ai_service
+from app.services.context_window import estimate_tokens
+from app.services.model_router import model_router, RETRYABLE_STATUS
+from app.services.stream_persistence import build_agent_state, place_agent
+from app.services.turn_store import turn_rows
+from app.services import blob_store, search_index
+from app.services.history_cache import history_cache
+
+logger = get_logger("batch_runner")
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+_ERROR_STATUS = re.compile(r"^Error: (\d{3})")
+
+
+class BatchFormatError(ValueError):
+    pass
+
+
+def _models(value, default: List[str]) -> List[str]:
+    if isinstance(value, str):
+        value = [m.strip() for m in value.replace(";", ",").split(",")]
+    models = [m for m in dict.fromkeys(value or []) if isinstance(m, str) and m]
+    return models or default
+
+
+def parse_items(body: bytes, content_type: str, default_models: List[str]) -> List[Tuple[str, str]]:
+    """
+    (goal, model) pairs from an uploaded file. JSONL: one {"goal": ..., "model" | "models": ...}
+    object (or bare string) per line. CSV: a `goal` column (else the first column) and an
+    optional `model` / `models` column. Rows without a model use `default_models`.
+    """
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise BatchFormatError("File must be UTF-8")
+    default_models = default_models or [DEFAULT_MODEL]
+
+    rows = []
+    if "csv" in content_type:
+        reader = csv.reader(io.StringIO(text))
+        header = [h.strip().lower() for h in next(reader, [])]
+        goal_col = header.index("goal") if "goal" in header else 0
+        model_col = next((header.index(h) for h in ("model", "models") if h in header), None)
+        if "goal" not in header:
+            # No header row: the first line is data too
+            reader = csv.reader(io.StringIO(text))
+        for line, record in enumerate(reader, start=1):
+            if len(record) > goal_col and record[goal_col].strip():
+                model = record[model_col] if model_col is not None and len(record) > model_col else None
+                rows.append((line, record[goal_col].strip(), _models(model, default_models)))
+    else:
+        for line, raw in enumerate(text.splitlines(), start=1):
+            if not raw.strip():
+                continue
+            try:
+                record = loads(raw)
+            except ValueError:
+                raise BatchFormatError(f"Line {line}: invalid JSON")
+            if isinstance(record, str):
+                record = {"goal": record}
+            goal = record.get("goal") if isinstance(record, dict) else None
+            if not isinstance(goal, str) or not goal.strip():
+                raise BatchFormatError(f"Line {line}: missing \"goal\"")
+            rows.append((line, goal.strip(), _models(record.get("models", record.get("model")), default_models)))
+
+    items = []
+    for line, goal, models in rows:
+        if len(goal) > 5000:
+            raise BatchFormatError(f"Line {line}: goal too long")
+        if len(models) > settings.MAX_MODELS_PER_FANOUT:
+            raise BatchFormatError(f"Line {line}: at most {settings.MAX_MODELS_PER_FANOUT} models per goal")
+        items.extend((goal, model) for model in models)
+    if not items:
+        raise BatchFormatError("No goals found")
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise BatchFormatError(f"At most {settings.BATCH_MAX_ITEMS} goal/model pairs per job")
+    return items
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class BatchRunner:
+    """
+    Worker pool for batch jobs. The queue lives in batch_items, so it survives restarts
+    and can be shared by several workers: the dispatcher claims pending items with a
+    conditional UPDATE and a lease, runs at most `concurrency` of them (and at most
+    `per_model` per model) through AIService.stream_chat, and writes finished items
+    back in bulk (one insert of Goal rows, one of goal_turns, one status update).
+
+    Rate-limited or unavailable models are left to model_router's backoff first; if an
+    item still fails that way it is rescheduled with a growing delay instead of failing
+    the job, and models whose circuit is open are skipped until it closes.
+
+    A claim is identified by the attempt number it set. Leases of items still in flight are
+    renewed as they come due, and a result is only written if its item is still running
+    under the same claim: one cancelled meanwhile, or reclaimed by another worker, is left
+    as it is and the result dropped.
+    """
+
+    def __init__(self, concurrency: int, per_model: int, write_size: int, poll_interval: float, lease: float):
+        self.concurrency = concurrency
+        self.per_model = per_model
+        self.write_size = write_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self._running: Dict[int, asyncio.Task] = {}  # item id -> task
+        self._running_jobs: Dict[int, str] = {}  # item id -> job id
+        self._claims: Dict[int, Tuple[int, float]] = {}  # item id -> (claimed attempt, lease_until)
+        self._per_model: Dict[str, int] = defaultdict(int)
+        self._results: List[dict] = []
+        self._first_result: Optional[float] = None
+        self._wake = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.completed = 0
+        self.failed = 0
+        self.rescheduled = 0
+        self.stale = 0
+        self.writes = 0
+
+    def notify(self):
+        """New work was queued (or a slot freed up); scan now instead of at the next tick."""
+        self._wake.set()
+
+    async def submit(self, user_id: Optional[str], items: List[Tuple[str, str]], job_id: str):
+        async with AsyncSessionLocal() as db:
+            db.add(BatchJob(id=job_id, user_id=user_id, status="queued", total=len(items)))
+            await db.flush()
+            await db.execute(insert(BatchItem), [
+                {"job_id": job_id, "position": i, "goal_text": goal, "model": model, "status": "pending"}
+                for i, (goal, model) in enumerate(items)
+            ])
+            await db.commit()
+        logger.info(f"📦 [BATCH] Job {job_id} queued with {len(items)} items.")
+        self.notify()
+
+    async def cancel(self, job_id: str):
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(BatchJob).where(BatchJob.id == job_id).values(status="cancelled"))
+            await db.execute(
+                update(BatchItem)
+                .where(BatchItem.job_id == job_id, BatchItem.status.in_(["pending", "running"]))
+                .values(status="cancelled", lease_until=None, finished_at=datetime.utcnow())
+            )
+            await db.commit()
+        # Items of this job running in other workers finish on their own; their results are dropped on write
+        for item_id, owner in list(self._running_jobs.items()):
+            if owner == job_id:
+                self._running[item_id].cancel()
+
+    async def _renew(self, db):
+        """Push out the leases of items in flight here once half used, so long generations are not reclaimed."""
+        now = time.time()
+        due = [(item_id, claim) for item_id, (claim, until) in self._claims.items() if until - now < self.lease / 2]
+        if not due:
+            return
+        until = now + self.lease
+        await db.execute(
+            update(BatchItem)
+            .where(BatchItem.status == "running", or_(*(and_(BatchItem.id == item_id, BatchItem.attempts == claim) for item_id, claim in due)))
+            .values(lease_until=until)
+        )
+        for item_id, claim in due:
+            if item_id in self._claims:
+                self._claims[item_id] = (claim, until)
+
+    async def _reclaim(self, db):
+        """Running items whose lease ran out (their worker died or restarted) go back to the queue."""
+        await db.execute(
+            update(BatchItem)
+            .where(BatchItem.status == "running", BatchItem.lease_until < time.time())
+            .values(status="pending", lease_until=None)
+        )
+
+    async def _dispatch(self):
+        free = self.concurrency - len(self._running)
+        async with AsyncSessionLocal() as db:
+            await self._renew(db)
+            await self._reclaim(db)
+            if free <= 0:
+                await db.commit()
+                return
+            now = time.time()
+            candidates = (await db.execute(
+                select(BatchItem.id, BatchItem.job_id, BatchItem.goal_text, BatchItem.model, BatchItem.attempts, BatchJob.user_id)
+                .join(BatchJob, BatchJob.id == BatchItem.job_id)
+                .where(
+                    BatchItem.status == "pending", BatchJob.status != "cancelled",
+                    or_(BatchItem.not_before.is_(None), BatchItem.not_before <= now),
+                )
+                .order_by(BatchItem.id)
+                .limit(free * 4)
+            )).all()
+
+            claimed = []
+            for item in candidates:
+                if len(claimed) >= free:
+                    break
+                if self._per_model[item.model] >= self.per_model or not model_router.allows(item.model):
+                    continue
+                result = await db.execute(
+                    update(BatchItem)
+                    .where(BatchItem.id == item.id, BatchItem.status == "pending")
+                    .values(status="running", lease_until=now + self.lease, attempts=BatchItem.attempts + 1)
+                )
+                if result.rowcount == 0:
+                    continue  # another worker got it
+                self._per_model[item.model] += 1
+                claimed.append(item)
+            if claimed:
+                await db.execute(
+                    update(BatchJob)
+                    .where(BatchJob.id.in_({item.job_id for item in claimed}), BatchJob.status == "queued")
+                    .values(status="running")
+                )
+            await db.commit()
+
+        for item in claimed:
+            self._claims[item.id] = (item.attempts + 1, now + self.lease)
+            self._running[item.id] = asyncio.create_task(self._work(item))
+            self._running_jobs[item.id] = item.job_id
+
+    async def _work(self, item):
+        try:
+            result = await self._decompose(item)
+        except asyncio.CancelledError:
+            self._claims.pop(item.id, None)
+            raise
+        except Exception as e:
+            logger.info(f"🔥 [BATCH] Item {item.id} failed: {e}")
+            result = {"item": item, "agent": None, "error": "Agent failed", "retry": False}
+        finally:
+            self._running.pop(item.id, None)
+            self._running_jobs.pop(item.id, None)
+            self._per_model[item.model] -= 1
+        self._results.append(result)
+        if self._first_result is None:
+            self._first_result = time.monotonic()
+        self._wake.set()
+
+    async def _decompose(self, item) -> dict:
+        messages = [ChatMessage(role="user", content=item.goal_text)]
+        metrics = {"startTime": _now_ms(), "endTime": None, "firstTokenTime": None}
+        stream = ai_service.stream_chat(messages, item.model)
+        if item.user_id:
+            stream = stream_quota.metered(stream, f"user:{item.user_id}", estimate_tokens(item.goal_text))
+        parts: List[bytes] = []
+        try:
+            async for chunk in stream:
+                if metrics["firstTokenTime"] is None:
+                    metrics["firstTokenTime"] = _now_ms()
+                parts.append(chunk)
+        finally:
+            await stream.aclose()
+        metrics["endTime"] = _now_ms()
+
+        text = b"".join(parts).decode("utf-8", errors="replace")
+        if text.startswith("Error:"):
+            status = _ERROR_STATUS.match(text)
+            retry = (int(status.group(1)) in RETRYABLE_STATUS) if status else text.startswith("Error: Connection")
+            return {"item": item, "agent": None, "error": text[6:].strip()[:500], "retry": retry}
+        agent = build_agent_state(item.model, text, stopped=False, metrics=metrics)
+        if agent["jsonResult"] is None:
+            return {"item": item, "agent": None, "error": "No plan in the model's answer", "retry": False}
+        return {"item": item, "agent": agent, "error": None, "retry": False}
+
+    async def _write_results(self):
+        """Bulk-write every finished item: new goals, their turns and search rows, item and job status."""
+        async with self._write_lock:
+            batch, self._results = self._results, []
+            self._first_result = None
+            if not batch:
+                return
+            now = datetime.utcnow()
+            try:
+                async with AsyncSessionLocal() as db:
+                    # Locked until commit, so a concurrent cancel waits and then finds the items finished
+                    claims = {r["item"].id: r["item"].attempts + 1 for r in batch}
+                    rows = (await db.execute(
+                        select(BatchItem.id, BatchItem.attempts)
+                        .where(BatchItem.id.in_(list(claims)), BatchItem.status == "running")
+                        .with_for_update()
+                    )).all()
+                    owned = {row.id for row in rows if row.attempts == claims[row.id]}
+                    results = [r for r in batch if r["item"].id in owned]
+                    stale = len(batch) - len(results)
+                    ok = [r for r in results if r["agent"] is not None]
+                    goal_ids: List[int] = []
+                    if ok:
+                        goals = []
+                        for r in ok:
+                            history: List = []
+                            place_agent(history, f"batch-{r['item'].id}", None, r["item"].goal_text, r["agent"])
+                            r["history"] = history
+                            goals.append(blob_store.pack({
+                                "user_id": r["item"].user_id, "original_goal": r["item"].goal_text,
+                                "model_used": r["item"].model, "breakdown": r["agent"]["jsonResult"].get("steps"),
+                                "thinking_process": r["agent"]["thinking"], "chat_history": history,
+                                "created_at": now, "updated_at": now,
+                            }))
+                        goal_ids = list((await db.execute(
+                            insert(Goal).returning(Goal.id, sort_by_parameter_order=True), goals
+                        )).scalars())
+                        turns = [row for r, gid in zip(ok, goal_ids) for row in turn_rows(gid, 0, r["history"][0])]
+                        if turns:
+                            await db.execute(insert(GoalTurn), turns)
+                        await search_index.reindex_many(db, goal_ids)
+
+                    updates = []
+                    counts: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+                    saved = dict(zip((r["item"].id for r in ok), goal_ids))
+                    for r in results:
+                        item = r["item"]
+                        if item.id in saved:
+                            updates.append({"id": item.id, "status": "done", "goal_id": saved[item.id], "lease_until": None, "error": None, "finished_at": now})
+                            counts[item.job_id][0] += 1
+                        elif r["retry"] and item.attempts + 1 < settings.BATCH_MAX_ATTEMPTS:
+                            delay = settings.BATCH_RETRY_DELAY * (2 ** item.attempts)
+                            updates.append({"id": item.id, "status": "pending", "lease_until": None, "not_before": time.time() + delay, "error": r["error"]})
+                            self.rescheduled += 1
+                        else:
+                            updates.append({"id": item.id, "status": "error", "lease_until": None, "error": r["error"], "finished_at": now})
+                            counts[item.job_id][1] += 1
+                    if updates:
+                        await db.execute(
+                            update(BatchItem).where(BatchItem.status == "running").execution_options(synchronize_session=None),
+                            updates,
+                        )
+
+                    for job_id, (completed, failed) in counts.items():
+                        await db.execute(
+                            update(BatchJob).where(BatchJob.id == job_id)
+                            .values(completed=BatchJob.completed + completed, failed=BatchJob.failed + failed, updated_at=now)
+                        )
+                    if counts:
+                        await db.execute(
+                            update(BatchJob)
+                            .where(BatchJob.id.in_(list(counts)), BatchJob.status == "running",
+                                   BatchJob.completed + BatchJob.failed >= BatchJob.total)
+                            .values(status="done")
+                        )
+                    await db.commit()
+                # Leases are renewed until the result is written, not just while the model runs
+                for r in batch:
+                    self._claims.pop(r["item"].id, None)
+                await history_cache.invalidate(*(r["item"].user_id for r in ok))
+                self.writes += 1
+                self.completed += len(ok)
+                self.failed += sum(failed for _, failed in counts.values())
+                self.stale += stale
+                logger.info(f"💾 [BATCH] Wrote {len(results)} results ({len(ok)} plans)." + (f" Dropped {stale} for cancelled or reclaimed items." if stale else ""))
+            except Exception as e:
+                logger.info(f"⚠️ [BATCH] Writing {len(batch)} results failed ({e}). Retrying later.")
+                self._results = batch + self._results
+                if self._first_result is None:
+                    self._first_result = time.monotonic()
+
+    def _write_due(self) -> bool:
+        if not self._results:
+            return False
+        return (
+            len(self._results) >= self.write_size
+            or not self._running  # nothing else is about to finish; don't make the last items wait
+            or time.monotonic() - self._first_result >= self.poll_interval
+        )
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._dispatch()
+                if self._write_due():
+                    await self._write_results()
+            except Exception as e:
+                logger.info(f"⚠️ [BATCH] Dispatcher error ({e}).")
+
+    def start(self):
+        if self._task is None:
+            # Created here so they belong to the serving event loop
+            self._wake = asyncio.Event()
+            self._write_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        unfinished = list(self._running)
+        for task in list(self._running.values()):
+            task.cancel()
+        await asyncio.gather(*self._running.values(), return_exceptions=True)
+        await self._write_results()
+        if unfinished:
+            # Hand interrupted items straight back instead of waiting out their lease
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(BatchItem)
+                    .where(BatchItem.id.in_(unfinished), BatchItem.status == "running")
+                    .values(status="pending", lease_until=None, attempts=BatchItem.attempts - 1)
+                )
+                await db.commit()
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._running),
+            "unwritten": len(self._results),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rescheduled": self.rescheduled,
+            "stale": self.stale,
+            "writes": self.writes,
+        }
+
+
+batch_runner = BatchRunner(
+    concurrency=settings.BATCH_CONCURRENCY,
+    per_model=settings.BATCH_PER_MODEL_CONCURRENCY,
+    write_size=settings.BATCH_WRITE_SIZE,
+    poll_interval=settings.BATCH_POLL_INTERVAL,
+    lease=settings.BATCH_LEASE_SECONDS,
+)
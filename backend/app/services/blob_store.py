@@ -0,0 +1,117 @@
+"""
+Where a goal's chat_history and thinking_process live: the plain JSON / text columns, or
+(BLOB_COMPRESSION on) compressed in chat_history_z / thinking_z. Writers pass their values
+through pack(); readers use chat_history() / thinking(), which take whichever column is
+set, so both layouts can coexist while backfill() converts rows in the background.
+goal_turns rows keep thinking / result the same way (TURN_BLOB_COLUMNS, turn_thinking() /
+turn_result(), backfill_turns()).
+"""
+
+from typing import Any, Optional
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.blob_codec import blob_codec
+from app.models.goal import Goal, GoalTurn
+
+# plain column -> compressed column
+BLOB_COLUMNS = {"chat_history": "chat_history_z", "thinking_process": "thinking_z"}
+TURN_BLOB_COLUMNS = {"thinking": "thinking_z", "result": "result_z"}
+# Encoded as JSON; the others are text
+JSON_COLUMNS = ("chat_history", "result")
+
+
+def pack(values: dict, columns: dict = BLOB_COLUMNS) -> dict:
+    """`values` with the blob fields moved into the configured layout (the other column nulled)."""
+    if not any(name in values for name in columns):
+        return values
+    packed = dict(values)
+    for name, z_name in columns.items():
+        if name not in values:
+            continue
+        value = values[name]
+        if blob_codec.enabled:
+            packed[name] = None
+            packed[z_name] = blob_codec.encode_json(value) if name in JSON_COLUMNS else blob_codec.encode_text(value)
+        else:
+            packed[z_name] = None
+    return packed
+
+
+def chat_history(row: Any) -> Optional[list]:
+    blob = getattr(row, "chat_history_z", None)
+    return blob_codec.decode_json(blob) if blob is not None else row.chat_history
+
+
+def thinking(row: Any) -> Optional[str]:
+    blob = getattr(row, "thinking_z", None)
+    return blob_codec.decode_text(blob) if blob is not None else row.thinking_process
+
+
+def turn_thinking(row: Any) -> Optional[str]:
+    blob = getattr(row, "thinking_z", None)
+    return blob_codec.decode_text(blob) if blob is not None else row.thinking
+
+
+def turn_result(row: Any) -> Any:
+    blob = getattr(row, "result_z", None)
+    return blob_codec.decode_json(blob) if blob is not None else row.result
+
+
+async def backfill(db: AsyncSession, batch_size: int = 100) -> int:
+    """
+    Move rows written in the other layout into the configured one (compress, or with
+    BLOB_COMPRESSION=off decompress). Leaves version / updated_at alone, so clients see
+    no change. Idempotent; returns rows converted.
+    """
+    if blob_codec.enabled:
+        pending = or_(Goal.chat_history.is_not(None), Goal.thinking_process.is_not(None))
+    else:
+        pending = or_(Goal.chat_history_z.is_not(None), Goal.thinking_z.is_not(None))
+    done = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(Goal.id, Goal.version, Goal.updated_at, Goal.chat_history, Goal.chat_history_z, Goal.thinking_process, Goal.thinking_z)
+            .where(Goal.id > last_id, pending)
+            .order_by(Goal.id)
+            .limit(batch_size)
+        )
+        rows = result.all()
+        if not rows:
+            return done
+        for r in rows:
+            # Guarded by version: a row saved since it was read is left to the next run
+            result = await db.execute(
+                update(Goal)
+                .where(Goal.id == r.id, Goal.version == r.version)
+                .values(**pack({"chat_history": chat_history(r), "thinking_process": thinking(r)}), updated_at=r.updated_at)
+            )
+            done += result.rowcount
+        await db.commit()
+        last_id = rows[-1].id
+
+
+async def backfill_turns(db: AsyncSession, batch_size: int = 500) -> int:
+    """backfill() for goal_turns. Idempotent; returns rows converted."""
+    if blob_codec.enabled:
+        pending = or_(GoalTurn.thinking.is_not(None), GoalTurn.result.is_not(None))
+    else:
+        pending = or_(GoalTurn.thinking_z.is_not(None), GoalTurn.result_z.is_not(None))
+    done = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(GoalTurn.id, GoalTurn.thinking, GoalTurn.thinking_z, GoalTurn.result, GoalTurn.result_z)
+            .where(GoalTurn.id > last_id, pending)
+            .order_by(GoalTurn.id)
+            .limit(batch_size)
+        )
+        rows = result.all()
+        if not rows:
+            return done
+        for r in rows:
+            # A save rewrites changed turns as new rows, so a row read here is never updated concurrently
+            values = pack({"thinking": turn_thinking(r), "result": turn_result(r)}, TURN_BLOB_COLUMNS)
+            done += (await db.execute(update(GoalTurn).where(GoalTurn.id == r.id).values(**values))).rowcount
+        await db.commit()
+        last_id = rows[-1].id
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+
+# Word runs and single punctuation marks; long words cost roughly one token per 4 characters
+_PIECES = re.compile(r"\w+|[^\w\s]")
+_MESSAGE_OVERHEAD = 4  # role + separators per chat message
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast BPE-ish estimate; no tokenizer download, within ~10-15% of tiktoken on English prose."""
+    total = 0
+    for piece in _PIECES.findall(text):
+        total += 1 if len(piece) <= 4 else (len(piece) + 3) // 4
+    return total
+
+
+def _digest(message: dict) -> str:
+    return hashlib.blake2b(f"{message['role']}\x00{message['content']}".encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _summarize_message(message: dict) -> str:
+    """One line per message: the goal for user turns, the plan's summary and step titles for assistant turns."""
+    content = message["content"]
+    if message["role"] == "assistant":
+        content = re.sub(r"<think>[\s\S]*?(</think>|$)", "", content).strip()
+        start, end = content.find("{"), content.rfind("}")
+        if start != -1 and end > start:
+            try:
+                plan = json.loads(content[start:end + 1])
+                steps = "; ".join(str(s.get("step", "")) for s in plan.get("steps", []) if isinstance(s, dict))
+                return f"assistant: {plan.get('message', '')} Steps: {steps}"[:400]
+            except (ValueError, AttributeError):
+                pass
+    return f"{message['role']}: {' '.join(content.split())}"[:300]
+
+
+class _Conversation:
+    __slots__ = ("digests", "tokens", "lines")
+
+    def __init__(self):
+        self.digests: List[str] = []
+        self.tokens: List[int] = []
+        self.lines: List[Optional[str]] = []
+
+
+class ContextWindowManager:
+    """
+    Fits a conversation into a model's context window. Newest messages are kept verbatim;
+    older ones that do not fit are folded into a rolling extractive summary. Token counts
+    and per-message summary lines are cached per conversation so each new turn only pays
+    for the messages it added.
+    """
+
+    def __init__(self, max_conversations: int):
+        self.max_conversations = max_conversations
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._context_lengths: Dict[str, int] = {}
+        self.trimmed_requests = 0
+
+    def register_models(self, models) -> None:
+        """Record each ModelInfo's context_length (called whenever the model catalog refreshes)."""
+        for m in models:
+            self._context_lengths[m.id] = m.context_length
+
+    def context_length(self, model: str) -> int:
+        return self._context_lengths.get(model, settings.DEFAULT_CONTEXT_LENGTH)
+
+    def completion_budget(self, model: str) -> int:
+        return max(256, min(settings.MAX_COMPLETION_TOKENS, self.context_length(model) // 4))
+
+    def _conversation(self, key: str) -> _Conversation:
+        conv = self._conversations.get(key)
+        if conv is None:
+            conv = _Conversation()
+            self._conversations[key] = conv
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        else:
+            self._conversations.move_to_end(key)
+        return conv
+
+    def _sync(self, conv: _Conversation, messages: List[dict]):
+        """Reuse cached counts for the unchanged prefix; recount only edited/new messages."""
+        digests = [_digest(m) for m in messages]
+        same = 0
+        for old, new in zip(conv.digests, digests):
+            if old != new:
+                break
+            same += 1
+        conv.digests = digests
+        conv.tokens = conv.tokens[:same] + [estimate_tokens(m["content"]) + _MESSAGE_OVERHEAD for m in messages[same:]]
+        conv.lines = conv.lines[:same] + [None] * (len(messages) - same)
+
+    def fit(self, messages: List[dict], model: str, system_prompt: str, conversation_id: Optional[str] = None) -> Tuple[List[dict], int]:
+        """Returns (messages to send after the system prompt, max_tokens for the completion)."""
+        max_tokens = self.completion_budget(model)
+        if not messages:
+            return messages, max_tokens
+
+        key = conversation_id or _digest(messages[0])
+        conv = self._conversation(key)
+        self._sync(conv, messages)
+
+        budget = min(
+            self.context_length(model) - max_tokens - estimate_tokens(system_prompt) - settings.CONTEXT_SAFETY_MARGIN,
+            settings.CONTEXT_INPUT_BUDGET,
+        )
+        if sum(conv.tokens) <= budget:
+            return messages, max_tokens
+
+        # Keep the newest messages verbatim (always at least the last one)
+        summary_budget = min(settings.CONTEXT_SUMMARY_BUDGET, budget // 4)
+        used = 0
+        cut = len(messages)
+        while cut > 0 and (cut == len(messages) or used + conv.tokens[cut - 1] <= budget - summary_budget):
+            used += conv.tokens[cut - 1]
+            cut -= 1
+
+        # Fold everything before `cut` into the rolling summary, newest lines first until it is full
+        lines = []
+        remaining = budget - used
+        for i in range(cut - 1, -1, -1):
+            if conv.lines[i] is None:
+                conv.lines[i] = _summarize_message(messages[i])
+            cost = estimate_tokens(conv.lines[i]) + 1
+            if cost > remaining - _MESSAGE_OVERHEAD:
+                break
+            lines.append(conv.lines[i])
+            remaining -= cost
+
+        self.trimmed_requests += 1
+        kept = messages[cut:]
+        if lines:
+            summary = "Summary of the earlier conversation:\n" + "\n".join(reversed(lines))
+            kept = [{"role": "system", "content": summary}] + kept
+        return kept, max_tokens
+
+    def stats(self) -> dict:
+        return {
+            "conversations": len(self._conversations),
+            "known_models": len(self._context_lengths),
+            "trimmed_requests": self.trimmed_requests,
+        }
+
+
+context_window = ContextWindowManager(max_conversations=settings.CONTEXT_CACHE_SIZE)
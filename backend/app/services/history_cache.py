@@ -0,0 +1,130 @@
+import asyncio
+import random
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+from limits.storage import MemoryStorage, Storage
+from app.core.config import settings
+from app.core.log_queue import get_logger
+from app.core.rate_limit import shared_storage
+
+logger = get_logger("history_cache")
+
+Entry = Tuple[str, bytes, Dict[str, str]]  # (etag, body, extra headers)
+
+
+class HistoryCache:
+    """
+    Conditional GET for GET /history/{user_id}. Each user has a history version, a counter
+    on the limiter's shared storage (RATE_LIMIT_STORAGE_URI), so every worker sees a write
+    made on any of them. Every handler that changes a user's goals calls invalidate() after
+    committing. The version is the ETag: a matching If-None-Match is answered 304 straight
+    from the counter, with no database query.
+
+    The limits storage API is blocking: Redis and SQLite calls run in a thread, and only the
+    in-process memory:// storage is called inline.
+
+    A miss is served from a per-worker LRU of serialized responses stamped with the version
+    they were built at. Only on a version change does the list get re-queried and re-encoded.
+    """
+
+    def __init__(self, storage: Storage, max_bytes: int, ttl: int):
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._inline = isinstance(storage, MemoryStorage)
+        self._entries: "OrderedDict[tuple, Entry]" = OrderedDict()
+        self._by_user: Dict[str, Set[tuple]] = {}
+        self._size = 0
+        self.not_modified = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"history:version:{user_id}"
+
+    def _bump(self, key: str) -> int:
+        version = self.storage.incr(key, self.ttl)
+        if version == 1:
+            # Counter (re)created: jump to a random point, so an ETag from before a reset or expiry never repeats
+            version = self.storage.incr(key, self.ttl, random.randrange(1, 2 ** 40))
+        return version
+
+    def _version(self, key: str) -> int:
+        return self.storage.get(key) or self._bump(key)
+
+    async def _call(self, fn, key: str) -> int:
+        if self._inline:
+            return fn(key)
+        return await asyncio.to_thread(fn, key)
+
+    async def etag(self, user_id: str) -> Optional[str]:
+        """Current ETag for the user's history; None when the shared storage is unreachable."""
+        try:
+            version = await self._call(self._version, self._key(user_id))
+        except Exception as e:
+            logger.info(f"⚠️ [HISTORY] Version lookup failed ({e}). Serving uncached.")
+            return None
+        return f'W/"h{version}"'
+
+    async def invalidate(self, *user_ids: Optional[str]):
+        for user_id in {u for u in user_ids if u}:
+            # Local entries first, so nothing stale is served while the bump is in flight
+            for key in list(self._by_user.get(user_id, ())):
+                self._drop(key)
+            try:
+                await self._call(self._bump, self._key(user_id))
+            except Exception as e:
+                logger.info(f"⚠️ [HISTORY] Version bump failed for {user_id} ({e}).")
+            self.invalidations += 1
+
+    def get(self, user_id: str, variant: tuple, etag: str) -> Optional[Entry]:
+        key = (user_id, variant)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != etag:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, user_id: str, variant: tuple, etag: str, body: bytes, headers: Dict[str, str]):
+        key = (user_id, variant)
+        if key in self._entries:
+            self._drop(key)
+        if len(body) > self.max_bytes // 4:
+            return  # one huge history would flush everyone else's
+        self._entries[key] = (etag, body, headers)
+        self._by_user.setdefault(user_id, set()).add(key)
+        self._size += len(body)
+        while self._size > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= len(entry[1])
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "not_modified": self.not_modified,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+history_cache = HistoryCache(
+    shared_storage,
+    max_bytes=settings.HISTORY_CACHE_MAX_BYTES,
+    ttl=settings.HISTORY_VERSION_TTL,
+)
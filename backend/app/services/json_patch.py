@@ -0,0 +1,118 @@
+import copy
+from typing import Any, List
+
+
+class JsonPatchError(ValueError):
+    pass
+
+
+def _parse_pointer(pointer: Any) -> List[str]:
+    if not isinstance(pointer, str):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer}")
+    return [p.replace("~1", "/").replace("~0", "~") for p in pointer[1:].split("/")]
+
+
+def _index(container: list, token: str, allow_end: bool = False) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token[0] == "0"):
+        raise JsonPatchError(f"Invalid array index: {token}")
+    idx = int(token)
+    if idx > len(container) or (idx == len(container) and not allow_end):
+        raise JsonPatchError(f"Array index out of range: {token}")
+    return idx
+
+
+def _resolve(doc: Any, tokens: List[str]) -> Any:
+    for token in tokens:
+        if isinstance(doc, list):
+            doc = doc[_index(doc, token)]
+        elif isinstance(doc, dict):
+            if token not in doc:
+                raise JsonPatchError(f"Path not found: {token}")
+            doc = doc[token]
+        else:
+            raise JsonPatchError(f"Cannot traverse into {type(doc).__name__}")
+    return doc
+
+
+def _add(doc: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent = _resolve(doc, tokens[:-1])
+    last = tokens[-1]
+    if isinstance(parent, list):
+        parent.insert(_index(parent, last, allow_end=True), value)
+    elif isinstance(parent, dict):
+        parent[last] = value
+    else:
+        raise JsonPatchError("Parent is not a container")
+    return doc
+
+
+def _remove(doc: Any, tokens: List[str]) -> Any:
+    if not tokens:
+        raise JsonPatchError("Cannot remove the document root")
+    parent = _resolve(doc, tokens[:-1])
+    last = tokens[-1]
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, last))
+    if isinstance(parent, dict) and last in parent:
+        return parent.pop(last)
+    raise JsonPatchError(f"Path not found: {last}")
+
+
+def _member(op: dict, name: str) -> Any:
+    if name not in op:
+        raise JsonPatchError(f"Operation {op.get('op')!r} is missing {name!r}")
+    return op[name]
+
+
+def _equal(a: Any, b: Any) -> bool:
+    # JSON equality: unlike Python's ==, true is not 1 and {"a": 1} is not {"a": true}
+    if isinstance(a, bool) or isinstance(b, bool):
+        return isinstance(a, bool) and isinstance(b, bool) and a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_equal(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def apply_patch(doc: Any, operations: List[dict]) -> Any:
+    """Applies an RFC 6902 JSON Patch (add/remove/replace/move/copy/test) to a copy of `doc`."""
+    doc = copy.deepcopy(doc)
+    for op in operations:
+        name = op.get("op")
+        tokens = _parse_pointer(_member(op, "path"))
+        if name == "add":
+            doc = _add(doc, tokens, _member(op, "value"))
+        elif name == "remove":
+            _remove(doc, tokens)
+        elif name == "replace":
+            _resolve(doc, tokens)  # must exist
+            if not tokens:
+                doc = _member(op, "value")
+            else:
+                parent = _resolve(doc, tokens[:-1])
+                key = _index(parent, tokens[-1]) if isinstance(parent, list) else tokens[-1]
+                parent[key] = _member(op, "value")
+        elif name == "move":
+            source = _parse_pointer(_member(op, "from"))
+            if tokens[:len(source)] == source and len(tokens) > len(source):
+                raise JsonPatchError("Cannot move a value into one of its children")
+            value = _remove(doc, source)
+            doc = _add(doc, tokens, value)
+        elif name == "copy":
+            value = copy.deepcopy(_resolve(doc, _parse_pointer(_member(op, "from"))))
+            doc = _add(doc, tokens, value)
+        elif name == "test":
+            if not _equal(_resolve(doc, tokens), _member(op, "value")):
+                raise JsonPatchError(f"Test failed at {op.get('path')}")
+        else:
+            raise JsonPatchError(f"Unsupported op: {name}")
+    return doc
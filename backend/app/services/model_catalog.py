@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import time
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core.fast_json import dumps
+from app.core.http_client import upstream
+from app.core.log_queue import get_logger
+from app.schemas.goal import ModelInfo
+from app.services.context_window import context_window
+from app.services.model_router import model_router
+
+logger = get_logger("model_catalog")
+
+# Fallback if API fails completely
+FALLBACK_GROQ_MODELS = [
+    {"id": "llama-3.3-70b-versatile", "name": "Llama 3.3 70B (Versatile)"},
+    {"id": "mixtral-8x7b-32768", "name": "Mixtral 8x7B"},
+]
+
+# --- STRICT BLOCKLIST ---
+BLOCKED_KEYWORDS = [
+    "whisper", "tts", "audio", "guard", "vision", "embed",
+    "speech", "distil-whisper", "playback", "tool-use", "gpt", "oss",
+    "playai",
+]
+
+
+def display_name(model_id: str) -> str:
+    name = model_id.replace("-", " ").title()
+    name = name.replace("Versatile", "(V)")
+    name = name.replace("Instant", "(I)")
+    name = name.replace("Developer", "(Dev)")
+    return name
+
+
+class CatalogSnapshot:
+    """One refresh's result, with the /models response body serialized once up front."""
+
+    __slots__ = ("models", "capabilities", "body", "etag", "source", "fetched_at")
+
+    def __init__(self, models: List[ModelInfo], capabilities: Dict[str, dict], source: str):
+        self.models = models
+        self.capabilities = capabilities
+        self.body = dumps([m.model_dump() for m in models])
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:16] + '"'
+        self.source = source  # "upstream" or "fallback"
+        self.fetched_at = time.monotonic()
+
+
+class ModelCatalog:
+    """
+    Chat-capable Groq models, refreshed in the background (started from the lifespan)
+    instead of on the request path. Readers always get the last good snapshot at once;
+    a failed refresh keeps it and retries sooner. Concurrent refreshes share one
+    upstream call. Every refresh also feeds context_window and model_router, so they
+    know the catalog before the first /models request.
+    """
+
+    def __init__(self, refresh_interval: float, retry_interval: float):
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._inflight: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self.last_error: Optional[str] = None
+        self.refreshes = 0
+        self.failures = 0
+        self.coalesced = 0
+
+    async def snapshot(self) -> CatalogSnapshot:
+        if self._snapshot is None:
+            # Only before the first refresh finished (e.g. a request racing startup)
+            await self.refresh()
+        elif time.monotonic() - self._snapshot.fetched_at > self.refresh_interval * 2:
+            # The background loop is behind (or not running): serve stale, revalidate
+            self._refresh_in_background()
+        return self._snapshot
+
+    async def models(self) -> List[ModelInfo]:
+        return (await self.snapshot()).models
+
+    async def capabilities(self, model: str) -> Optional[dict]:
+        """What we know about `model`: catalog limits plus latency observed by model_router. None if not in the catalog."""
+        known = (await self.snapshot()).capabilities.get(model)
+        if known is None:
+            return None
+        health = model_router.peek(model)  # read-only, so arbitrary ids cannot grow the router's table
+        return {
+            "id": model,
+            "context_length": known["context_length"],
+            "max_completion_tokens": known.get("max_completion_tokens"),
+            "owned_by": known.get("owned_by"),
+            "ttft": round(health.ttft, 3) if health and health.ttft is not None else None,
+            "tokens_per_sec": round(health.tps, 1) if health and health.tps is not None else None,
+            "error_rate": round(health.error_rate, 3) if health else 0.0,
+            "circuit": health.state if health else "closed",
+        }
+
+    async def refresh(self) -> CatalogSnapshot:
+        """Fetch now, or join the fetch already running."""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._refresh())
+        else:
+            self.coalesced += 1
+        # shield: a cancelled caller must not cancel the refresh other callers wait on
+        return await asyncio.shield(self._inflight)
+
+    def _refresh_in_background(self):
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._refresh())
+
+    async def _refresh(self) -> CatalogSnapshot:
+        logger.info("🔄 [MODELS] Fetching fresh list from Groq...")
+        headers = {"Authorization": f"Bearer {settings.GROQ_API_KEY}"}
+        self.refreshes += 1
+        try:
+            resp = await upstream.client.get(f"{settings.GROQ_API_URL}/models", headers=headers, timeout=5.0)
+            if resp.status_code != 200:
+                raise Exception(f"Status {resp.status_code}")
+            models, capabilities = [], {}
+            for m in resp.json().get("data", []):
+                mid = m.get("id", "")
+                if not mid or any(block in mid.lower() for block in BLOCKED_KEYWORDS) or m.get("active") is False:
+                    continue
+                info = ModelInfo(id=mid, name=display_name(mid), provider="Groq", context_length=m.get("context_window", 8192))
+                models.append(info)
+                capabilities[mid] = {
+                    "context_length": info.context_length,
+                    "max_completion_tokens": m.get("max_completion_tokens"),
+                    "owned_by": m.get("owned_by"),
+                }
+            models.sort(key=lambda x: 0 if "3.3" in x.id else 1)
+            snapshot = CatalogSnapshot(models, capabilities, "upstream")
+            self.last_error = None
+            logger.info(f"✅ [MODELS] Found {len(models)} chat-compatible models.")
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            if self._snapshot is not None:
+                logger.info(f"⚠️ [MODELS] Fetch failed ({e}). Keeping the last catalog.")
+                return self._snapshot
+            logger.info(f"⚠️ [MODELS] Fetch failed ({e}). Using fallback.")
+            models = [ModelInfo(id=m["id"], name=m["name"], provider="Groq", context_length=32000) for m in FALLBACK_GROQ_MODELS]
+            snapshot = CatalogSnapshot(models, {m.id: {"context_length": m.context_length} for m in models}, "fallback")
+
+        context_window.register_models(snapshot.models)
+        model_router.register_models(snapshot.models)
+        self._snapshot = snapshot
+        return snapshot
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+                healthy = self.last_error is None
+            except Exception as e:
+                logger.info(f"⚠️ [MODELS] Refresh loop error ({e}).")
+                healthy = False
+            await asyncio.sleep(self.refresh_interval if healthy else self.retry_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for task in (self._task, self._inflight):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._inflight = None
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "models": len(snapshot.models) if snapshot else 0,
+            "age_seconds": round(time.monotonic() - snapshot.fetched_at, 1) if snapshot else -1,
+            "fallback": 1 if snapshot is not None and snapshot.source == "fallback" else 0,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "coalesced": self.coalesced,
+        }
+
+
+model_catalog = ModelCatalog(
+    refresh_interval=settings.MODEL_CATALOG_REFRESH_INTERVAL,
+    retry_interval=settings.MODEL_CATALOG_RETRY_INTERVAL,
+)
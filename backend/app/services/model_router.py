@@ -0,0 +1,171 @@
+import random
+import time
+from typing import Dict, Iterable, List, Optional
+from app.core.config import settings
+from app.core.log_queue import get_logger
+
+logger = get_logger("model_router")
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class ModelHealth:
+    __slots__ = ("ttft", "tps", "error_rate", "consecutive_failures", "opened_at", "trial_in_flight", "requests", "failures")
+
+    def __init__(self):
+        self.ttft: Optional[float] = None  # EWMA seconds to first token
+        self.tps: Optional[float] = None   # EWMA deltas per second after the first token
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= settings.ROUTER_OPEN_SECONDS:
+            return "half_open"
+        return "open"
+
+
+def _ewma(current: Optional[float], sample: float, alpha: float) -> float:
+    return sample if current is None else current + alpha * (sample - current)
+
+
+class ModelRouter:
+    """
+    Per-model health for upstream calls: EWMA time-to-first-token, throughput and error
+    rate, plus a circuit breaker that stops sending traffic to a model that keeps
+    failing. stream_chat asks it which model to try next and how long to back off.
+    """
+
+    def __init__(self):
+        self._health: Dict[str, ModelHealth] = {}
+        self._catalog: List[str] = []
+        self._known: set = set()
+        self.failovers = 0
+
+    def register_models(self, models) -> None:
+        self._catalog = [m.id for m in models]
+        self._known = set(self._catalog)
+        # Models dropped from the catalog stop being tracked
+        self._health = {m: h for m, h in self._health.items() if m in self._known}
+
+    def health(self, model: str) -> Optional[ModelHealth]:
+        """Health of `model`, created on first use for catalog models; None (untracked) for any other id."""
+        h = self._health.get(model)
+        if h is None and model in self._known:
+            h = self._health[model] = ModelHealth()
+        return h
+
+    def peek(self, model: str) -> Optional[ModelHealth]:
+        """Health of `model` if any call to it was recorded; unlike health(), never adds an entry."""
+        return self._health.get(model)
+
+    def allows(self, model: str) -> bool:
+        h = self.health(model)
+        if h is None:
+            return True
+        state = h.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not h.trial_in_flight:
+            return True
+        return False
+
+    def score(self, model: str) -> float:
+        """Lower is better: expected wait to first token, inflated by recent errors."""
+        h = self.health(model)
+        if h is None:
+            return settings.ROUTER_DEFAULT_TTFT
+        ttft = h.ttft if h.ttft is not None else settings.ROUTER_DEFAULT_TTFT
+        return ttft * (1.0 + 4.0 * h.error_rate)
+
+    def pick(self, model: str, attempts: Dict[str, int], allow_failover: bool) -> Optional[str]:
+        """Next model to try for this request, or None when nothing healthy is left."""
+        if attempts.get(model, 0) < settings.ROUTER_ATTEMPTS_PER_MODEL and self.allows(model):
+            chosen = model
+        elif allow_failover:
+            candidates = [m for m in self._catalog if m != model and m not in attempts and self.allows(m)]
+            if not candidates:
+                return None
+            chosen = min(candidates, key=self.score)
+            self.failovers += 1
+            logger.info(f"🔀 [ROUTER] Failing over {model} -> {chosen}.")
+        else:
+            return None
+
+        h = self.health(chosen)
+        if h is not None and h.state == "half_open":
+            h.trial_in_flight = True
+        attempts[chosen] = attempts.get(chosen, 0) + 1
+        return chosen
+
+    def record_success(self, model: str, ttft: Optional[float], tps: Optional[float]):
+        h = self.health(model)
+        if h is None:
+            return
+        alpha = settings.ROUTER_EWMA_ALPHA
+        h.requests += 1
+        if ttft is not None:
+            h.ttft = _ewma(h.ttft, ttft, alpha)
+        if tps is not None:
+            h.tps = _ewma(h.tps, tps, alpha)
+        h.error_rate = _ewma(h.error_rate, 0.0, alpha)
+        h.consecutive_failures = 0
+        h.opened_at = None
+        h.trial_in_flight = False
+
+    def record_failure(self, model: str):
+        h = self.health(model)
+        if h is None:
+            return
+        h.requests += 1
+        h.failures += 1
+        h.error_rate = _ewma(h.error_rate, 1.0, settings.ROUTER_EWMA_ALPHA)
+        h.consecutive_failures += 1
+        if h.trial_in_flight or h.consecutive_failures >= settings.ROUTER_FAILURE_THRESHOLD:
+            if h.opened_at is None or h.trial_in_flight:
+                logger.info(f"⛔ [ROUTER] Circuit open for {model}.")
+            h.opened_at = time.monotonic()
+        h.trial_in_flight = False
+
+    def release(self, model: str):
+        """The request ended without a verdict (client left); let the next caller run the trial."""
+        h = self.peek(model)
+        if h is not None:
+            h.trial_in_flight = False
+
+    @staticmethod
+    def backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), settings.ROUTER_MAX_BACKOFF)
+            except ValueError:
+                pass
+        delay = settings.ROUTER_BACKOFF_BASE * (2 ** attempt)
+        return min(delay * random.uniform(0.5, 1.5), settings.ROUTER_MAX_BACKOFF)
+
+    def stats(self, models: Optional[Iterable[str]] = None) -> dict:
+        names = list(models) if models is not None else list(self._health)
+        tracked = {m: h for m in names if (h := self.peek(m)) is not None}
+        return {
+            "failovers": self.failovers,
+            "models": {
+                m: {
+                    "state": h.state,
+                    "ttft": round(h.ttft, 3) if h.ttft is not None else None,
+                    "tokens_per_sec": round(h.tps, 1) if h.tps is not None else None,
+                    "error_rate": round(h.error_rate, 3),
+                    "requests": h.requests,
+                    "failures": h.failures,
+                }
+                for m, h in tracked.items()
+            },
+        }
+
+
+model_router = ModelRouter()
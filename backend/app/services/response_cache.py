@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncGenerator, List, Optional, Tuple
+from app.core.config import settings
+from app.core.log_queue import get_logger
+
+logger = get_logger("response_cache")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_messages(messages: List[dict]) -> List[Tuple[str, str]]:
+    """Case/whitespace-insensitive view of the conversation, so "Learn  Japanese" == "learn japanese"."""
+    return [
+        (m["role"], _WHITESPACE.sub(" ", m["content"]).strip().casefold())
+        for m in messages if m["content"].strip()
+    ]
+
+
+class ResponseCache:
+    """
+    Cache of complete stream_chat outputs keyed on (model, prompt version, normalized messages).
+    In-memory LRU with TTL and a byte budget; optionally backed by a SQLite file so entries
+    survive restarts and are shared by every worker on the host.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, db_path: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._size = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model: str, prompt_version: str, messages: List[dict]) -> str:
+        raw = json.dumps([model, prompt_version, normalize_messages(messages)], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # --- memory tier ---
+    def _mem_get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            self._mem_drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _mem_set(self, key: str, value: bytes, expires_at: float):
+        if key in self._entries:
+            self._mem_drop(key)
+        self._entries[key] = (expires_at, value)
+        self._size += len(value)
+        while self._size > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._mem_drop(oldest)
+            self.evictions += 1
+
+    def _mem_drop(self, key: str):
+        _, value = self._entries.pop(key)
+        self._size -= len(value)
+
+    # --- sqlite tier (runs in a thread) ---
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_accessed ON response_cache (accessed_at)")
+        return self._db
+
+    def _db_get(self, key: str) -> Optional[Tuple[float, bytes]]:
+        now = time.time()
+        with self._db_lock:
+            db = self._conn()
+            row = db.execute("SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                db.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                return None
+            db.execute("UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[1], bytes(row[0])
+
+    def _db_set(self, key: str, value: bytes, expires_at: float):
+        now = time.time()
+        with self._db_lock:
+            db = self._conn()
+            db.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), expires_at, now),
+            )
+            db.execute("DELETE FROM response_cache WHERE expires_at < ?", (now,))
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()[0]
+            if total > self.max_bytes:
+                # Drop least recently used rows until we are back under budget
+                rows = db.execute("SELECT key, size FROM response_cache ORDER BY accessed_at").fetchall()
+                doomed = []
+                for k, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    doomed.append((k,))
+                    total -= size
+                db.executemany("DELETE FROM response_cache WHERE key = ?", doomed)
+                self.evictions += len(doomed)
+
+    # --- public API ---
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self._mem_get(key)
+        if value is None and self.db_path:
+            try:
+                found = await asyncio.to_thread(self._db_get, key)
+            except sqlite3.Error as e:
+                logger.info(f"⚠️ [CACHE] SQLite read failed ({e}).")
+                found = None
+            if found:
+                expires_at, value = found
+                self._mem_set(key, value, expires_at)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        expires_at = time.time() + self.ttl
+        self._mem_set(key, value, expires_at)
+        self.stores += 1
+        if self.db_path:
+            try:
+                await asyncio.to_thread(self._db_set, key, value, expires_at)
+            except sqlite3.Error as e:
+                logger.info(f"⚠️ [CACHE] SQLite write failed ({e}).")
+
+    async def replay(self, value: bytes, chunk_chars: int = 0, delay: float = 0.0) -> AsyncGenerator[bytes, None]:
+        """Re-stream a stored response. Chunks are cut on character boundaries so every chunk is valid UTF-8."""
+        if chunk_chars <= 0:
+            yield value
+            return
+        text = value.decode("utf-8")
+        for i in range(0, len(text), chunk_chars):
+            yield text[i:i + chunk_chars].encode("utf-8")
+            if delay:
+                await asyncio.sleep(delay)
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "sqlite": bool(self.db_path),
+        }
+
+
+response_cache = ResponseCache(
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    db_path=settings.RESPONSE_CACHE_DB_PATH,
+)
@@ -0,0 +1,119 @@
+"""
+Full-text index over each goal's title and plan steps (breakdown[*].step / .description).
+
+Postgres: goal_search(goal_id, user_id, document tsvector) with a GIN index; the title
+is weighted A and the steps B. SQLite: an FTS5 table keyed by goal id. Either way the
+document is built inside the database from the goals row, so neither indexing nor
+searching pulls JSON into Python. The tables are created by migration 0002; callers
+reindex after writes that touch original_goal or breakdown, in the same transaction.
+"""
+
+import re
+from typing import List, Optional
+from sqlalchemy import DateTime, Float, Integer, String, Text, bindparam, column, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import engine
+
+IS_POSTGRES = engine.dialect.name == "postgresql"
+MAX_TERMS = 16
+_RESULT_COLUMNS = (
+    column("id", Integer), column("original_goal", Text), column("model_used", String),
+    column("created_at", DateTime), column("updated_at", DateTime), column("score", Float),
+)
+
+_PG_DOCUMENT = """
+    SELECT g.id, g.user_id,
+        setweight(to_tsvector('english', coalesce(g.original_goal, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(concat_ws(' ', s->>'step', s->>'description'), ' ')
+            FROM jsonb_array_elements(CASE WHEN jsonb_typeof(g.breakdown::jsonb) = 'array' THEN g.breakdown::jsonb ELSE '[]'::jsonb END) AS s
+        ), '')), 'B')
+    FROM goals g
+"""
+
+_SQLITE_DOCUMENT = """
+    SELECT g.id, coalesce(g.user_id, ''), coalesce(g.original_goal, ''), coalesce((
+        SELECT group_concat(coalesce(json_extract(s.value, '$.step'), '') || ' ' || coalesce(json_extract(s.value, '$.description'), ''), ' ')
+        FROM json_each(CASE WHEN json_type(g.breakdown) = 'array' THEN g.breakdown ELSE '[]' END) AS s
+    ), '')
+    FROM goals g
+"""
+
+
+async def reindex(db: AsyncSession, goal_id: int):
+    """Rebuild one goal's document from its current row. Caller commits."""
+    await reindex_many(db, [goal_id])
+
+
+async def reindex_many(db: AsyncSession, goal_ids: List[int]):
+    """reindex() for a set of goals in two statements (bulk inserts). Caller commits."""
+    if not goal_ids:
+        return
+    ids = bindparam("ids", expanding=True)
+    if IS_POSTGRES:
+        await db.execute(text(
+            f"INSERT INTO goal_search (goal_id, user_id, document) {_PG_DOCUMENT} WHERE g.id IN :ids "
+            "ON CONFLICT (goal_id) DO UPDATE SET user_id = EXCLUDED.user_id, document = EXCLUDED.document"
+        ).bindparams(ids), {"ids": goal_ids})
+    else:
+        await db.execute(text("DELETE FROM goal_search WHERE rowid IN :ids").bindparams(ids), {"ids": goal_ids})
+        await db.execute(text(f"INSERT INTO goal_search (rowid, owner, goal, steps) {_SQLITE_DOCUMENT} WHERE g.id IN :ids").bindparams(ids), {"ids": goal_ids})
+
+
+async def remove(db: AsyncSession, goal_id: Optional[int] = None, user_id: Optional[str] = None):
+    """Drop index rows for deleted goals (Postgres also cascades; FTS5 tables cannot). Caller commits."""
+    if goal_id is not None:
+        column = "goal_id" if IS_POSTGRES else "rowid"
+        await db.execute(text(f"DELETE FROM goal_search WHERE {column} = :id"), {"id": goal_id})
+    if user_id is not None:
+        column = "user_id" if IS_POSTGRES else "owner"
+        await db.execute(text(f"DELETE FROM goal_search WHERE {column} = :uid"), {"uid": user_id})
+
+
+def query_terms(q: str) -> List[str]:
+    return re.findall(r"\w+", q.lower())[:MAX_TERMS]
+
+
+def _fts5_phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+async def search(db: AsyncSession, user_id: str, q: str, limit: int, offset: int) -> List[dict]:
+    """Best matches first. All terms must match; the last one also matches as a prefix (search as you type)."""
+    terms = query_terms(q)
+    if not terms:
+        return []
+
+    if IS_POSTGRES:
+        tsquery = " & ".join(terms[:-1] + [terms[-1] + ":*"])
+        result = await db.execute(text("""
+            SELECT g.id, g.original_goal, g.model_used, g.created_at, g.updated_at, ts_rank_cd(s.document, q) AS score
+            FROM goal_search s
+            JOIN goals g ON g.id = s.goal_id,
+                 to_tsquery('english', :tsquery) AS q
+            WHERE s.user_id = :uid AND s.document @@ q
+            ORDER BY score DESC, g.id DESC
+            LIMIT :limit OFFSET :offset
+        """).columns(*_RESULT_COLUMNS), {"tsquery": tsquery, "uid": user_id, "limit": limit, "offset": offset})
+    else:
+        match = " AND ".join(
+            [f"owner : {_fts5_phrase(user_id)}"]
+            + [_fts5_phrase(t) for t in terms[:-1]]
+            + [_fts5_phrase(terms[-1]) + "*"]
+        )
+        result = await db.execute(text("""
+            SELECT g.id, g.original_goal, g.model_used, g.created_at, g.updated_at, -bm25(goal_search, 0.0, 10.0, 4.0) AS score
+            FROM goal_search
+            JOIN goals g ON g.id = goal_search.rowid
+            WHERE goal_search MATCH :match AND goal_search.owner = :uid
+            ORDER BY score DESC, g.id DESC
+            LIMIT :limit OFFSET :offset
+        """).columns(*_RESULT_COLUMNS), {"match": match, "uid": user_id, "limit": limit, "offset": offset})
+
+    return [
+        {
+            "id": r.id, "goal": r.original_goal, "model": r.model_used or "Groq",
+            "date": r.updated_at or r.created_at, "rank": round(float(r.score), 4),
+        }
+        for r in result.all()
+    ]
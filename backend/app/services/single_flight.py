@@ -0,0 +1,87 @@
+import asyncio
+from typing import AsyncGenerator, Callable, Dict, List, Optional
+
+
+class _Flight:
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def publish(self):
+        # Wake everyone waiting on the current event, then arm a fresh one
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight streams. The first caller for a key starts one
+    producer task; concurrent callers with the same key get the already buffered
+    prefix replayed and then follow the live chunks. The producer is cancelled
+    only when its last subscriber goes away.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def _produce(self, key: str, flight: _Flight, factory: Callable[[], AsyncGenerator[bytes, None]]):
+        try:
+            async for chunk in factory():
+                flight.chunks.append(chunk)
+                flight.publish()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.publish()
+
+    async def stream(self, key: str, factory: Callable[[], AsyncGenerator[bytes, None]]) -> AsyncGenerator[bytes, None]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._produce(key, flight, factory))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        flight.subscribers += 1
+        sent = 0
+        try:
+            while True:
+                waiter = flight.changed
+                while sent < len(flight.chunks):
+                    yield flight.chunks[sent]
+                    sent += 1
+                if flight.done:
+                    break
+                await waiter.wait()
+            if flight.error is not None and not isinstance(flight.error, asyncio.CancelledError):
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and flight.task:
+                flight.task.cancel()
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
+
+
+single_flight = SingleFlight()
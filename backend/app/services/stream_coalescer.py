@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import AsyncGenerator, AsyncIterator, List, Optional
+
+
+class _Buffer:
+    """Chunks read ahead by the pump task, waiting for the next write."""
+
+    __slots__ = ("parts", "size", "done", "error", "waiter", "room")
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.size = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.waiter: Optional[asyncio.Future] = None  # consumer asleep until data / deadline
+        self.room: Optional[asyncio.Future] = None  # pump asleep until the consumer drains
+
+    def wake(self, *_):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts) if len(self.parts) > 1 else self.parts[0]
+        self.parts, self.size = [], 0
+        if self.room is not None and not self.room.done():
+            self.room.set_result(None)
+        return data
+
+
+async def coalesce(source: AsyncIterator[bytes], max_bytes: int, window: float) -> AsyncGenerator[bytes, None]:
+    """
+    Merges small provider deltas into fewer, larger writes. A pump task reads `source`
+    into a buffer; the response side writes at most once per `window` seconds, or as
+    soon as `max_bytes` are buffered. The first chunk, and the first one after a pause
+    longer than `window`, goes out at once since that is the latency users notice.
+
+    Per delta this costs a list append; timers and wakeups happen once per write.
+    The pump stops reading while `max_bytes` wait for a slow client, so back-pressure
+    reaches the upstream connection instead of growing memory.
+    """
+    loop = asyncio.get_running_loop()
+    buf = _Buffer()
+
+    async def pump():
+        try:
+            async for chunk in source:
+                buf.parts.append(chunk)
+                buf.size += len(chunk)
+                if buf.size >= max_bytes or len(buf.parts) == 1:
+                    buf.wake()
+                if buf.size >= max_bytes:
+                    buf.room = loop.create_future()
+                    await buf.room
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            buf.error = e
+        finally:
+            buf.done = True
+            buf.wake()
+
+    task = asyncio.create_task(pump())
+    last_write = float("-inf")
+    try:
+        while True:
+            if not buf.parts and not buf.done:
+                buf.waiter = loop.create_future()
+                await buf.waiter
+            if buf.parts and not buf.done and buf.size < max_bytes:
+                # Hold back until the window since the last write is over (or the buffer fills)
+                delay = last_write + window - time.monotonic()
+                if delay > 0:
+                    buf.waiter = loop.create_future()
+                    timer = loop.call_later(delay, buf.wake)
+                    await buf.waiter
+                    timer.cancel()
+            if buf.parts:
+                yield buf.take()
+                last_write = time.monotonic()
+            elif buf.done:
+                if buf.error is not None:
+                    raise buf.error
+                return
+    finally:
+        if not task.done():
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,221 @@
+import asyncio
+import time
+import uuid
+from bisect import bisect_right
+from typing import AsyncGenerator, AsyncIterator, Dict, List, Optional
+from app.core.config import settings
+from app.core.log_queue import get_logger
+
+logger = get_logger("stream_hub")
+
+
+class OffsetGone(Exception):
+    """The requested offset has already been dropped from the ring buffer."""
+
+
+class ResumableStream:
+    """
+    One generation running detached from the request that started it. Response bytes go
+    into a ring buffer addressed by byte offset, so a client that lost its connection
+    can ask for everything after the last byte it saw.
+    """
+
+    def __init__(self, stream_id: str, media_type: str, max_bytes: int):
+        self.id = stream_id
+        self.media_type = media_type
+        self.max_bytes = max_bytes
+        # Chunks and the offset of each one's first byte; entries before _head were dropped
+        self._offsets: List[int] = []
+        self._data: List[bytes] = []
+        self._head = 0
+        self.start = 0  # oldest offset still buffered
+        self.end = 0  # bytes produced so far
+        self.size = 0
+        self.done = False
+        self.cancelled = False
+        self.subscribers = 0
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._waiters: List[asyncio.Future] = []
+        self._grace: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def state(self) -> str:
+        if self.cancelled:
+            return "cancelled"
+        return "done" if self.done else "running"
+
+    def append(self, data: bytes):
+        self._offsets.append(self.end)
+        self._data.append(data)
+        self.end += len(data)
+        self.size += len(data)
+        while self.size > self.max_bytes and len(self._data) - self._head > 1:
+            old = self._data[self._head]
+            self._data[self._head] = b""
+            self.size -= len(old)
+            self._head += 1
+            self.start = self._offsets[self._head]
+        if self._head > 64 and self._head * 2 > len(self._data):
+            # Compact now and then, so the lists stay proportional to what is buffered
+            del self._offsets[:self._head], self._data[:self._head]
+            self._head = 0
+        self._notify()
+
+    def read(self, offset: int) -> bytes:
+        """Everything buffered from `offset` on (b"" when caught up)."""
+        if offset < self.start:
+            raise OffsetGone()
+        if offset >= self.end:
+            return b""
+        i = bisect_right(self._offsets, offset, self._head) - 1
+        first = self._data[i][offset - self._offsets[i]:]
+        return b"".join([first, *self._data[i + 1:]])
+
+    async def wait(self):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        await future
+
+    def _notify(self):
+        waiters, self._waiters = self._waiters, []
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+
+    def finish(self):
+        self.done = True
+        self.finished_at = time.monotonic()
+        if self._grace is not None:
+            self._grace.cancel()
+            self._grace = None
+        self._notify()
+
+
+class StreamHub:
+    """
+    Registry of resumable streams for this worker. Every /stream-goal(s) response is
+    produced by a background task into a ResumableStream and read by subscribers:
+    the original response, plus any reconnect (GET /streams/{id} with Last-Event-ID
+    set to the number of bytes already received).
+
+    When the last subscriber goes away the upstream keeps running for `grace` seconds
+    so a reconnect can pick it up; after that, or on an explicit cancel, the producer
+    task is cancelled, which closes the upstream request. Finished streams stay
+    readable for `ttl` seconds. Reconnects must reach the same worker.
+    """
+
+    def __init__(self, buffer_bytes: int, grace: float, ttl: float, max_streams: int):
+        self.buffer_bytes = buffer_bytes
+        self.grace = grace
+        self.ttl = ttl
+        self.max_streams = max_streams
+        self._streams: Dict[str, ResumableStream] = {}
+        self.opened = 0
+        self.resumed = 0
+        self.abandoned = 0
+        self.cancelled = 0
+
+    def open(self, source: AsyncIterator[bytes], media_type: str, stream_id: Optional[str] = None) -> ResumableStream:
+        self._evict()
+        stream = ResumableStream(stream_id or uuid.uuid4().hex, media_type, self.buffer_bytes)
+        stream.task = asyncio.create_task(self._produce(stream, source))
+        # Armed until the first subscriber attaches, so a response that never starts cannot leak the upstream
+        stream._grace = asyncio.get_running_loop().call_later(self.grace, self._abandon, stream)
+        self._streams[stream.id] = stream
+        self.opened += 1
+        return stream
+
+    def get(self, stream_id: str) -> Optional[ResumableStream]:
+        self._evict()
+        return self._streams.get(stream_id)
+
+    async def _produce(self, stream: ResumableStream, source: AsyncIterator[bytes]):
+        try:
+            async for chunk in source:
+                stream.append(chunk)
+        except asyncio.CancelledError:
+            stream.cancelled = True
+        except Exception as e:
+            logger.info(f"🔥 [RESUME] Stream {stream.id} failed: {e}")
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            stream.finish()
+
+    async def subscribe(self, stream: ResumableStream, offset: int = 0, resumed: bool = False) -> AsyncGenerator[bytes, None]:
+        """Bytes of `stream` from `offset` until it ends. Callers check the offset first (read() raises OffsetGone)."""
+        self._attach(stream)
+        if resumed:
+            self.resumed += 1
+        try:
+            while True:
+                data = stream.read(offset)
+                if data:
+                    offset += len(data)
+                    yield data
+                elif stream.done:
+                    return
+                else:
+                    await stream.wait()
+        finally:
+            self._detach(stream)
+
+    def cancel(self, stream_id: str) -> bool:
+        stream = self._streams.get(stream_id)
+        if stream is None or stream.done or stream.task is None:
+            return False
+        stream.task.cancel()
+        self.cancelled += 1
+        logger.info(f"🛑 [RESUME] Stream {stream_id} cancelled by client.")
+        return True
+
+    def _attach(self, stream: ResumableStream):
+        stream.subscribers += 1
+        if stream._grace is not None:
+            stream._grace.cancel()
+            stream._grace = None
+
+    def _detach(self, stream: ResumableStream):
+        stream.subscribers -= 1
+        if stream.subscribers == 0 and not stream.done:
+            stream._grace = asyncio.get_running_loop().call_later(self.grace, self._abandon, stream)
+
+    def _abandon(self, stream: ResumableStream):
+        stream._grace = None
+        if stream.subscribers == 0 and not stream.done and stream.task is not None:
+            stream.task.cancel()
+            self.abandoned += 1
+            logger.info(f"✂️ [RESUME] No client came back for {stream.id} after {self.grace}s; upstream cancelled.")
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [sid for sid, s in self._streams.items() if s.done and now - s.finished_at > self.ttl]
+        for sid in expired:
+            del self._streams[sid]
+        if len(self._streams) >= self.max_streams:
+            finished = sorted((s for s in self._streams.values() if s.done), key=lambda s: s.finished_at)
+            for s in finished[:len(self._streams) - self.max_streams + 1]:
+                del self._streams[s.id]
+
+    def stats(self) -> dict:
+        running = [s for s in self._streams.values() if not s.done]
+        return {
+            "running": len(running),
+            "detached": sum(1 for s in running if s.subscribers == 0),
+            "retained": len(self._streams),
+            "buffered_bytes": sum(s.size for s in self._streams.values()),
+            "opened": self.opened,
+            "resumed": self.resumed,
+            "abandoned": self.abandoned,
+            "cancelled": self.cancelled,
+        }
+
+
+stream_hub = StreamHub(
+    buffer_bytes=settings.STREAM_RESUME_BUFFER_BYTES,
+    grace=settings.STREAM_RESUME_GRACE,
+    ttl=settings.STREAM_RESUME_TTL,
+    max_streams=settings.STREAM_RESUME_MAX_STREAMS,
+)
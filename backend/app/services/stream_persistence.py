@@ -0,0 +1,136 @@
+import asyncio
+import time
+from typing import AsyncGenerator, List, Optional, Set
+from sqlalchemy import select, update
+from app.core.database import AsyncSessionLocal
+from app.core.log_queue import get_logger
+from app.models.goal import Goal
+from app.schemas.goal import ChatMessage
+from app.services.ai_service import PlanStreamParser
+from app.services import blob_store
+from app.services.history_cache import history_cache
+from app.services.turn_store import write_turn
+from app.services.write_buffer import write_buffer
+
+logger = get_logger("stream_persistence")
+
+# Background writes still running; kept so they are not garbage collected and can be drained on shutdown
+_pending_writes: Set[asyncio.Task] = set()
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def build_agent_state(model: str, text: str, stopped: bool, metrics: dict) -> dict:
+    """AgentState (frontend types/chat.ts) for a finished stream."""
+    if text.startswith("Error:"):
+        return {"modelId": model, "status": "error", "rawOutput": text, "thinking": text[6:].strip(), "jsonResult": None, "metrics": metrics}
+
+    parser = PlanStreamParser()
+    events = parser.feed(text)
+    if not parser.finished:
+        events += parser.close()
+    thinking = "".join(e["data"] for e in events if e["type"] == "thinking")
+    plan = parser.plan
+
+    status = "complete" if plan is not None or not stopped else "stopped"
+    if status == "stopped":
+        thinking += "\n[Interrupted]"
+    return {"modelId": model, "status": status, "rawOutput": text, "thinking": thinking.strip(), "jsonResult": plan, "metrics": metrics}
+
+
+def place_agent(history: List, turn_id: str, version_index: Optional[int], user_message: str, agent: dict) -> int:
+    """Put `agent` into the matching turn of chat_history (creating the turn if the client has not saved it yet)."""
+    model = agent["modelId"]
+    for index, turn in enumerate(history):
+        if isinstance(turn, dict) and turn.get("id") == turn_id:
+            versions = turn.setdefault("versions", [])
+            v = version_index if version_index is not None else turn.get("currentVersionIndex", 0)
+            if 0 <= v < len(versions):
+                versions[v].setdefault("agents", {})[model] = agent
+            if v == turn.get("currentVersionIndex", 0):
+                turn.setdefault("agents", {})[model] = agent
+            return index
+
+    created = agent["metrics"].get("startTime") or _now_ms()
+    history.append({
+        "id": turn_id,
+        "userMessage": user_message,
+        "agents": {model: agent},
+        "versions": [{
+            "id": f"{turn_id}-v1",
+            "userMessage": user_message,
+            "agents": {model: agent},
+            "downstreamHistory": [],
+            "createdAt": created,
+        }],
+        "currentVersionIndex": 0,
+    })
+    return len(history) - 1
+
+
+async def persist_agent_result(goal_id: int, turn_id: str, version_index: Optional[int], user_message: str, agent: dict, attempts: int = 3):
+    """Read-modify-write of one agent's result, retried on version conflicts with concurrent saves."""
+    await write_buffer.flush(goal_id)
+    for _ in range(attempts):
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(select(Goal.user_id, Goal.version, Goal.chat_history, Goal.chat_history_z).where(Goal.id == goal_id))).one_or_none()
+            if row is None:
+                return
+            history = list(blob_store.chat_history(row) or [])
+            turn_index = place_agent(history, turn_id, version_index, user_message, agent)
+            result = await db.execute(
+                update(Goal)
+                .where(Goal.id == goal_id, Goal.version == row.version)
+                .values(**blob_store.pack({"chat_history": history}), version=row.version + 1)
+            )
+            if result.rowcount == 0:
+                await db.rollback()
+                continue
+            await write_turn(db, goal_id, turn_index, history[turn_index])
+            await db.commit()
+            await history_cache.invalidate(row.user_id)
+            logger.info(f"💾 [TEE] Saved {agent['modelId']} ({agent['status']}) to goal {goal_id}.")
+            return
+    logger.info(f"⚠️ [TEE] Gave up saving {agent['modelId']} to goal {goal_id} after {attempts} conflicts.")
+
+
+def _schedule(coro):
+    task = asyncio.create_task(coro)
+    _pending_writes.add(task)
+    task.add_done_callback(_pending_writes.discard)
+
+
+async def tee_to_goal(
+    source: AsyncGenerator[bytes, None],
+    goal_id: int,
+    turn_id: str,
+    model: str,
+    messages: List[ChatMessage],
+    version_index: Optional[int] = None,
+) -> AsyncGenerator[bytes, None]:
+    """Pass chunks straight through; when the stream ends (or the client leaves) save the parsed result in the background."""
+    parts: List[bytes] = []
+    metrics = {"startTime": _now_ms(), "endTime": None, "firstTokenTime": None}
+    finished = False
+    try:
+        async for chunk in source:
+            if metrics["firstTokenTime"] is None:
+                metrics["firstTokenTime"] = _now_ms()
+            parts.append(chunk)
+            yield chunk
+        finished = True
+    finally:
+        metrics["endTime"] = _now_ms()
+        text = b"".join(parts).decode("utf-8", errors="replace")
+        user_message = next((m.content for m in reversed(messages) if m.role == "user"), "")
+        agent = build_agent_state(model, text, stopped=not finished, metrics=metrics)
+        _schedule(persist_agent_result(goal_id, turn_id, version_index, user_message, agent))
+        await source.aclose()
+
+
+async def drain(timeout: float = 5.0):
+    """Wait for in-flight result writes (lifespan shutdown)."""
+    if _pending_writes:
+        await asyncio.wait(list(_pending_writes), timeout=timeout)
@@ -0,0 +1,143 @@
+from typing import Any, List, Optional
+from sqlalchemy import delete, insert, select, func, case, exists, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.goal import Goal, GoalTurn
+from app.services import blob_store
+
+
+def explode_turn(goal_id: int, turn_index: int, turn: Any) -> List[dict]:
+    """
+    Rows for one ChatTurn: one per (version, agent). Branches hanging off a version
+    (downstreamHistory) stay in the chat_history document only.
+    """
+    if not isinstance(turn, dict):
+        return []
+    versions = turn.get("versions") or [{"userMessage": turn.get("userMessage"), "agents": turn.get("agents") or {}}]
+    rows = []
+    for version_index, version in enumerate(versions):
+        if not isinstance(version, dict):
+            continue
+        for model, agent in (version.get("agents") or {}).items():
+            if not isinstance(agent, dict):
+                continue
+            metrics = agent.get("metrics") or {}
+            start, end = metrics.get("startTime"), metrics.get("endTime")
+            rows.append({
+                "goal_id": goal_id,
+                "turn_index": turn_index,
+                "version": version_index,
+                "turn_uid": turn.get("id"),
+                "user_message": version.get("userMessage"),
+                "agent_model": model,
+                "status": agent.get("status"),
+                "thinking": agent.get("thinking"),
+                "result": agent.get("jsonResult"),
+                "metrics": metrics,
+                "duration_ms": int(end - start) if isinstance(start, (int, float)) and isinstance(end, (int, float)) else None,
+            })
+    return rows
+
+
+def turn_rows(goal_id: int, turn_index: int, turn: Any) -> List[dict]:
+    """explode_turn() with thinking / result in the configured blob layout, ready to insert."""
+    return [blob_store.pack(r, blob_store.TURN_BLOB_COLUMNS) for r in explode_turn(goal_id, turn_index, turn)]
+
+
+async def write_turn(db: AsyncSession, goal_id: int, turn_index: int, turn: Any):
+    """Replace the rows of a single turn. Caller commits."""
+    await db.execute(delete(GoalTurn).where(GoalTurn.goal_id == goal_id, GoalTurn.turn_index == turn_index))
+    rows = turn_rows(goal_id, turn_index, turn)
+    if rows:
+        await db.execute(insert(GoalTurn), rows)
+
+
+# Columns explode_turn fills, compared to tell whether a stored turn changed
+TURN_FIELDS = ("goal_id", "turn_index", "version", "turn_uid", "user_message", "agent_model", "status", "thinking", "result", "metrics", "duration_ms")
+
+
+def _slot(row: dict) -> tuple:
+    return (row["version"], row["agent_model"])
+
+
+async def replace_turns(db: AsyncSession, goal_id: int, chat_history: Optional[List[Any]]):
+    """
+    Bring goal_turns in line with a whole chat_history document (full-document saves). A save
+    usually changes the last turn or appends one, so only turns whose rows differ from what is
+    stored are rewritten, and only the tail past the new length is deleted. Caller commits.
+    """
+    history = chat_history or []
+    result = await db.execute(
+        select(*(getattr(GoalTurn, f) for f in TURN_FIELDS), GoalTurn.thinking_z, GoalTurn.result_z).where(GoalTurn.goal_id == goal_id)
+    )
+    stored: dict = {}
+    for row in result.all():
+        # Compared decoded, so rows in either blob layout match an unchanged turn
+        values = {f: getattr(row, f) for f in TURN_FIELDS}
+        values.update(thinking=blob_store.turn_thinking(row), result=blob_store.turn_result(row))
+        stored.setdefault(row.turn_index, {})[_slot(values)] = values
+
+    changed, rows = [], []
+    for i, turn in enumerate(history):
+        exploded = explode_turn(goal_id, i, turn)
+        if {_slot(r): r for r in exploded} != stored.get(i, {}):
+            changed.append(i)
+            rows.extend(exploded)
+    stale = [i for i in changed if i in stored]
+    if stale:
+        await db.execute(delete(GoalTurn).where(GoalTurn.goal_id == goal_id, GoalTurn.turn_index.in_(stale)))
+    if any(i >= len(history) for i in stored):
+        await db.execute(delete(GoalTurn).where(GoalTurn.goal_id == goal_id, GoalTurn.turn_index >= len(history)))
+    if rows:
+        await db.execute(insert(GoalTurn), [blob_store.pack(r, blob_store.TURN_BLOB_COLUMNS) for r in rows])
+
+
+async def delete_turns(db: AsyncSession, goal_id: Optional[int] = None, user_id: Optional[str] = None):
+    if goal_id is not None:
+        await db.execute(delete(GoalTurn).where(GoalTurn.goal_id == goal_id))
+    if user_id is not None:
+        await db.execute(delete(GoalTurn).where(GoalTurn.goal_id.in_(select(Goal.id).where(Goal.user_id == user_id))))
+
+
+async def model_stats(db: AsyncSession, user_id: Optional[str] = None) -> List[dict]:
+    query = select(
+        GoalTurn.agent_model,
+        func.count().label("answers"),
+        func.sum(case((GoalTurn.status == "complete", 1), else_=0)).label("completed"),
+        func.sum(case((GoalTurn.status == "error", 1), else_=0)).label("errors"),
+        func.avg(GoalTurn.duration_ms).label("avg_duration_ms"),
+    ).group_by(GoalTurn.agent_model)
+    if user_id is not None:
+        query = query.join(Goal, Goal.id == GoalTurn.goal_id).where(Goal.user_id == user_id)
+    result = await db.execute(query)
+    return [
+        {
+            "model": r.agent_model,
+            "answers": r.answers,
+            "completed": r.completed or 0,
+            "errors": r.errors or 0,
+            "avg_duration_ms": round(float(r.avg_duration_ms), 1) if r.avg_duration_ms is not None else None,
+        }
+        for r in result.all()
+    ]
+
+
+async def backfill(db: AsyncSession, batch_size: int = 100) -> int:
+    """Explode chat_history for every goal that has no turn rows yet. Idempotent; returns goals processed."""
+    done = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(Goal.id, Goal.chat_history, Goal.chat_history_z)
+            .where(Goal.id > last_id, or_(Goal.chat_history.is_not(None), Goal.chat_history_z.is_not(None)))
+            .where(~exists().where(GoalTurn.goal_id == Goal.id))
+            .order_by(Goal.id)
+            .limit(batch_size)
+        )
+        rows = result.all()
+        if not rows:
+            return done
+        for row in rows:
+            await replace_turns(db, row.id, blob_store.chat_history(row))
+            last_id = row.id
+        await db.commit()
+        done += len(rows)
@@ -0,0 +1,177 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import update
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.log_queue import get_logger
+from app.models.goal import Goal
+from app.services.turn_store import replace_turns
+from app.services import blob_store, search_index
+from app.services.history_cache import history_cache
+
+logger = get_logger("write_buffer")
+
+
+class GoalWriteBuffer:
+    """
+    Write-behind buffer for goal autosaves. Keeps only the latest values per goal_id
+    and flushes them in one transaction when the durability window elapses, when
+    too many goals are pending, or on shutdown. Readers overlay pending() on what
+    they load so they never see a stale goal.
+
+    Each entry remembers the goal version its latest put() was made against, and is only
+    written if the row is still at that version: a goal changed since (an If-Match write,
+    a stream tee) keeps the newer write and the buffered autosave is dropped.
+    """
+
+    def __init__(self, interval: float, max_pending: int):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: Dict[int, dict] = {}
+        self._owners: Dict[int, Optional[str]] = {}
+        self._seen: Dict[int, int] = {}  # goal_id -> version the pending values replace
+        self._first_write: Optional[float] = None
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.writes = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.conflicts = 0
+
+    def put(self, goal_id: int, user_id: Optional[str], values: dict, version: int):
+        entry = self._pending.setdefault(goal_id, {})
+        entry.update(values)
+        entry["updated_at"] = datetime.utcnow()
+        self._owners[goal_id] = user_id
+        self._seen[goal_id] = version
+        self.writes += 1
+        if self._first_write is None:
+            # Let the flusher re-arm its timer for this durability window
+            self._first_write = time.monotonic()
+            self._wake.set()
+        if len(self._pending) >= self.max_pending:
+            self._wake.set()
+
+    def pending(self, goal_id: int) -> Optional[dict]:
+        return self._pending.get(goal_id)
+
+    def has_pending_user(self, user_id: str) -> bool:
+        return user_id in self._owners.values()
+
+    def discard(self, goal_id: Optional[int] = None, user_id: Optional[str] = None):
+        """Forget buffered writes for a deleted goal (or every goal of a cleared user)."""
+        doomed = [gid for gid, owner in self._owners.items() if gid == goal_id or (user_id is not None and owner == user_id)]
+        for gid in doomed:
+            self._pending.pop(gid, None)
+            self._owners.pop(gid, None)
+            self._seen.pop(gid, None)
+
+    async def flush(self, goal_id: Optional[int] = None):
+        async with self._lock:
+            if goal_id is not None:
+                if goal_id not in self._pending:
+                    return
+                batch = {goal_id: self._pending.pop(goal_id)}
+                owners = {goal_id: self._owners.pop(goal_id, None)}
+                seen = {goal_id: self._seen.pop(goal_id)}
+            else:
+                batch, self._pending = self._pending, {}
+                owners, self._owners = self._owners, {}
+                seen, self._seen = self._seen, {}
+                self._first_write = None
+            if not batch:
+                return
+
+            try:
+                written = []
+                async with AsyncSessionLocal() as db:
+                    for gid, values in batch.items():
+                        result = await db.execute(
+                            update(Goal)
+                            .where(Goal.id == gid, Goal.version == seen[gid])
+                            .values(**blob_store.pack(values), version=seen[gid] + 1)
+                        )
+                        if result.rowcount == 0:
+                            # Written (or deleted) since the autosave was accepted: the newer write wins
+                            self.conflicts += 1
+                            logger.info(f"⚠️ [WRITE-BEHIND] Goal {gid} changed since version {seen[gid]}; buffered autosave dropped.")
+                            continue
+                        written.append(gid)
+                        if "chat_history" in values:
+                            await replace_turns(db, gid, values["chat_history"])
+                        if "original_goal" in values or "breakdown" in values:
+                            await search_index.reindex(db, gid)
+                    await db.commit()
+                # Autosaves accepted while this flush ran were made against the version it replaced
+                for gid in written:
+                    if self._seen.get(gid) == seen[gid]:
+                        self._seen[gid] = seen[gid] + 1
+                # The flush bumps each goal's version, which full history rows include; a dropped
+                # autosave takes back what the overlay was showing
+                await history_cache.invalidate(*owners.values())
+                self.flushes += 1
+                self.rows_flushed += len(written)
+            except Exception as e:
+                logger.info(f"⚠️ [WRITE-BEHIND] Flush of {len(batch)} goals failed ({e}). Retrying later.")
+                # Put back anything that was not superseded while we were writing
+                for gid, values in batch.items():
+                    if gid not in self._pending:
+                        self._pending[gid] = values
+                        self._owners[gid] = owners.get(gid)
+                        self._seen[gid] = seen[gid]
+                if self._first_write is None:
+                    self._first_write = time.monotonic()
+
+    async def flush_user(self, user_id: str):
+        """Write out one user's pending goals (before reads that bypass the overlay, like search)."""
+        for gid in [gid for gid, owner in self._owners.items() if owner == user_id]:
+            await self.flush(gid)
+
+    async def _run(self):
+        while True:
+            timeout = self.interval
+            if self._first_write is not None:
+                timeout = max(0.0, self._first_write + self.interval - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            due = self._first_write is not None and time.monotonic() - self._first_write >= self.interval
+            if due or len(self._pending) >= self.max_pending:
+                await self.flush()
+
+    def start(self):
+        if settings.WRITE_BEHIND_ENABLED and not settings.write_behind_enabled:
+            logger.info(f"⚠️ [WRITE-BEHIND] Off: WEB_CONCURRENCY={settings.WEB_CONCURRENCY}, and other workers could not see this one's buffer.")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "writes": self.writes,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "conflicts": self.conflicts,
+            "interval": self.interval,
+        }
+
+
+write_buffer = GoalWriteBuffer(
+    interval=settings.WRITE_BEHIND_INTERVAL,
+    max_pending=settings.WRITE_BEHIND_MAX_PENDING,
+)
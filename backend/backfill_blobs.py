@@ -0,0 +1,21 @@
+import asyncio
+from app.core.config import settings
+from app.core.blob_codec import blob_codec
+from app.core.database import AsyncSessionLocal
+from app.services.blob_store import backfill, backfill_turns
+
+async def main():
+    # Converts goals and goal_turns to the BLOB_COMPRESSION layout; safe to run while the app is serving
+    target = settings.BLOB_COMPRESSION if blob_codec.enabled else "plain columns"
+    print(f"Moving goal blobs to {target}...")
+    try:
+        async with AsyncSessionLocal() as db:
+            count = await backfill(db)
+            turns = await backfill_turns(db)
+        ratio = f" (compressed size {blob_codec.stats()['ratio']:.1%} of original)" if blob_codec.encoded else ""
+        print(f"Converted {count} goals and {turns} goal turns{ratio}.")
+    except Exception as e:
+        print(f"Backfill error: {e}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,17 @@
+import asyncio
+from app.core.database import AsyncSessionLocal
+from app.services.turn_store import backfill
+
+async def main():
+    # Schema comes from migrations (python prestart.py), and migration 0006 already fills goal_turns;
+    # re-running this only picks up goals whose turn rows were lost
+    print("Backfilling goal_turns from chat_history...")
+    try:
+        async with AsyncSessionLocal() as db:
+            count = await backfill(db)
+        print(f"Backfilled {count} goals.")
+    except Exception as e:
+        print(f"Backfill error: {e}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+"""
+Size and cost of the goal blob layouts (app/core/blob_codec.py), per row:
+
+  json        chat_history as stored today (JSON text)
+  zlib        raw deflate, no dictionary
+  zlib+dict   raw deflate primed with DICTIONARY_V1          (BLOB_COMPRESSION=zlib)
+  zlib1+dict  the same at level 1                            (BLOB_COMPRESSION_LEVEL=1)
+  zstd(+dict) the same with zstd, when zstandard is installed (BLOB_COMPRESSION=zstd)
+
+Encode is dumps + compress (a save); decode is decompress + loads (a detail view).
+Rows are synthetic ChatTurns with random prose, so the dictionary only helps through
+structure, not by containing the text; --from-db measures the goals in DATABASE_URL.
+
+    python -m bench.blob_codec [--rows 500] [--turns 1,5,20] [--from-db 1000]
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+from app.core.blob_codec import BlobCodec, zstandard
+from app.core.fast_json import dumps, loads
+
+_SYLLABLES = "ba be bi bo bu ca co cu da de di do fa fe fi fo ga ge go ha he hi ka ke ki ko la le li lo lu ma me mi mo mu na ne ni no pa pe pi po ra re ri ro ru sa se si so ta te ti to va ve vi vo za".split()
+
+
+def vocabulary(rng: random.Random, size: int = 3000) -> List[str]:
+    # Pseudo-words with an English-like spread of lengths; a tiny vocabulary would compress unrealistically well
+    return ["".join(rng.choice(_SYLLABLES) for _ in range(rng.choice((1, 2, 2, 3, 3, 4)))) for _ in range(size)]
+
+
+WORDS = vocabulary(random.Random(0))
+
+
+def prose(rng: random.Random, words: int) -> str:
+    sentences, left = [], words
+    while left > 0:
+        n = min(left, rng.randint(6, 16))
+        # Zipf-like: common words much more frequent than rare ones
+        sentences.append(" ".join(WORDS[min(int(rng.paretovariate(1.1)) - 1, len(WORDS) - 1)] for _ in range(n)).capitalize() + ".")
+        left -= n
+    return " ".join(sentences)
+
+
+def agent_state(rng: random.Random, model: str) -> dict:
+    steps = [
+        {"step": f"Step {i + 1}: {prose(rng, 4)[:-1]}", "description": prose(rng, 25), "complexity": rng.randint(1, 10)}
+        for i in range(5)
+    ]
+    plan = {"message": prose(rng, 12), "steps": steps}
+    thinking = prose(rng, 150)
+    start = 1_718_000_000_000 + rng.randint(0, 10**9)
+    return {
+        "modelId": model, "status": "complete",
+        "rawOutput": f"<think>\n{thinking}\n</think>\n\n" + dumps(plan).decode(),
+        "thinking": thinking, "jsonResult": plan,
+        "metrics": {"startTime": start, "endTime": start + rng.randint(2000, 20000), "firstTokenTime": start + rng.randint(100, 900)},
+    }
+
+
+def chat_history(rng: random.Random, turns: int) -> list:
+    history = []
+    for t in range(turns):
+        agents = {m: agent_state(rng, m) for m in ("llama-3.3-70b-versatile", "llama-3.1-8b-instant")}
+        message = prose(rng, 10)
+        turn_id = f"turn-{rng.randint(10**12, 10**13)}"
+        history.append({
+            "id": turn_id, "userMessage": message, "agents": agents,
+            "versions": [{"id": f"{turn_id}-v1", "userMessage": message, "agents": agents, "downstreamHistory": [], "createdAt": 1_718_000_000_000 + t}],
+            "currentVersionIndex": 0,
+        })
+    return history
+
+
+async def rows_from_db(limit: int) -> list:
+    from sqlalchemy import select
+    from app.core.database import AsyncSessionLocal
+    from app.models.goal import Goal
+    from app.services import blob_store
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Goal.chat_history, Goal.chat_history_z)
+            .where((Goal.chat_history.is_not(None)) | (Goal.chat_history_z.is_not(None)))
+            .order_by(Goal.id.desc()).limit(limit)
+        )
+        return [blob_store.chat_history(r) for r in result.all()]
+
+
+def codecs() -> dict:
+    variants = {"zlib": BlobCodec("zlib", dictionary_id=0), "zlib+dict": BlobCodec("zlib"), "zlib1+dict": BlobCodec("zlib", level=1)}
+    if zstandard is not None:
+        variants["zstd"] = BlobCodec("zstd", dictionary_id=0)
+        variants["zstd+dict"] = BlobCodec("zstd")
+    return variants
+
+
+def measure(label: str, rows: List[list]):
+    raw = [dumps(r) for r in rows]
+    raw_bytes = sum(len(b) for b in raw)
+    started = time.perf_counter()
+    for r in rows:
+        dumps(r)
+    dump_cost = (time.perf_counter() - started) / len(rows)
+    started = time.perf_counter()
+    for b in raw:
+        loads(b)
+    load_cost = (time.perf_counter() - started) / len(rows)
+    print(f"\n{label}: {len(rows)} rows, {raw_bytes / len(rows) / 1024:.1f} KB JSON per row")
+    print(f"  {'layout':<10} {'bytes/row':>10} {'ratio':>7} {'encode us':>10} {'decode us':>10}")
+    print(f"  {'json':<10} {raw_bytes / len(rows):>10.0f} {1:>7.3f} {dump_cost * 1e6:>10.1f} {load_cost * 1e6:>10.1f}")
+
+    for name, codec in codecs().items():
+        started = time.perf_counter()
+        blobs = [codec.encode_json(r) for r in rows]
+        encode = (time.perf_counter() - started) / len(rows)
+        started = time.perf_counter()
+        decoded = [codec.decode_json(b) for b in blobs]
+        decode = (time.perf_counter() - started) / len(rows)
+        assert decoded == [loads(b) for b in raw]
+        stored = sum(len(b) for b in blobs)
+        print(f"  {name:<10} {stored / len(rows):>10.0f} {stored / raw_bytes:>7.3f} {encode * 1e6:>10.1f} {decode * 1e6:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--turns", default="1,5,20", help="chat turns per synthetic row (comma separated sizes)")
+    parser.add_argument("--from-db", type=int, default=0, metavar="N", help="measure the newest N goals in DATABASE_URL instead")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"zstandard available: {zstandard is not None}")
+    if args.from_db:
+        rows = [r for r in asyncio.run(rows_from_db(args.from_db)) if r]
+        if not rows:
+            print("No goals with chat_history in the database.")
+            return
+        measure("database", rows)
+        return
+    rng = random.Random(args.seed)
+    for turns in (int(t) for t in args.turns.split(",")):
+        measure(f"{turns} turn(s)", [chat_history(rng, turns) for _ in range(args.rows)])
+
+
+if __name__ == "__main__":
+    main()
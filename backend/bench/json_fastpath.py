@@ -0,0 +1,109 @@
+"""
+Micro-benchmark for the JSON fast paths (app/core/fast_json.py):
+
+  per token:        str line -> replace -> json.loads -> .get chain -> encode   (old)
+                    bytes line -> prefix slice -> delta_content                  (new)
+  per history row:  HistoryItem(...) + response_model validation + json.dumps   (old)
+                    dict + orjson                                               (new)
+
+    python -m bench.json_fastpath [--tokens 200000] [--rows 2000] [--turns 20]
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+from typing import List
+from pydantic import TypeAdapter
+from app.core.fast_json import DATA_PREFIX, DONE, delta_content, dumps, orjson, sse_data
+from app.schemas.goal import HistoryItem
+
+
+def sse_line(text: str) -> str:
+    chunk = {
+        "id": "chatcmpl-8d1c0b6f", "object": "chat.completion.chunk", "created": 1718000000,
+        "model": "llama-3.3-70b-versatile", "system_fingerprint": "fp_abc123",
+        "choices": [{"index": 0, "delta": {"content": text}, "logprobs": None, "finish_reason": None}],
+        "x_groq": {"id": "req_01j"},
+    }
+    return "data: " + json.dumps(chunk, separators=(",", ":"))
+
+
+def old_token(line: str) -> bytes:
+    if line.startswith("data: "):
+        data_str = line.replace("data: ", "").strip()
+        if data_str == "[DONE]":
+            return b""
+        data_json = json.loads(data_str)
+        delta = data_json.get("choices", [{}])[0].get("delta", {})
+        content = delta.get("content", "")
+        if content:
+            return content.encode("utf-8")
+    return b""
+
+
+def new_token(line: bytes) -> bytes:
+    if line.startswith(DATA_PREFIX):
+        payload = sse_data(line)
+        if payload == DONE:
+            return b""
+        return delta_content(payload) or b""
+    return b""
+
+
+def history_row(i: int, turns: int) -> dict:
+    agent = {
+        "modelId": "llama-3.3-70b-versatile", "status": "complete", "rawOutput": "x" * 1500,
+        "thinking": "Reasoning about the goal. " * 20,
+        "jsonResult": {"message": "Plan", "steps": [{"step": f"Step {s}", "description": "Do it. " * 10, "complexity": s} for s in range(5)]},
+        "metrics": {"startTime": 1, "endTime": 2, "firstTokenTime": 1},
+    }
+    history = [{"id": f"t{t}", "userMessage": "Launch a SaaS", "agents": {"m": agent}, "versions": [], "currentVersionIndex": 0} for t in range(turns)]
+    return {
+        "id": i, "goal": f"Goal {i}", "model": "Groq", "date": datetime(2025, 1, 1, 12, 0, 0, 123456),
+        "preview": agent["jsonResult"]["steps"], "thinking": None, "chat_history": history, "version": 3,
+    }
+
+
+def timed(fn, *args) -> float:
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=200_000)
+    parser.add_argument("--rows", type=int, default=2_000)
+    parser.add_argument("--turns", type=int, default=20, help="chat turns per history row")
+    args = parser.parse_args()
+
+    print(f"orjson available: {orjson is not None}")
+    samples = {
+        "plain": ["plan", " the", " launch", " steps", " of", " your", " SaaS", "."],
+        # \n, quotes and non-ASCII arrive \u-escaped and take the full-parse path
+        "escaped": ["\n", " \"quoted\"", "é", " 🚀"],
+    }
+    for label, words in samples.items():
+        str_lines = [sse_line(words[i % len(words)]) for i in range(args.tokens)]
+        byte_lines = [line.encode("utf-8") for line in str_lines]
+        assert [old_token(l) for l in str_lines[:64]] == [new_token(l) for l in byte_lines[:64]]
+        old = timed(lambda: [old_token(l) for l in str_lines])
+        new = timed(lambda: [new_token(l) for l in byte_lines])
+        print(f"SSE {label:<8} old {old / args.tokens * 1e9:8.0f} ns/token   new {new / args.tokens * 1e9:8.0f} ns/token   ({old / new:.1f}x)")
+
+    rows = [history_row(i, args.turns) for i in range(args.rows)]
+    adapter = TypeAdapter(List[HistoryItem])
+
+    def old_history():
+        # What FastAPI did: build models, validate against response_model, dump, json.dumps
+        items = [HistoryItem(**r) for r in rows]
+        validated = adapter.validate_python(items)
+        json.dumps(adapter.dump_python(validated, mode="json"), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    old = timed(old_history)
+    new = timed(lambda: dumps(rows))
+    print(f"History rows  old {old / args.rows * 1e6:8.1f} us/row    new {new / args.rows * 1e6:8.1f} us/row     ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Local stand-in for Groq's OpenAI-compatible API (/openai/v1/models and
+/openai/v1/chat/completions), so the backend can be load-tested without a key.
+
+    python -m bench.mock_llm --port 9100 --token-rate 300 --first-token-delay 0.2 --error-rate 0.01
+
+Every option can also be set as MOCK_<OPTION> (e.g. MOCK_TOKEN_RATE=300), which is
+how bench.run configures it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MODELS = ["llama-3.3-70b-versatile", "llama-3.1-8b-instant", "mixtral-8x7b-32768"]
+
+
+class MockConfig:
+    def __init__(self):
+        self.token_rate = float(os.environ.get("MOCK_TOKEN_RATE", 200))  # deltas per second
+        self.first_token_delay = float(os.environ.get("MOCK_FIRST_TOKEN_DELAY", 0.25))
+        self.thinking_tokens = int(os.environ.get("MOCK_THINKING_TOKENS", 150))  # payload size before the plan
+        self.chars_per_token = int(os.environ.get("MOCK_CHARS_PER_TOKEN", 4))
+        self.error_rate = float(os.environ.get("MOCK_ERROR_RATE", 0.0))  # share of requests answered 500
+        self.rate_limit_rate = float(os.environ.get("MOCK_RATE_LIMIT_RATE", 0.0))  # share answered 429
+
+
+config = MockConfig()
+app = FastAPI(title="Mock LLM provider")
+served = {"requests": 0, "streams": 0, "errors": 0, "rate_limited": 0}
+
+
+def _completion_text() -> str:
+    thinking = " ".join(f"idea{i % 97}" for i in range(config.thinking_tokens * config.chars_per_token // 7))
+    plan = {
+        "message": "Here is a five step plan.",
+        "steps": [{"step": f"Step {i}", "description": f"Do part {i} of the goal.", "complexity": i * 2} for i in range(1, 6)],
+    }
+    return f"<think>{thinking}</think>{json.dumps(plan)}"
+
+
+def _sse(content: str) -> bytes:
+    return b"data: " + json.dumps({"choices": [{"delta": {"content": content}}]}).encode() + b"\n\n"
+
+
+async def _stream(text: str):
+    served["streams"] += 1
+    await asyncio.sleep(config.first_token_delay)
+    started = time.monotonic()
+    step = config.chars_per_token
+    for i, offset in enumerate(range(0, len(text), step)):
+        # Pace against the schedule, not the previous sleep, so slow wakeups do not add up
+        delay = started + i / config.token_rate - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield _sse(text[offset:offset + step])
+    yield b"data: [DONE]\n\n"
+
+
+@app.get("/openai/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": m, "object": "model", "context_window": 32768} for m in MODELS]}
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    served["requests"] += 1
+    body = await request.json()
+    roll = random.random()
+    if roll < config.rate_limit_rate:
+        served["rate_limited"] += 1
+        return JSONResponse({"error": {"message": "Rate limit reached"}}, status_code=429, headers={"retry-after": "0.1"})
+    if roll < config.rate_limit_rate + config.error_rate:
+        served["errors"] += 1
+        return JSONResponse({"error": {"message": "Injected failure"}}, status_code=500)
+
+    if not body.get("stream"):
+        return {"choices": [{"message": {"role": "assistant", "content": "\"Benchmark Goal\""}}]}
+    return StreamingResponse(_stream(_completion_text()), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def stats():
+    return served
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--token-rate", type=float, default=config.token_rate)
+    parser.add_argument("--first-token-delay", type=float, default=config.first_token_delay)
+    parser.add_argument("--thinking-tokens", type=int, default=config.thinking_tokens)
+    parser.add_argument("--chars-per-token", type=int, default=config.chars_per_token)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=config.rate_limit_rate)
+    args = parser.parse_args()
+    for name in ("token_rate", "first_token_delay", "thinking_tokens", "chars_per_token", "error_rate", "rate_limit_rate"):
+        setattr(config, name, getattr(args, name))
+
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
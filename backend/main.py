@@ -1,24 +1,58 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from contextlib import asynccontextmanager
 from app.core.config import settings
-from app.api.endpoints import goals
+from app.core.http_client import upstream
+from app.core.rate_limit import limiter
+from app.core.metrics import RequestMetricsMiddleware, render as render_metrics, stats_collector
+from app.core.blob_codec import blob_codec
+from app.services.response_cache import response_cache
+from app.services.single_flight import single_flight
+from app.services.write_buffer import write_buffer
+from app.services import stream_persistence
+from app.services.context_window import context_window
+from app.services.batch_runner import batch_runner
+from app.services.stream_hub import stream_hub
+from app.services.model_catalog import model_catalog
+from app.services.history_cache import history_cache
+from app.api.endpoints import goals, batches
 import logging
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger("security")
 
-limiter = Limiter(key_func=get_remote_address)
+for name, source in (
+    ("response_cache", response_cache.stats),
+    ("single_flight", single_flight.stats),
+    ("context_window", context_window.stats),
+    ("write_buffer", write_buffer.stats),
+    ("upstream", upstream.stats),
+    ("batch", batch_runner.stats),
+    ("stream_hub", stream_hub.stats),
+    ("model_catalog", model_catalog.stats),
+    ("blob_codec", blob_codec.stats),
+    ("history_cache", history_cache.stats),
+):
+    stats_collector.register(name, source)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await upstream.start()
+    model_catalog.start()
+    write_buffer.start()
+    batch_runner.start()
     yield
+    await batch_runner.stop()
+    await stream_persistence.drain()
+    await write_buffer.stop()
+    await model_catalog.stop()
+    await upstream.close()
+    response_cache.close()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -41,10 +75,13 @@ app.add_middleware(
     allow_origins=["http://localhost:3000", "http://localhost:5173"], 
     allow_origin_regex=r"https://.*\.onrender\.com", 
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Authorization", "Content-Type"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type", "If-Match", "If-None-Match", "Last-Event-ID"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Stream-Id"],
 )
 
+app.add_middleware(RequestMetricsMiddleware)
+
 # --- SECURITY: GRACEFUL VALIDATION ERRORS ---
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -73,7 +110,28 @@ async def global_exception_handler(request: Request, exc: Exception):
 async def health_check(request: Request):
     return {"status": "ok", "message": "Mind Cracker Backend is Secure"}
 
+@app.get("/pool-stats")
+@limiter.limit("20/minute")
+async def pool_stats(request: Request):
+    return upstream.stats()
+
+@app.get("/cache-stats")
+@limiter.limit("20/minute")
+async def cache_stats(request: Request):
+    return {**response_cache.stats(), "single_flight": single_flight.stats(), "context_window": context_window.stats()}
+
+@app.get("/write-stats")
+@limiter.limit("20/minute")
+async def write_stats(request: Request):
+    return write_buffer.stats()
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
 app.include_router(goals.router, prefix="/api/v1")
+app.include_router(batches.router, prefix="/api/v1")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,132 @@
+"""Baseline: auth tables, goals and goal_turns
+
+Everything the old migrate_db.py / create_all startup produced, written with
+IF NOT EXISTS so databases created that way are adopted as they are (no drops).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+JSON = sa.JSON().with_variant(postgresql.JSONB(), "postgresql")
+
+# Owned by the frontend's auth library; only exists on Postgres deployments
+AUTH_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS "user" (
+        id TEXT NOT NULL PRIMARY KEY,
+        name TEXT NOT NULL,
+        email TEXT NOT NULL UNIQUE,
+        email_verified BOOLEAN NOT NULL DEFAULT false,
+        image TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS "session" (
+        id TEXT NOT NULL PRIMARY KEY,
+        expires_at TIMESTAMPTZ NOT NULL,
+        ip_address TEXT,
+        user_agent TEXT,
+        user_id TEXT NOT NULL REFERENCES "user"(id) ON DELETE CASCADE,
+        token TEXT NOT NULL UNIQUE,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS "account" (
+        id TEXT NOT NULL PRIMARY KEY,
+        account_id TEXT NOT NULL,
+        provider_id TEXT NOT NULL,
+        user_id TEXT NOT NULL REFERENCES "user"(id) ON DELETE CASCADE,
+        access_token TEXT,
+        refresh_token TEXT,
+        id_token TEXT,
+        expires_at TIMESTAMPTZ,
+        password TEXT,
+        scope TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    )
+    """,
+    # Older deployments created "account" before scope existed
+    'ALTER TABLE "account" ADD COLUMN IF NOT EXISTS scope TEXT',
+    """
+    CREATE TABLE IF NOT EXISTS "verification" (
+        id TEXT NOT NULL PRIMARY KEY,
+        identifier TEXT NOT NULL,
+        value TEXT NOT NULL,
+        expires_at TIMESTAMPTZ NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT NOW(),
+        updated_at TIMESTAMPTZ DEFAULT NOW()
+    )
+    """,
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        for statement in AUTH_TABLES:
+            op.execute(statement)
+
+    op.create_table(
+        "goals",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.String, nullable=True),
+        sa.Column("original_goal", sa.Text),
+        sa.Column("model_used", sa.String),
+        sa.Column("breakdown", JSON),
+        sa.Column("thinking_process", sa.Text, nullable=True),
+        sa.Column("chat_history", JSON, nullable=True),
+        sa.Column("version", sa.Integer, nullable=False, server_default="1"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        if_not_exists=True,
+    )
+    # Columns added over time by the old startup script
+    if op.get_bind().dialect.name == "postgresql":
+        op.add_column("goals", sa.Column("chat_history", JSON, nullable=True), if_not_exists=True)
+        op.add_column("goals", sa.Column("thinking_process", sa.Text, nullable=True), if_not_exists=True)
+        op.add_column("goals", sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()), if_not_exists=True)
+        op.add_column("goals", sa.Column("version", sa.Integer, nullable=False, server_default="1"), if_not_exists=True)
+    op.create_index("ix_goals_id", "goals", ["id"], if_not_exists=True)
+    op.create_index("ix_goals_user_id", "goals", ["user_id"], if_not_exists=True)
+    op.create_index("ix_goals_user_updated", "goals", ["user_id", sa.text("updated_at DESC"), sa.text("id DESC")], if_not_exists=True)
+
+    op.create_table(
+        "goal_turns",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("goal_id", sa.Integer, sa.ForeignKey("goals.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("turn_index", sa.Integer, nullable=False),
+        sa.Column("version", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("turn_uid", sa.String, nullable=True),
+        sa.Column("user_message", sa.Text, nullable=True),
+        sa.Column("agent_model", sa.String, nullable=False),
+        sa.Column("status", sa.String, nullable=True),
+        sa.Column("thinking", sa.Text, nullable=True),
+        sa.Column("result", JSON, nullable=True),
+        sa.Column("metrics", JSON, nullable=True),
+        sa.Column("duration_ms", sa.Integer, nullable=True),
+        sa.Column("created_at", sa.DateTime, server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime, server_default=sa.func.now()),
+        sa.UniqueConstraint("goal_id", "turn_index", "version", "agent_model", name="uq_goal_turns_slot"),
+        if_not_exists=True,
+    )
+    op.create_index("ix_goal_turns_model_status", "goal_turns", ["agent_model", "status"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    # Drops every goal. The auth tables stay: they belong to the frontend's auth library,
+    # which would lose every account, and this revision only creates them when missing.
+    op.drop_table("goal_turns", if_exists=True)
+    op.drop_table("goals", if_exists=True)
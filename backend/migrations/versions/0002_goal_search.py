@@ -0,0 +1,60 @@
+"""Full-text index over goal titles and plan steps
+
+Postgres: goal_search(goal_id, user_id, document tsvector) with a GIN index.
+SQLite: an FTS5 table keyed by goal id. Existing goals are backfilled.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+PG_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS goal_search (
+        goal_id INTEGER PRIMARY KEY REFERENCES goals(id) ON DELETE CASCADE,
+        user_id VARCHAR,
+        document TSVECTOR NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_goal_search_document ON goal_search USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS ix_goal_search_user ON goal_search (user_id)",
+    """
+    INSERT INTO goal_search (goal_id, user_id, document)
+    SELECT g.id, g.user_id,
+        setweight(to_tsvector('english', coalesce(g.original_goal, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(concat_ws(' ', s->>'step', s->>'description'), ' ')
+            FROM jsonb_array_elements(CASE WHEN jsonb_typeof(g.breakdown::jsonb) = 'array' THEN g.breakdown::jsonb ELSE '[]'::jsonb END) AS s
+        ), '')), 'B')
+    FROM goals g
+    ON CONFLICT (goal_id) DO NOTHING
+    """,
+]
+
+SQLITE_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS goal_search USING fts5(owner, goal, steps, tokenize='porter unicode61')",
+    """
+    INSERT INTO goal_search (rowid, owner, goal, steps)
+    SELECT g.id, coalesce(g.user_id, ''), coalesce(g.original_goal, ''), coalesce((
+        SELECT group_concat(coalesce(json_extract(s.value, '$.step'), '') || ' ' || coalesce(json_extract(s.value, '$.description'), ''), ' ')
+        FROM json_each(CASE WHEN json_type(g.breakdown) = 'array' THEN g.breakdown ELSE '[]' END) AS s
+    ), '')
+    FROM goals g
+    WHERE NOT EXISTS (SELECT 1 FROM goal_search x WHERE x.rowid = g.id)
+    """,
+]
+
+
+def upgrade() -> None:
+    for statement in (PG_SCHEMA if op.get_bind().dialect.name == "postgresql" else SQLITE_SCHEMA):
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS goal_search")
@@ -0,0 +1,53 @@
+"""Batch decomposition jobs and their work queue
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "batch_jobs",
+        sa.Column("id", sa.String, primary_key=True),
+        sa.Column("user_id", sa.String, nullable=True),
+        sa.Column("status", sa.String, nullable=False),
+        sa.Column("total", sa.Integer, nullable=False),
+        sa.Column("completed", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("failed", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+        if_not_exists=True,
+    )
+    op.create_index("ix_batch_jobs_user_id", "batch_jobs", ["user_id"], if_not_exists=True)
+
+    op.create_table(
+        "batch_items",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("job_id", sa.String, sa.ForeignKey("batch_jobs.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("position", sa.Integer, nullable=False),
+        sa.Column("goal_text", sa.Text, nullable=False),
+        sa.Column("model", sa.String, nullable=False),
+        sa.Column("status", sa.String, nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("not_before", sa.Float, nullable=True),
+        sa.Column("lease_until", sa.Float, nullable=True),
+        sa.Column("goal_id", sa.Integer, sa.ForeignKey("goals.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column("finished_at", sa.DateTime, nullable=True),
+        if_not_exists=True,
+    )
+    op.create_index("ix_batch_items_status", "batch_items", ["status", "id"], if_not_exists=True)
+    op.create_index("ix_batch_items_job", "batch_items", ["job_id", "status", "finished_at"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_table("batch_items")
+    op.drop_table("batch_jobs")
@@ -0,0 +1,26 @@
+"""Compressed storage columns for goal blobs
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Nullable, no default: a metadata-only change on both Postgres and SQLite, whatever the table size
+    op.add_column("goals", sa.Column("thinking_z", sa.LargeBinary, nullable=True))
+    op.add_column("goals", sa.Column("chat_history_z", sa.LargeBinary, nullable=True))
+
+
+def downgrade() -> None:
+    # Run `python backfill_blobs.py` with BLOB_COMPRESSION=off first, or compressed rows lose their content
+    with op.batch_alter_table("goals") as batch:
+        batch.drop_column("chat_history_z")
+        batch.drop_column("thinking_z")
@@ -0,0 +1,26 @@
+"""History index on updated_at, falling back to created_at for legacy rows
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# Must match GOAL_RECENCY in app/models/goal.py, or the history query cannot use the index
+RECENCY = "COALESCE(updated_at, created_at, '1970-01-01 00:00:00.000000')"
+
+
+def upgrade() -> None:
+    op.create_index("ix_goals_user_recent", "goals", ["user_id", sa.text(f"{RECENCY} DESC"), sa.text("id DESC")], if_not_exists=True)
+    op.drop_index("ix_goals_user_updated", "goals", if_exists=True)
+
+
+def downgrade() -> None:
+    op.create_index("ix_goals_user_updated", "goals", ["user_id", sa.text("updated_at DESC"), sa.text("id DESC")], if_not_exists=True)
+    op.drop_index("ix_goals_user_recent", "goals", if_exists=True)
@@ -0,0 +1,64 @@
+"""Fill goal_turns for goals saved before the table existed
+
+The baseline created goal_turns empty, so older goals had no turns in
+GET /goals/{id}/turns or /stats/models until backfill_turns.py was run by hand.
+chat_history (plain or compressed) is exploded with the same explode_turn the app
+writes with. Goals that already have turn rows are skipped, so databases where the
+script already ran are left as they are.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+JSON = sa.JSON().with_variant(postgresql.JSONB(), "postgresql")
+BATCH_SIZE = 500
+
+goals = sa.table("goals", sa.column("id", sa.Integer), sa.column("chat_history", JSON), sa.column("chat_history_z", sa.LargeBinary))
+goal_turns = sa.table(
+    "goal_turns",
+    sa.column("goal_id", sa.Integer), sa.column("turn_index", sa.Integer), sa.column("version", sa.Integer),
+    sa.column("turn_uid", sa.String), sa.column("user_message", sa.Text), sa.column("agent_model", sa.String),
+    sa.column("status", sa.String), sa.column("thinking", sa.Text), sa.column("result", JSON),
+    sa.column("metrics", JSON), sa.column("duration_ms", sa.Integer),
+)
+
+
+def upgrade() -> None:
+    from app.core.blob_codec import blob_codec
+    from app.services.turn_store import explode_turn
+
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(goals.c.id, goals.c.chat_history, goals.c.chat_history_z)
+            .where(goals.c.id > last_id)
+            .where(sa.or_(goals.c.chat_history.is_not(None), goals.c.chat_history_z.is_not(None)))
+            .where(~sa.exists().where(goal_turns.c.goal_id == goals.c.id))
+            .order_by(goals.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        turns = []
+        for row in rows:
+            history = blob_codec.decode_json(row.chat_history_z) if row.chat_history_z is not None else row.chat_history
+            if isinstance(history, list):
+                turns += [t for i, turn in enumerate(history) for t in explode_turn(row.id, i, turn)]
+        if turns:
+            conn.execute(goal_turns.insert(), turns)
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    # Rows are derived from chat_history, which still holds everything; nothing to undo
+    pass
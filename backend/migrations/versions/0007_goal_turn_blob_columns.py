@@ -0,0 +1,26 @@
+"""Compressed storage columns for goal_turns thinking / result
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Nullable, no default, as in 0004: metadata-only whatever the table size
+    op.add_column("goal_turns", sa.Column("thinking_z", sa.LargeBinary, nullable=True))
+    op.add_column("goal_turns", sa.Column("result_z", sa.LargeBinary, nullable=True))
+
+
+def downgrade() -> None:
+    # Run `python backfill_blobs.py` with BLOB_COMPRESSION=off first, or compressed rows lose their content
+    with op.batch_alter_table("goal_turns") as batch:
+        batch.drop_column("result_z")
+        batch.drop_column("thinking_z")
@@ -1,14 +1,122 @@
+"""
+Schema check run before the server binds (Dockerfile CMD).
+
+Fast path: the stored Alembic revision is read with the bare driver (asyncpg or
+sqlite3); when it is SCHEMA_HEAD, neither SQLAlchemy nor Alembic is imported, which
+keeps scale-to-zero cold starts short. Otherwise the upgrade runs under a Postgres
+advisory lock, so replicas starting together apply it once and the rest find the
+schema already at head.
+"""
+import time
+
+_started = time.perf_counter()
+
 import asyncio
-from app.core.database import init_db
-from app.models.goal import Goal
+import os
+import sys
+from contextlib import closing
+from typing import Optional
+from app.core.config import settings
 
-async def main():
-    print("Running database initialization...")
+# Newest revision in migrations/versions; bump together with every new revision
+SCHEMA_HEAD = "0007"
+# pg_advisory_lock key shared by every replica of this app
+MIGRATION_LOCK_KEY = 7_201_944
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+async def stored_revision() -> Optional[str]:
+    url = settings.async_database_url
+    if url.startswith("sqlite"):
+        import sqlite3
+
+        path = url.split(":///", 1)[1].split("?", 1)[0]
+        if not os.path.exists(path):
+            return None
+        with closing(sqlite3.connect(path)) as db:
+            if not db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alembic_version'").fetchone():
+                return None
+            row = db.execute("SELECT version_num FROM alembic_version").fetchone()
+            return row[0] if row else None
+
+    import asyncpg
+
+    conn = await asyncpg.connect(url.replace("+asyncpg", ""))
     try:
-        await init_db()
-        print("Database tables checked/created successfully.")
-    except Exception as e:
-        print(f"Initialization error: {e}")
+        if not await conn.fetchval("SELECT to_regclass('alembic_version') IS NOT NULL"):
+            return None
+        return await conn.fetchval("SELECT version_num FROM alembic_version")
+    finally:
+        await conn.close()
+
+
+def _read_revision(sync_conn) -> Optional[str]:
+    from sqlalchemy import inspect, text
+
+    if not inspect(sync_conn).has_table("alembic_version"):
+        return None
+    return sync_conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+def _upgrade(sync_conn):
+    # Alembic is only imported when there is something to do
+    from alembic import command
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config(os.path.join(BASE_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BASE_DIR, "migrations"))
+    head = ScriptDirectory.from_config(config).get_current_head()
+    if head != SCHEMA_HEAD:
+        print(f"⚠️ [MIGRATE] SCHEMA_HEAD is {SCHEMA_HEAD} but the newest revision is {head}; update prestart.py.")
+    config.attributes["connection"] = sync_conn
+    command.upgrade(config, "head")
+
+
+async def migrate():
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    engine = create_async_engine(settings.async_database_url, poolclass=NullPool)
+    try:
+        async with engine.connect() as conn:
+            locked = engine.dialect.name == "postgresql"
+            if locked:
+                await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+                await conn.commit()
+            try:
+                # Another replica may have finished the upgrade while we waited for the lock
+                revision = await conn.run_sync(_read_revision)
+                await conn.commit()
+                if revision != SCHEMA_HEAD:
+                    print(f"🔧 [MIGRATE] Upgrading schema {revision or '(none)'} -> {SCHEMA_HEAD}...")
+                    await conn.run_sync(_upgrade)
+                    await conn.commit()
+                    print(f"✅ [MIGRATE] Schema upgraded to {SCHEMA_HEAD}.")
+            finally:
+                if locked:
+                    await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+                    await conn.commit()
+    finally:
+        await engine.dispose()
+
+
+async def main():
+    revision = await stored_revision()
+    if revision == SCHEMA_HEAD:
+        print(f"✅ [MIGRATE] Schema already at {revision}.")
+        return
+    await migrate()
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        # Never start the server on a half-migrated schema
+        print(f"❌ [MIGRATE] Failed: {e}")
+        sys.exit(1)
+    elapsed_ms = (time.perf_counter() - _started) * 1000
+    budget = "" if elapsed_ms <= settings.STARTUP_BUDGET_MS else f" - over the {settings.STARTUP_BUDGET_MS} ms budget"
+    print(f"⏱️ [MIGRATE] Startup check took {elapsed_ms:.0f} ms{budget}.")
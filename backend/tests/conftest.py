@@ -0,0 +1,5 @@
+import os
+
+# Settings requires these; the unit tests never reach a database or the provider
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("GROQ_API_KEY", "test")
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import pytest
+from app.core.fast_json import DONE, delta_content, dumps, loads, sse_payloads
+
+
+def reference(payload: bytes):
+    """What the fast path must agree with: a full parse of the chunk."""
+    try:
+        content = json.loads(payload)["choices"][0]["delta"].get("content")
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+    return content.encode("utf-8") if content else None
+
+
+def chunk(delta, ensure_ascii=True, **extra) -> bytes:
+    body = {"id": "c1", "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None}], **extra}
+    return json.dumps(body, ensure_ascii=ensure_ascii, separators=(",", ":")).encode("utf-8")
+
+
+CONTENTS = [
+    "plain", "", " leading space", 'say "hi"', "back\\slash", "new\nline", "tab\t", "brace } and ]",
+    "é ü ñ", "日本語", "emoji 🚀", "  separator", "</think>{\"message\":", "null", '\\"',
+]
+
+
+@pytest.mark.parametrize("content", CONTENTS)
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_matches_full_parse(content, ensure_ascii):
+    payload = chunk({"content": content}, ensure_ascii)
+    assert delta_content(payload) == reference(payload)
+    payload = chunk({"role": "assistant", "content": content}, ensure_ascii)
+    assert delta_content(payload) == reference(payload)
+
+
+@pytest.mark.parametrize("payload", [
+    chunk({}),
+    chunk({"content": None}),
+    chunk({"role": "assistant"}),
+    chunk({"role": "x}", "content": "after a brace"}),
+    chunk({"tool_calls": [{"function": {"content": "not the delta's"}}]}),
+    chunk({}, usage={"content": "elsewhere"}),
+    b'{"choices":[{"delta":{"content": "spaced"}}]}',
+    b'{"choices":[{"delta":{"content":"unterminated}}]}',
+    b'{"choices":[]}',
+    b'{"error":{"message":"rate limited"}}',
+    b'{"choices":[{"delta":{"content":"truncated',
+    b"not json",
+    DONE,
+    b"",
+])
+def test_odd_payloads_match_full_parse(payload):
+    assert delta_content(payload) == reference(payload)
+
+
+def test_orjson_output_matches_full_parse():
+    payload = dumps({"choices": [{"delta": {"content": 'quote " and é'}}]})
+    assert delta_content(payload) == reference(payload) == 'quote " and é'.encode("utf-8")
+
+
+async def _collect(chunks):
+    async def source():
+        for c in chunks:
+            yield c
+    return [p async for p in sse_payloads(source())]
+
+
+def payloads(chunks):
+    return asyncio.run(_collect(chunks))
+
+
+def reference_payloads(stream: bytes):
+    out = []
+    for line in stream.decode("utf-8").splitlines():
+        if line.startswith("data:"):
+            value = line[len("data:"):]
+            out.append((value[1:] if value.startswith(" ") else value).encode("utf-8"))
+    return out
+
+
+STREAM = b"".join([
+    b": keep-alive\n\n",
+    b"data: " + chunk({"role": "assistant", "content": ""}) + b"\n\n",
+    b"data: " + chunk({"content": "café 日本"}, ensure_ascii=False) + b"\r\n\r\n",
+    b"event: ping\ndata:" + chunk({"content": 'no space "after" colon'}) + b"\n\n",
+    b"data: " + chunk({"content": "\\u escaped é"}) + b"\n\n",
+    b"data: [DONE]\n\n",
+])
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(STREAM)])
+def test_sse_payloads_split_anywhere(size):
+    pieces = [STREAM[i:i + size] for i in range(0, len(STREAM), size)]
+    got = payloads(pieces)
+    assert got == reference_payloads(STREAM)
+    assert got[-1] == DONE
+    assert [delta_content(p) for p in got] == [reference(p) for p in got]
+
+
+def test_last_event_without_trailing_newline():
+    assert payloads([b"data: {}\n", b"data: [DO", b"NE]"]) == [b"{}", DONE]
+
+
+def test_content_reassembles_across_chunks():
+    text = 'Plan: "ship" — then {iterate}. \U0001F680'
+    stream = b"".join(b"data: " + chunk({"content": c}, ensure_ascii=False) + b"\n\n" for c in text) + b"data: [DONE]\n\n"
+    got = payloads([stream[i:i + 5] for i in range(0, len(stream), 5)])
+    assert b"".join(delta_content(p) or b"" for p in got if p != DONE).decode("utf-8") == text
+    assert loads(got[0])["choices"][0]["delta"]["content"] == text[0]
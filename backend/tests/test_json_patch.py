@@ -0,0 +1,103 @@
+import pytest
+from app.services.json_patch import apply_patch, JsonPatchError
+
+DOC = {"foo": "bar", "list": [1, 2, 3], "nested": {"a": {"b": 1}}}
+
+
+def patch(doc, *ops):
+    return apply_patch(doc, list(ops))
+
+
+def test_input_is_not_mutated():
+    doc = {"list": [1]}
+    patch(doc, {"op": "add", "path": "/list/-", "value": 2})
+    assert doc == {"list": [1]}
+
+
+def test_add():
+    assert patch(DOC, {"op": "add", "path": "/baz", "value": "qux"})["baz"] == "qux"
+    assert patch(DOC, {"op": "add", "path": "/foo", "value": 1})["foo"] == 1  # replaces an existing member
+    assert patch(DOC, {"op": "add", "path": "/list/1", "value": 9})["list"] == [1, 9, 2, 3]
+    assert patch(DOC, {"op": "add", "path": "/list/3", "value": 9})["list"] == [1, 2, 3, 9]
+    assert patch(DOC, {"op": "add", "path": "/list/-", "value": 9})["list"] == [1, 2, 3, 9]
+    assert patch(DOC, {"op": "add", "path": "/nested/a/c", "value": None})["nested"]["a"] == {"b": 1, "c": None}
+    assert patch(DOC, {"op": "add", "path": "", "value": [1]}) == [1]
+
+
+def test_remove():
+    assert "foo" not in patch(DOC, {"op": "remove", "path": "/foo"})
+    assert patch(DOC, {"op": "remove", "path": "/list/0"})["list"] == [2, 3]
+
+
+def test_replace():
+    assert patch(DOC, {"op": "replace", "path": "/foo", "value": [1]})["foo"] == [1]
+    assert patch(DOC, {"op": "replace", "path": "/list/2", "value": 0})["list"] == [1, 2, 0]
+    assert patch(DOC, {"op": "replace", "path": "", "value": {}}) == {}
+
+
+def test_move():
+    result = patch(DOC, {"op": "move", "from": "/nested/a", "path": "/moved"})
+    assert result["moved"] == {"b": 1} and result["nested"] == {}
+    assert patch(DOC, {"op": "move", "from": "/list/0", "path": "/list/-"})["list"] == [2, 3, 1]
+
+
+def test_copy():
+    result = patch(DOC, {"op": "copy", "from": "/nested", "path": "/copied"})
+    result["copied"]["a"]["b"] = 2
+    assert result["nested"]["a"]["b"] == 1  # a copy, not an alias
+
+
+def test_test():
+    assert patch(DOC, {"op": "test", "path": "/list", "value": [1, 2, 3]}) == DOC
+    assert patch(DOC, {"op": "test", "path": "/list/0", "value": 1.0}) == DOC
+
+
+def test_operations_apply_in_order_and_all_or_nothing():
+    doc = {"list": []}
+    ops = [{"op": "add", "path": "/list/-", "value": 1}, {"op": "test", "path": "/list/0", "value": 2}]
+    with pytest.raises(JsonPatchError):
+        apply_patch(doc, ops)
+    assert doc == {"list": []}
+
+
+def test_pointer_escaping():
+    doc = {"a/b": 1, "m~n": 2, "~1": 3}
+    assert patch(doc, {"op": "replace", "path": "/a~1b", "value": 10})["a/b"] == 10
+    assert patch(doc, {"op": "replace", "path": "/m~0n", "value": 20})["m~n"] == 20
+    # ~01 is "~1", not "/"
+    assert patch(doc, {"op": "remove", "path": "/~01"}) == {"a/b": 1, "m~n": 2}
+
+
+@pytest.mark.parametrize("op", [
+    {"op": "add", "path": "/missing/x", "value": 1},
+    {"op": "add", "path": "/list/4", "value": 1},
+    {"op": "add", "path": "/list/-1", "value": 1},
+    {"op": "add", "path": "/foo/x", "value": 1},
+    {"op": "add", "path": "/baz"},
+    {"op": "add", "value": 1},
+    {"op": "add", "path": "foo", "value": 1},
+    {"op": "add", "path": 3, "value": 1},
+    {"op": "remove", "path": ""},
+    {"op": "remove", "path": "/missing"},
+    {"op": "remove", "path": "/list/3"},
+    {"op": "remove", "path": "/list/-"},
+    {"op": "remove", "path": "/list/01"},
+    {"op": "remove", "path": "/list/x"},
+    {"op": "replace", "path": "/missing", "value": 1},
+    {"op": "replace", "path": "/list/3", "value": 1},
+    {"op": "replace", "path": "/foo"},
+    {"op": "move", "from": "/missing", "path": "/x"},
+    {"op": "move", "from": "/nested", "path": "/nested/a/c"},
+    {"op": "move", "path": "/x"},
+    {"op": "copy", "from": "/missing", "path": "/x"},
+    {"op": "test", "path": "/foo", "value": "baz"},
+    {"op": "test", "path": "/list/0", "value": True},
+    {"op": "test", "path": "/missing", "value": None},
+    {"op": "test", "path": "/foo"},
+    {"op": "frobnicate", "path": "/foo"},
+    {"path": "/foo"},
+])
+def test_invalid_operations_raise_json_patch_error(op):
+    # PATCH /goals/{id} turns JsonPatchError into a 400; any other exception would be a 500
+    with pytest.raises(JsonPatchError):
+        patch(DOC, op)
@@ -0,0 +1,95 @@
+import json
+from app.services.ai_service import PlanStreamParser
+
+PLAN = {
+    "message": "Ship it.",
+    "steps": [
+        {"step": f"Step {i}", "description": "Do the \"thing\" {now}", "complexity": i}
+        for i in range(1, 6)
+    ],
+}
+OUTPUT = "<think>\nWeigh the options.\n</think>\n" + json.dumps(PLAN, indent=2)
+
+
+def run(chunks):
+    parser = PlanStreamParser()
+    events = []
+    for chunk in chunks:
+        events += parser.feed(chunk)
+    return parser, events + parser.close()
+
+
+def split_every(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def thinking(events):
+    return "".join(e["data"] for e in events if e["type"] == "thinking")
+
+
+def test_single_chunk():
+    parser, events = run([OUTPUT])
+    assert thinking(events) == "\nWeigh the options.\n"
+    assert [e["data"] for e in events if e["type"] == "message"] == ["Ship it."]
+    assert [e["data"] for e in events if e["type"] == "step"] == PLAN["steps"]
+    assert [e["index"] for e in events if e["type"] == "step"] == [0, 1, 2, 3, 4]
+    assert events[-1] == {"type": "done", "plan": PLAN}
+
+
+def test_every_chunk_size_gives_the_same_events():
+    _, expected = run([OUTPUT])
+    for size in (1, 2, 3, 5, 7, 13):
+        _, events = run(split_every(OUTPUT, size))
+        assert thinking(events) == thinking(expected)
+        assert [e for e in events if e["type"] != "thinking"] == [e for e in expected if e["type"] != "thinking"]
+
+
+def test_tags_split_across_chunks():
+    chunks = ["pre <thi", "nk>rea", "soning</th", "ink>", "\n{\"mess", "age\": \"hi\", \"steps\": [", "]}"]
+    _, events = run(chunks)
+    assert thinking(events) == "reasoning"
+    assert not any("<" in e["data"] for e in events if e["type"] == "thinking")
+    assert events[-1] == {"type": "done", "plan": {"message": "hi", "steps": []}}
+
+
+def test_partial_close_tag_that_is_not_a_tag_is_thinking():
+    _, events = run(["<think>a </t", "able> b</think>{}"])
+    assert thinking(events) == "a </table> b"
+
+
+def test_braces_and_escapes_inside_strings():
+    plan = {"message": "a } ] \\\" { [ é", "steps": [{"step": "x}", "description": "\"{\"", "complexity": 1}]}
+    _, events = run(split_every(json.dumps(plan), 1))
+    assert [e["data"] for e in events if e["type"] == "message"] == [plan["message"]]
+    assert [e["data"] for e in events if e["type"] == "step"] == plan["steps"]
+    assert events[-1]["plan"] == plan
+
+
+def test_no_think_block():
+    _, events = run(["Sure! ", json.dumps(PLAN)])
+    assert thinking(events) == ""
+    assert events[-1] == {"type": "done", "plan": PLAN}
+
+
+def test_missing_think_close_keeps_everything_as_thinking():
+    _, events = run(["<think>still going ", "{\"message\": \"x\"}", " </thi"])
+    assert thinking(events) == "still going {\"message\": \"x\"} </thi"
+    assert events[-1] == {"type": "done", "plan": None}
+
+
+def test_truncated_json_falls_back_to_parsed_parts():
+    text = json.dumps(PLAN)
+    cut = text.index("Step 3") - 10
+    _, events = run([text[:cut]])
+    assert events[-1] == {"type": "done", "plan": {"message": "Ship it.", "steps": PLAN["steps"][:2]}}
+
+
+def test_early_stop_once_root_object_closes():
+    parser = PlanStreamParser()
+    events = parser.feed(json.dumps(PLAN)[:-1])
+    assert not parser.finished
+    events += parser.feed("}\n\nHope this helps! {\"message\": \"ignored\"}")
+    assert parser.finished
+    assert events[-1] == {"type": "done", "plan": PLAN}
+    assert parser.feed("more text") == []
+    assert parser.close() == []